@@ -5,182 +5,822 @@ Routes:
   POST /auth/signup           — create account (optionally with face image)
   POST /auth/login            — password login, returns JWT
   GET  /auth/me               — verify JWT, return current user
-  POST /face/register         — register / update a face embedding
+  POST /auth/logout           — revoke the current JWT
+  POST /face/register         — add a face sample (oldest/least-used evicted past the cap)
+  POST /face/register/batch   — enroll many faces from a zip or multiple images
   POST /face/authenticate     — face login, returns JWT + triggers door grant
+  POST /face/authenticate/stream — face login from a burst of frames, decided as they arrive
   GET  /face/list             — list registered faces (debug)
   DELETE /face/delete/<u>     — remove a face record
-  GET  /sensors               — latest sensor readings from ESP
-  GET  /device/list           — current device on/off states
-  POST /device/toggle         — send on/off command to ESP
-  GET  /health                — liveness check
+  GET  /sensors               — latest sensor readings from every ESP controller
+  GET  /sensors/history       — one controller's readings over time (raw / 1-minute / 1-hour)
+  GET  /device/list           — current device on/off states ("<controller>/<device>")
+  POST /device/toggle         — queue an on/off command for the owning ESP, returns its id
+  GET  /device/command/<id>   — status of a queued command (queued / sent / acked / failed)
+  GET  /health                — liveness check, per-controller connection state and
+                                per-subsystem readiness (database, gallery, face models)
+  GET  /state                 — sensors, devices, door and ESP liveness in one snapshot;
+                                ?since=<version> long-polls until the next change
+  GET  /metrics               — latency histograms and counters (Prometheus text, or ?format=json)
+  GET  /automation/rules      — automation rules and whether each is currently active
+  GET  /audit                 — audit log of door grants, refused faces, toggles and ESP
+                                (dis)connects, by username / kind / time range
+
+Push (separate port, EVENTS_PORT):
+  GET  /events                — Server-Sent Events stream of sensor / device changes
+
+Serving:
+  python app.py serve              — one process, Werkzeug dev server (default)
+  python app.py serve --workers N  — device gateway process + N web workers
+  python app.py gateway            — the gateway alone, for workers run by a WSGI
+                                     server: gunicorn -w N 'app:worker_app()'
 """
 
 import os
-import io
+import sys
+import time
 import uuid
-import json
+import signal
+import socket
+import zipfile
+import atexit
+import argparse
+import collections
 import sqlite3
 import datetime
 import traceback
 import hashlib
 import hmac
+import logging
 import threading
 
 import jwt
-import numpy as np
-from PIL import Image
-import face_recognition
-import serial
-import serial.tools.list_ports
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, g
 from flask_cors import CORS
+from werkzeug.serving import make_server
+
+import metrics
+import enrollment
+from db_pool import ConnectionPool
+from device_gateway import GatewayServer, GatewayClient, GatewayError
+from command_queue import CommandQueue
+from automation import AutomationEngine, load_rules
+from audit_log import AuditJournal, AuditForwarder, AuditBatches
+from device_hub import DeviceHub, Controller, load_controllers
+from esp_protocol import parse_packet
+from event_stream import EventStreamServer
+from state_broker import StateBroker
+from session_cache import TokenCache, ProfileCache, RevocationList
+from sensor_history import SensorHistory, RESOLUTIONS
+from embedding_codec import embedding_to_blob, blob_to_embedding
+from face_gallery import FaceGallery
+from face_index import make_index
+from face_pipeline import ImageDecodeError, DetectionOptions
+from face_quality import QualityThresholds, FrameRejected
+from face_stream import AuthSession, StreamError, iter_frames
+from face_worker import FaceWorkerPool, FaceWorkerBusy, FaceWorkerTimeout
+from readiness import Readiness
 
 # ---------------------------------------------------------------------------
 # Configuration
 # ---------------------------------------------------------------------------
 BASE_DIR  = os.path.dirname(os.path.abspath(__file__))
-DB_PATH   = os.path.join(BASE_DIR, 'faces.db')
+DB_PATH   = os.environ.get('DB_PATH', os.path.join(BASE_DIR, 'faces.db'))
 
 JWT_SECRET       = os.environ.get('JWT_SECRET', 'change-me-in-production-supersecretkey')
 JWT_ALGORITHM    = 'HS256'
 JWT_EXPIRY_HOURS = 24
 
+# Verified tokens and /auth/me profiles kept in memory (0 disables)
+JWT_CACHE_SIZE     = int(os.environ.get('JWT_CACHE_SIZE', '4096'))
+PROFILE_CACHE_SIZE = int(os.environ.get('PROFILE_CACHE_SIZE', '1024'))
+
 FACE_DISTANCE_THRESHOLD = 0.6
 
-ESP_PORT     = os.environ.get('ESP_PORT', 'COM3')
-ESP_BAUDRATE = 115200
+# Streamed face login: frames read per burst at most, and the distance at
+# which a frame is accepted without waiting for the rest of the burst
+FACE_STREAM_MAX_FRAMES = int(os.environ.get('FACE_STREAM_MAX_FRAMES', '8'))
+FACE_STREAM_CONFIDENT  = float(os.environ.get('FACE_STREAM_CONFIDENT', '0.45'))
+
+# Largest request body accepted, in MB (batch enrollment archives are the
+# big ones); anything larger is refused with 413 before it is read
+MAX_UPLOAD_MB = int(os.environ.get('MAX_UPLOAD_MB', '256'))
+
+# Face matcher backend: 'exact' (brute force) or 'ivf' (approximate, for
+# very large galleries — see benchmarks/bench_index.py to pick nprobe)
+FACE_MATCHER     = os.environ.get('FACE_MATCHER', 'exact')
+FACE_IVF_NPROBE  = int(os.environ.get('FACE_IVF_NPROBE', '8'))
+FACE_INDEX_PATH  = os.path.join(BASE_DIR, 'faces.index.npz')
+
+# Each user may hold several face samples; past the cap the least recently
+# matched one is evicted. A user's distance is the min or mean over samples.
+FACE_MAX_SAMPLES     = int(os.environ.get('FACE_MAX_SAMPLES', '5'))
+FACE_MATCH_AGGREGATE = os.environ.get('FACE_MATCH_AGGREGATE', 'min')
+
+# Face pipeline worker processes (0 = run inline in the request thread),
+# how many images may be queued or in flight before returning 429, and
+# how long a request waits for its result
+FACE_WORKERS    = int(os.environ.get('FACE_WORKERS', str(max((os.cpu_count() or 2) - 1, 1))))
+FACE_QUEUE_SIZE = int(os.environ.get('FACE_QUEUE_SIZE', str(FACE_WORKERS * 4 or 4)))
+FACE_TIMEOUT_S  = float(os.environ.get('FACE_TIMEOUT_S', '10'))
+FACE_CACHE_SIZE = int(os.environ.get('FACE_CACHE_SIZE', '64'))
+
+# The face models and gallery load in the background after startup; a face
+# request arriving before they are ready waits this long, then gets a 503
+FACE_WARMUP_WAIT_S = float(os.environ.get('FACE_WARMUP_WAIT_S', '10'))
+
+
+# Frame quality pre-filter (see face_quality): blurry, badly exposed,
+# multi-face or far-away frames are rejected with a reason code before
+# detection / encoding run on them
+FACE_QUALITY = QualityThresholds(
+    min_sharpness=float(os.environ.get('FACE_MIN_SHARPNESS', '15')),
+    min_brightness=float(os.environ.get('FACE_MIN_BRIGHTNESS', '40')),
+    max_brightness=float(os.environ.get('FACE_MAX_BRIGHTNESS', '215')),
+    min_face_fraction=float(os.environ.get('FACE_MIN_FACE_FRACTION', '0.12')),
+)
+
+
+# Face detection per endpoint. Frames are detected on a copy downscaled to
+# FACE_DETECT_MAX_SIDE (0 = full size). Model ('hog' / 'cnn'), upsample
+# count and the quality pre-filter can be overridden per endpoint, e.g.
+# FACE_REGISTER_MODEL=cnn or FACE_REGISTER_QUALITY=0.
+def _detection_options(endpoint: str) -> DetectionOptions:
+    prefix = f'FACE_{endpoint.upper()}_'
+    return DetectionOptions(
+        max_side=int(os.environ.get(prefix + 'MAX_SIDE', os.environ.get('FACE_DETECT_MAX_SIDE', '640'))),
+        model=os.environ.get(prefix + 'MODEL', 'hog'),
+        upsample=int(os.environ.get(prefix + 'UPSAMPLE', '1')),
+        quality=FACE_QUALITY if os.environ.get(prefix + 'QUALITY', '1') == '1' else None,
+    )
+
+
+FACE_DETECTION = {
+    'signup':       _detection_options('signup'),
+    'register':     _detection_options('register'),
+    'authenticate': _detection_options('authenticate'),
+}
+
+# Pooled SQLite connections shared by all request threads
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '8'))
+
+# ESP controllers, one per room (see device_hub). Without the JSON file a
+# single controller "main" is used on ESP_PORT.
+ESP_CONTROLLERS = os.environ.get('ESP_CONTROLLERS', os.path.join(BASE_DIR, 'controllers.json'))
+ESP_PORT        = os.environ.get('ESP_PORT', 'COM3')
+ESP_BAUDRATE    = 115200
+DOOR_CONTROLLER = os.environ.get('DOOR_CONTROLLER')   # receives GRANTED; default: first controller
+
+# Device commands: rewritten if the ESP doesn't report the new state in time
+COMMAND_ACK_TIMEOUT_S = float(os.environ.get('COMMAND_ACK_TIMEOUT_S', '5'))
+COMMAND_MAX_ATTEMPTS  = int(os.environ.get('COMMAND_MAX_ATTEMPTS', '3'))
+
+# Automation rules evaluated on every packet (see automation); none without the file
+AUTOMATION_RULES = os.environ.get('AUTOMATION_RULES', os.path.join(BASE_DIR, 'automations.json'))
+
+# Sensor history: raw samples + 1-minute / 1-hour rollups, flushed in batches
+HISTORY_DIR     = os.environ.get('HISTORY_DIR', os.path.join(BASE_DIR, 'history'))
+HISTORY_FLUSH_S = float(os.environ.get('HISTORY_FLUSH_S', '5'))
+
+# Audit journal: segments rotated at AUDIT_SEGMENT_MB, the oldest deleted past
+# AUDIT_KEEP_SEGMENTS (0 keeps all); events gathered for AUDIT_COMMIT_S share one fsync
+AUDIT_DIR           = os.environ.get('AUDIT_DIR', os.path.join(BASE_DIR, 'audit'))
+AUDIT_SEGMENT_MB    = float(os.environ.get('AUDIT_SEGMENT_MB', '4'))
+AUDIT_KEEP_SEGMENTS = int(os.environ.get('AUDIT_KEEP_SEGMENTS', '0'))
+AUDIT_COMMIT_S      = float(os.environ.get('AUDIT_COMMIT_S', '0.05'))
+AUDIT_MAX_RESULTS   = 1000
+
+# Server-Sent Events push server (runs alongside the Flask app, or in the gateway)
+EVENTS_PORT = int(os.environ.get('EVENTS_PORT', '5001'))
+
+# Longest a GET /state?since=... request is held open waiting for a change
+STATE_LONG_POLL_S = float(os.environ.get('STATE_LONG_POLL_S', '25'))
+
+# Production mode: the device gateway process owns the ESPs and their state
+# and serves the web workers over this Unix socket (see device_gateway)
+GATEWAY_SOCKET = os.environ.get('GATEWAY_SOCKET', os.path.join(BASE_DIR, 'gateway.sock'))
+
+# How often a web worker sends its metrics to the gateway, which serves the
+# sum of all of them at /metrics (METRICS=0 turns metrics off altogether)
+METRICS_PUSH_S = float(os.environ.get('METRICS_PUSH_S', '10'))
 
 # ---------------------------------------------------------------------------
 # App setup
 # ---------------------------------------------------------------------------
 app = Flask(__name__)
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_MB * 1024 * 1024
 CORS(app, resources={r"/*": {"origins": "*"}})
 
+metrics.histogram('http_request_seconds', 'Request handling time per route, method and status')
+metrics.counter('face_frames_rejected_total', 'Frames turned away by the quality pre-filter, by reason')
+metrics.counter('automation_actions_total', 'Device commands issued by automation rules, by rule and state')
+
+if metrics.ENABLED:
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def observe_request(response: Response) -> Response:
+        started = g.pop('request_started', None)
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            metrics.observe('http_request_seconds', time.perf_counter() - started,
+                            route=route, method=request.method, status=response.status_code)
+        return response
+
 # ---------------------------------------------------------------------------
-# Shared ESP state  (written by serial reader thread, read by routes)
-# Protected by a lock so there are no race conditions.
+# ESP controllers + shared state  (written by the device hub thread, read by routes)
+# One state shard per controller, all protected by one lock so there are no
+# race conditions and published versions follow the order of changes.
 # ---------------------------------------------------------------------------
+device_hub = DeviceHub(load_controllers(ESP_CONTROLLERS, ESP_PORT, ESP_BAUDRATE))
+
 _state_lock = threading.Lock()
 
-esp_state = {
-    # Sensor readings
-    'temperature': None,
-    'humidity':    None,
-    'motion':      False,
-    'last_update': None,   # ISO timestamp of the last received packet
+SENSOR_KEYS = frozenset({'temperature', 'humidity', 'motion'})
 
-    # Device states — authoritative mirror of what the ESP is actually doing
-    'fan':    'off',
-    'lights': 'off',
-}
 
+def new_shard(controller: Controller) -> dict:
+    return {
+        # Sensor readings
+        'temperature': None,
+        'humidity':    None,
+        'motion':      False,
+        'last_update': None,   # time.monotonic() of the last packet; formatted when served
+
+        # Device states — authoritative mirror of what the ESP is actually doing
+        **{device: 'off' for device in controller.devices},
+    }
+
+
+# controller id → state shard
+esp_state = {c.id: new_shard(c) for c in device_hub.controllers.values()}
+
+# Every change to esp_state is published here (see update_esp_state)
+state_broker = StateBroker()
+
+# Broker version of the last change to each group — cache keys for the
+# serialized /sensors and /device/list responses (see cached_json)
+state_versions = {'sensors': 0, 'devices': 0}
+
+# Last door grant (op_grant) — owned, like esp_state, by the device process
 door_state = {
     'status':     'IDLE',
     'username':   None,
     'granted_at': None,
 }
 
+# controller id → history of its sensor packets; created in serve() / run_gateway()
+sensor_history: dict[str, SensorHistory] = {}
+
+# Set in web workers (worker_app): device state lives in the gateway process
+# and is reached through device_call(). None when this process owns it.
+gateway: GatewayClient | None = None
+
+# The audit journal where device state lives (start_devices), a forwarder to
+# it in web workers (worker_app)
+audit: AuditJournal | AuditForwarder | None = None
+audit_batches = AuditBatches()   # forwarded batch ids already journaled (gateway side)
+
+
+def audit_event(kind: str, username: str | None = None, **fields) -> None:
+    """Journal an event; never blocks on disk or on the gateway."""
+    if audit is not None:
+        audit.record(kind, username, **fields)
+
 # ---------------------------------------------------------------------------
-# Serial port
+# Face gallery — every enrolled embedding kept in memory for matching.
+# Loaded once at startup (warm_up_face_stack), then updated by the routes
+# that write to `faces`.
 # ---------------------------------------------------------------------------
-_serial_conn: serial.Serial | None = None
-_serial_lock = threading.Lock()
+face_pool = FaceWorkerPool(FACE_WORKERS, FACE_QUEUE_SIZE, FACE_TIMEOUT_S, FACE_CACHE_SIZE)
 
+face_gallery = FaceGallery(
+    make_index(FACE_MATCHER, **({'nprobe': FACE_IVF_NPROBE} if FACE_MATCHER == 'ivf' else {})),
+    aggregate=FACE_MATCH_AGGREGATE,
+)
 
-def get_serial() -> serial.Serial | None:
-    global _serial_conn
-    with _serial_lock:
-        if _serial_conn and _serial_conn.is_open:
-            return _serial_conn
-        try:
-            _serial_conn = serial.Serial(ESP_PORT, ESP_BAUDRATE, timeout=1)
-            print(f'[serial] Connected on {ESP_PORT}')
-            return _serial_conn
-        except serial.SerialException as e:
-            ports = [p.device for p in serial.tools.list_ports.comports()]
-            print(f'[serial] Cannot open {ESP_PORT}: {e}')
-            print(f'[serial] Available ports: {ports}')
-            return None
+# Startup state of the slow subsystems, reported by /health
+readiness       = Readiness('database', 'gallery', 'face_models')
+FACE_SUBSYSTEMS = ('face_models', 'gallery')
 
+# Sessions: verified-token cache, /auth/me profiles, revoked token ids
+token_cache   = TokenCache(JWT_CACHE_SIZE)
+profile_cache = ProfileCache(PROFILE_CACHE_SIZE)
+revoked_jtis  = RevocationList()   # loaded from revoked_tokens in init_db
 
-def send_to_esp(message: str) -> None:
-    """Write a newline-terminated command to the ESP."""
-    conn = get_serial()
-    if conn:
-        try:
-            with _serial_lock:
-                conn.write(f'{message}\n'.encode('utf-8'))
-                conn.flush()
-            print(f'[serial] >> {message}')
-        except serial.SerialException as e:
-            print(f'[serial] Write error: {e}')
+# ---------------------------------------------------------------------------
+# ESP commands
+# ---------------------------------------------------------------------------
+def send_to_esp(message: str, controller_id: str | None = None) -> bool:
+    """Write a newline-terminated command to one ESP (default: the first controller)."""
+    return device_call('send', message=message, controller=controller_id)
+
+
+def command_done(command) -> None:
+    """A device command was acknowledged or gave up — settle the mirror on what the ESP reports."""
+    if command.state != 'failed':
+        return
+    print(f'[commands] {command.message} to {command.controller_id} failed: {command.error}')
+    audit_event('command_failed', controller=command.controller_id, device=command.device,
+                status=command.target, attempts=command.attempts, error=command.error)
+    if command.reported is not None:
+        update_esp_state(command.controller_id, {command.device: command.reported})
+
+
+# Device toggles are written by the queue's own thread, never inside a request
+device_commands = CommandQueue(device_hub.send, COMMAND_ACK_TIMEOUT_S, COMMAND_MAX_ATTEMPTS,
+                               on_done=command_done)
+
+
+def run_automation(rule, status: str) -> None:
+    """A rule fired or released — command its device through the queue, like a toggle."""
+    with _state_lock:
+        current = esp_state[rule.controller][rule.device]
+    if current == status:
+        return
+    print(f'[automation] {rule.id}: {rule.controller}/{rule.device} → {status} '
+          f'({rule.sensor} = {rule.last_value})')
+    metrics.inc('automation_actions_total', rule=rule.id, status=status)
+    op_toggle(rule.controller, rule.device, status, source=f'automation:{rule.id}')
+
+
+# Rules are evaluated on the device hub thread as packets arrive (handle_esp_lines)
+automation = AutomationEngine(load_rules(AUTOMATION_RULES, device_hub.controllers, SENSOR_KEYS),
+                              act=run_automation)
+
+
+# ---------------------------------------------------------------------------
+# ESP state updates + payloads
+# ---------------------------------------------------------------------------
+def update_esp_states(updates: dict) -> dict:
+    """
+    Apply {controller id: changes} to the state shards under one lock
+    acquisition and, if any sensor or device value actually changed,
+    publish the affected groups to state_broker as one event. A packet
+    that only refreshes last_update publishes nothing.
+
+    Returns {controller id: (temperature, humidity, motion)} after the update.
+    """
+    changed = set()
+    with _state_lock:
+        for controller_id, changes in updates.items():
+            shard = esp_state[controller_id]
+            changed.update(k for k, v in changes.items() if k != 'last_update' and shard.get(k) != v)
+            shard.update(changes)
+        readings = {
+            cid: (esp_state[cid]['temperature'], esp_state[cid]['humidity'], esp_state[cid]['motion'])
+            for cid in updates
+        }
+        if changed:
+            event = {}
+            if changed & SENSOR_KEYS:
+                event['sensors'] = build_sensors(esp_state)
+            if changed - SENSOR_KEYS:
+                event['devices'] = build_devices(esp_state)
+            # Published under the lock so versions follow the order of changes
+            version = state_broker.publish(event)
+            for group in event:
+                state_versions[group] = version
+    return readings
+
+
+def update_esp_state(controller_id: str, changes: dict) -> None:
+    """Apply changes to one controller's shard (see update_esp_states)."""
+    update_esp_states({controller_id: changes})
+
+
+# ---------------------------------------------------------------------------
+# Cached state responses
+# Polled routes serialize once per state version; every other poll is a
+# dict lookup, and a client that sends the ETag back gets a bodiless 304.
+# ---------------------------------------------------------------------------
+_BOOT_ID = uuid.uuid4().hex[:8]   # in every state version: a restarted state owner never matches old ETags
+_response_cache = {}              # name → (version, payload, local version, etag, body)
+
+
+def cached_json(name: str, local=None) -> Response:
+    """
+    JSON response for one state group (see op_state), serialized only
+    when its version differs from the cached one. local=(version, build)
+    merges this process's own fields into the payload, e.g. /health's
+    readiness of the web worker's face stack.
+    """
+    entry = _response_cache.get(name)
+    state = device_call('state', group=name, known=entry[0] if entry else None)
+    version = state['version']
+    local_version = local[0]() if local else None
+    if entry is None or entry[0] != version or entry[2] != local_version:
+        payload = state['payload'] if 'payload' in state else entry[1]
+        body    = app.json.dumps({**payload, **local[1]()} if local else payload).encode('utf-8')
+        # Derived from the versions alone, so every web worker in the same state hands out the same ETag
+        key     = repr((version, local_version) if local else version).encode()
+        etag    = f'{name}-{hashlib.blake2b(key, digest_size=8).hexdigest()}'
+        entry   = _response_cache[name] = (version, payload, local_version, etag, body)
+
+    _version, _payload, _local_version, etag, body = entry
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
     else:
-        print(f'[serial] Not connected — could not send: {message}')
+        response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'   # always revalidate, never serve stale
+    return response
+
+
+def monotonic_iso(ts: float | None) -> str | None:
+    """A time.monotonic() stamp as a UTC ISO timestamp, for responses."""
+    if ts is None:
+        return None
+    wall = time.time() - (time.monotonic() - ts)
+    return datetime.datetime.utcfromtimestamp(wall).isoformat()
+
+
+def build_sensors(state: dict) -> list:
+    sensors = []
+    for controller in device_hub.controllers.values():
+        shard  = state[controller.id]
+        temp   = shard['temperature']
+        hum    = shard['humidity']
+        motion = shard['motion']
+        room   = {'controller': controller.id, 'controllerName': controller.name}
+        sensors += [
+            {
+                'id':     f'{controller.id}/temperature',
+                'name':   'Temperature Sensor',
+                'value':  temp if temp is not None else '--',
+                'unit':   '°C',
+                'status': 'active' if temp is not None else 'inactive',
+                **room,
+            },
+            {
+                'id':     f'{controller.id}/humidity',
+                'name':   'Humidity Sensor',
+                'value':  hum if hum is not None else '--',
+                'unit':   '%',
+                'status': 'active' if hum is not None else 'inactive',
+                **room,
+            },
+            {
+                'id':     f'{controller.id}/motion',
+                'name':   'IR Motion Sensor',
+                'value':  'Detected' if motion else 'Not detected',
+                'status': 'detected' if motion else 'not_detected',
+                **room,
+            },
+        ]
+    return sensors
+
+
+def build_device(controller: Controller, device: str, status: str) -> dict:
+    return {
+        'id':             f'{controller.id}/{device}',
+        'name':           controller.devices[device],
+        'status':         status,
+        'controller':     controller.id,
+        'controllerName': controller.name,
+    }
+
+
+def build_devices(state: dict) -> list:
+    return [
+        build_device(controller, device, state[controller.id][device])
+        for controller in device_hub.controllers.values()
+        for device in controller.devices
+    ]
+
+
+def build_door() -> dict:
+    granted = door_state['granted_at']
+    return {
+        'status':    door_state['status'],
+        'username':  door_state['username'],
+        'grantedAt': granted.isoformat() if granted else None,
+    }
+
+
+def build_state() -> tuple:
+    """
+    (version, payload) for /state — called under _state_lock, so sensors,
+    devices, door and liveness all come from the same moment. Liveness
+    is as of the last change: it doesn't bump the version by itself.
+    """
+    version = state_broker.version
+    _health_version, health = build_health()
+    return version, {
+        'version':     f'{_BOOT_ID}.{version}',
+        'sensors':     build_sensors(esp_state),
+        'devices':     build_devices(esp_state),
+        'door':        build_door(),
+        'controllers': health['controllers'],
+        'espLastSeen': health['esp_last_seen'],
+    }
+
+
+def state_snapshot() -> dict:
+    """Full state for a newly connected event-stream client."""
+    with _state_lock:
+        return {
+            'version': state_broker.version,
+            'sensors': build_sensors(esp_state),
+            'devices': build_devices(esp_state),
+            'door':    build_door(),
+        }
 
 
 # ---------------------------------------------------------------------------
-# Background thread: continuously read lines from the ESP
+# Long-poll wake-ups for GET /state?since=. The device process notifies on
+# every broker event and relays it to the web workers, which notify theirs.
 # ---------------------------------------------------------------------------
-def serial_reader() -> None:
+_state_changed    = threading.Condition()
+_state_generation = 0   # bumped on every notification
+
+
+def notify_state_waiters(_event: dict | None = None) -> None:
+    global _state_generation
+    with _state_changed:
+        _state_generation += 1
+        _state_changed.notify_all()
+
+
+def on_state_event(event: dict) -> None:
     """
-    Runs in a daemon thread.
-    Reads lines from the ESP and updates esp_state.
+    Broker subscriber in the device process (called under _state_lock — must
+    not block). gateway_server.publish only queues: the workers' sockets are
+    written by per-subscriber threads once the lock is released.
+    """
+    notify_state_waiters()
+    if gateway_server is not None:
+        gateway_server.publish({'kind': 'state', 'version': event['version']})
 
-    Expected JSON format from ESP every ~2 s:
-      {"temp":25.3,"hum":60.1,"motion":1,"fan":"on","lights":"on"}
 
-    Any non-JSON line (debug prints, etc.) is just logged.
+state_broker.subscribe(on_state_event)
+
+
+def wait_for_state(since: str) -> None:
+    """
+    Return once the /state version differs from `since` ('<boot>.<n>', as
+    handed out in the payload), or after STATE_LONG_POLL_S.
     """
-    print('[serial_reader] Starting...')
+    try:
+        boot, number = since.split('.')
+        known = [boot, int(number)]
+    except ValueError:
+        return   # not one of ours: answer straight away
+    deadline = time.monotonic() + STATE_LONG_POLL_S
     while True:
-        try:
-            conn = get_serial()
-            if not conn:
-                threading.Event().wait(3)   # Wait 3 s before retrying
-                continue
+        # Generation read first: a change landing after the check below still wakes us
+        with _state_changed:
+            generation = _state_generation
+        if device_call('state', group='state', known=known)['version'] != known:
+            return
+        with _state_changed:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            _state_changed.wait_for(lambda: _state_generation != generation, remaining)
 
-            raw = conn.readline()
-            if not raw:
-                continue
 
-            line = raw.decode('utf-8', errors='ignore').strip()
-            if not line:
-                continue
+# ---------------------------------------------------------------------------
+# ESP packets  (called on the device hub thread once per wake-up)
+# ---------------------------------------------------------------------------
+def handle_esp_lines(batch: list) -> None:
+    """
+    Parse the lines received from each ready ESP and apply them.
 
-            # Try to parse as JSON sensor packet
-            if line.startswith('{'):
-                try:
-                    data = json.loads(line)
-                    with _state_lock:
-                        if 'temp'   in data: esp_state['temperature'] = round(float(data['temp']),  1)
-                        if 'hum'    in data: esp_state['humidity']    = round(float(data['hum']),   1)
-                        if 'motion' in data: esp_state['motion']      = bool(int(data['motion']))
-                        if 'fan'    in data: esp_state['fan']         = str(data['fan'])
-                        if 'lights' in data: esp_state['lights']      = str(data['lights'])
-                        esp_state['last_update'] = datetime.datetime.utcnow().isoformat()
-                except (json.JSONDecodeError, ValueError, KeyError) as e:
-                    print(f'[serial_reader] JSON parse error: {e} — line: {line}')
-            else:
+    Each ESP sends a packet every ~2 s, as JSON or in the compact form
+    (see esp_protocol):
+      {"temp":25.3,"hum":60.1,"motion":1,"fan":"on","lights":"on"}
+      $25.3,60.1,1,1,1
+    with one device field per device the controller is configured with.
+
+    Packets from one controller in the same batch are folded together,
+    so only the latest value of each field is applied — under a single
+    lock acquisition for the whole batch. Any other line (debug prints,
+    etc.) is just logged.
+    """
+    now     = time.monotonic()
+    updates = {}
+    readings_by_controller = {}
+    for controller, lines in batch:
+        sensors, devices, packets = {}, {}, 0
+        for line in lines:
+            try:
+                packet = parse_packet(line, controller.devices)
+            except ValueError as e:
+                print(f'[ESP {controller.id}] Packet parse error: {e} — line: {line}')
+                continue
+            if packet is None:
                 # Plain debug print from ESP — just show it
-                print(f'[ESP] {line}')
+                print(f'[ESP {controller.id}] {line}')
+                continue
+            sensors.update(packet[0])
+            devices.update(packet[1])
+            packets += 1
+        if not packets:
+            continue
+
+        # The packet acknowledges commands it reflects; devices with a command
+        # still outstanding keep their requested state in the mirror meanwhile
+        device_commands.on_state(controller.id, devices)
+        pending = device_commands.pending_devices(controller.id)
+        readings_by_controller[controller.id] = sensors
+        updates[controller.id] = {
+            **sensors,
+            **{d: v for d, v in devices.items() if d not in pending},
+            'last_update': now,
+        }
+    if not updates:
+        return
+
+    readings = update_esp_states(updates)
+    wall = time.time()
+    for controller_id, reading in readings.items():
+        history = sensor_history.get(controller_id)
+        if history:
+            history.append(wall, *reading)
+
+    # Only the rules watching a sensor these packets carried are evaluated
+    if automation:
+        for controller_id, sensors in readings_by_controller.items():
+            automation.on_readings(controller_id, sensors, now, wall)
+
+
+def esp_connection_changed(controller: Controller, connected: bool, error: str | None) -> None:
+    if connected:
+        audit_event('esp_connected', controller=controller.id, port=controller.port)
+    else:
+        audit_event('esp_disconnected', controller=controller.id, port=controller.port, error=error)
+
+
+# ---------------------------------------------------------------------------
+# Device operations — everything the routes need from the process that owns
+# the ESPs. Called directly in single-process mode; in production mode the
+# web workers reach them in the gateway process through device_call().
+# ---------------------------------------------------------------------------
+gateway_server: GatewayServer | None = None   # set in run_gateway()
+
+# group → (current version, build) — build runs under _state_lock and
+# returns (version, payload) so the two are read consistently
+STATE_GROUPS = {
+    'sensors': (lambda: state_versions['sensors'],
+                lambda: (state_versions['sensors'], build_sensors(esp_state))),
+    'devices': (lambda: state_versions['devices'],
+                lambda: (state_versions['devices'], build_devices(esp_state))),
+    'health':  (lambda: health_version(), lambda: build_health()),
+    'state':   (lambda: state_broker.version, lambda: build_state()),
+}
+
+
+def op_state(group: str, known=None) -> dict:
+    """
+    {version, payload} of one state group, for cached_json. The payload
+    is left out when the caller's known version is still current.
+    """
+    if group not in STATE_GROUPS:
+        raise GatewayError(f'Unknown state group "{group}"', 404)
+    current, build = STATE_GROUPS[group]
+    if known == [_BOOT_ID, current()]:
+        return {'version': known}
+    with _state_lock:
+        version, payload = build()
+    return {'version': [_BOOT_ID, version], 'payload': payload}
+
+
+def op_toggle(controller: str, device: str, status: str,
+              username: str | None = None, source: str = 'dashboard') -> dict:
+    """Queue a device command and update the mirror optimistically. Returns the command."""
+    resolved = device_hub.resolve(f'{controller}/{device}')
+    if resolved is None:
+        raise GatewayError('Unknown device', 400)
+
+    # Without a command outstanding the mirror holds what the ESP last reported
+    with _state_lock:
+        reported = esp_state[controller][device]
+    command = device_commands.submit(controller, device, status, reported)
+    audit_event('device_toggle', username, controller=controller, device=device, status=status,
+                previous=reported, source=source, command=command.id)
+
+    # Optimistically update our mirror so the next /device/list is correct
+    # even before the ESP echoes back a JSON packet (reverted if it never does)
+    update_esp_state(controller, {device: status})
+    return command.to_dict()
+
+
+def op_command(id: str) -> dict | None:
+    command = device_commands.get(id)
+    return command.to_dict() if command else None
+
+
+def op_history(controller: str, start: float, end: float, resolution: str) -> dict:
+    if not sensor_history:
+        raise GatewayError('Sensor history is not enabled', 503)
+    resolution, points = sensor_history[controller].query(start, end, resolution)
+    return {'resolution': resolution, 'points': points}
+
+
+def op_send(message: str, controller: str | None = None) -> bool:
+    return device_hub.send(controller, message)
+
+
+def op_grant(username: str, controller: str | None = None, distance: float | None = None) -> bool:
+    """Open the door for username and record the grant, as one state change."""
+    sent = device_hub.send(controller, 'GRANTED')
+    audit_event('door_grant', username, controller=controller or device_hub.default.id,
+                distance=distance, sent=sent)
+    with _state_lock:
+        door_state.update({'status': 'GRANTED', 'username': username,
+                           'granted_at': datetime.datetime.utcnow()})
+        state_broker.publish({'door': build_door()})
+    return sent
+
+
+def op_publish(event: dict) -> None:
+    """Relay a cache-sync event to every web worker (see notify_peers)."""
+    if gateway_server is not None:
+        gateway_server.publish(event)
+
+
+_metric_sources = {}   # web worker pid → the metrics snapshot it last pushed
+
+
+def op_metrics(source: int, snapshot: dict, merged: bool = True) -> dict | None:
+    """Keep a web worker's metrics; return the sum over the gateway and every worker."""
+    _metric_sources[source] = snapshot
+    if merged:
+        return metrics.merge(metrics.snapshot(), *_metric_sources.values())
+    return None
+
+
+def op_automations() -> list:
+    return automation.status()
+
+
+def op_audit(events: list, batch_id: str | None = None) -> None:
+    """Journal a batch of events forwarded by a web worker, once even if it is resent."""
+    if audit is None:
+        raise GatewayError('Audit log is not enabled', 503)
+    if batch_id is not None and not audit_batches.first_time(batch_id):
+        return
+    audit.extend(events)
+
+
+def op_audit_query(start: float, end: float, username: str | None = None,
+                   kinds: list | None = None, limit: int = 100) -> dict:
+    if audit is None:
+        raise GatewayError('Audit log is not enabled', 503)
+    events, truncated = audit.query(start, end, username, set(kinds) if kinds else None, limit)
+    return {'events': events, 'truncated': truncated}
+
+
+GATEWAY_OPS = {
+    'state':       op_state,
+    'toggle':      op_toggle,
+    'command':     op_command,
+    'history':     op_history,
+    'send':        op_send,
+    'grant':       op_grant,
+    'publish':     op_publish,
+    'metrics':     op_metrics,
+    'automations': op_automations,
+    'audit':       op_audit,
+    'audit_query': op_audit_query,
+}
+
+
+def device_call(op: str, **args):
+    """Run a device operation here, or in the gateway when this process is a web worker."""
+    if gateway is not None:
+        return gateway.call(op, **args)
+    return GATEWAY_OPS[op](**args)
 
-        except serial.SerialException as e:
-            print(f'[serial_reader] Serial error: {e} — reconnecting in 3 s')
-            with _serial_lock:
-                _serial_conn = None
-            threading.Event().wait(3)
-        except Exception as e:
-            print(f'[serial_reader] Unexpected error: {e}')
-            threading.Event().wait(1)
+
+def handle_gateway_request(op: str, args: dict):
+    if op not in GATEWAY_OPS:
+        raise GatewayError(f'Unknown operation "{op}"', 400)
+    return GATEWAY_OPS[op](**args)
 
 
 # ---------------------------------------------------------------------------
 # Database
 # ---------------------------------------------------------------------------
-def get_db() -> sqlite3.Connection:
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+_db_pool: ConnectionPool | None = None
+_db_pool_lock = threading.Lock()
+
+
+def get_db():
+    """
+    Borrow a pooled connection for a `with` block:
+        with get_db() as conn: ...
+    The block commits on success and rolls back on error.
+    """
+    global _db_pool
+    if _db_pool is None or _db_pool.path != DB_PATH:
+        with _db_pool_lock:
+            if _db_pool is None or _db_pool.path != DB_PATH:
+                _db_pool = ConnectionPool(DB_PATH, size=DB_POOL_SIZE)
+    return _db_pool.connection()
 
 
 def init_db() -> None:
@@ -201,10 +841,100 @@ def init_db() -> None:
                 username    TEXT NOT NULL,
                 embedding   BLOB NOT NULL,
                 created_at  TEXT NOT NULL,
+                last_used_at TEXT,
                 FOREIGN KEY (user_id) REFERENCES users(id)
             )
         """)
+        # Databases created before multi-sample templates lack last_used_at
+        columns = {r['name'] for r in conn.execute('PRAGMA table_info(faces)')}
+        if 'last_used_at' not in columns:
+            conn.execute('ALTER TABLE faces ADD COLUMN last_used_at TEXT')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_faces_username ON faces(username)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_faces_user_id  ON faces(user_id)')
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS revoked_tokens (
+                jti         TEXT PRIMARY KEY,
+                user_id     TEXT NOT NULL,
+                expires_at  REAL NOT NULL
+            )
+        """)
+        conn.execute('DELETE FROM revoked_tokens WHERE expires_at <= ?', (time.time(),))
         conn.commit()
+    load_revoked_tokens()
+
+
+def load_revoked_tokens() -> None:
+    with get_db() as conn:
+        revoked_jtis.load((r['jti'], r['expires_at'])
+                          for r in conn.execute('SELECT jti, expires_at FROM revoked_tokens'))
+
+
+def load_face_gallery() -> None:
+    """(Re)build the in-memory gallery from the faces table."""
+    with metrics.timer('face_stage_seconds', stage='gallery_load'):
+        with get_db() as conn:
+            rows = conn.execute('SELECT id, user_id, username, embedding FROM faces').fetchall()
+        face_gallery.load(
+            ((r['id'], r['user_id'], r['username'], blob_to_embedding(r['embedding'])) for r in rows),
+            index_path=FACE_INDEX_PATH,
+        )
+    print(f'[gallery] Loaded {len(face_gallery)} face(s) — matcher: {face_gallery.index.name}')
+
+
+def warm_up_face_stack() -> None:
+    """
+    Load the gallery and start the face workers (which load the dlib
+    models) on background threads, so the server answers sensor / device
+    requests and /health while they load.
+    """
+    readiness.run('gallery', load_face_gallery)
+    readiness.run('face_models', face_pool.start)
+
+
+# ---------------------------------------------------------------------------
+# Web worker cache sync
+# Each web worker keeps its own face gallery, profile cache and revocation
+# list. A worker that changes one tells the others through the gateway;
+# they re-read the affected rows from the database.
+# ---------------------------------------------------------------------------
+def notify_peers(kind: str, **data) -> None:
+    """Publish a cache-sync event to the other web workers (no-op in a single process)."""
+    if gateway is None:
+        return
+    try:
+        gateway.call('publish', event={'kind': kind, 'origin': os.getpid(), **data})
+    except GatewayError as e:
+        print(f'[workers] Could not notify other workers of {kind}: {e}')
+
+
+def reload_user_faces(username: str) -> None:
+    with get_db() as conn:
+        rows = conn.execute('SELECT id, user_id, username, embedding FROM faces WHERE username = ?',
+                            (username,)).fetchall()
+    face_gallery.remove_username(username)
+    for r in rows:
+        face_gallery.upsert(r['id'], r['user_id'], r['username'], blob_to_embedding(r['embedding']))
+
+
+def on_peer_event(event: dict) -> None:
+    """Apply another worker's change (called on the gateway subscription thread)."""
+    if event.get('origin') == os.getpid():
+        return
+    kind = event.get('kind')
+    if kind == 'faces':
+        reload_user_faces(event['username'])
+        if event.get('user_id'):
+            profile_cache.invalidate(event['user_id'])
+    elif kind == 'revoke':
+        revoked_jtis.revoke(event['jti'], event['exp'])
+    elif kind == 'state':
+        notify_state_waiters()
+    elif kind == 'resync':
+        # Reconnected to the gateway — events may have been missed meanwhile
+        load_revoked_tokens()
+        load_face_gallery()
+        profile_cache.invalidate()
+        notify_state_waiters()
 
 
 # ---------------------------------------------------------------------------
@@ -226,6 +956,7 @@ def make_jwt(user_id: str, username: str, email: str) -> str:
         'sub':      user_id,
         'username': username,
         'email':    email,
+        'jti':      uuid.uuid4().hex,   # lets a single token be revoked
         'iat': datetime.datetime.utcnow(),
         'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=JWT_EXPIRY_HOURS),
     }
@@ -233,48 +964,248 @@ def make_jwt(user_id: str, username: str, email: str) -> str:
 
 
 def decode_jwt(token: str) -> dict | None:
-    try:
-        return jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-    except (jwt.ExpiredSignatureError, jwt.InvalidTokenError):
+    """Verified payload, or None. Repeat checks of a token skip the HMAC."""
+    payload = token_cache.get(token)
+    if payload is None:
+        try:
+            payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+        except (jwt.ExpiredSignatureError, jwt.InvalidTokenError):
+            return None
+        token_cache.put(token, payload)
+    if payload.get('jti') in revoked_jtis:
         return None
+    return payload
 
 
-def get_current_user() -> dict | None:
+def revoke_jwt(token: str, payload: dict) -> None:
+    """Reject token from now on, until it would have expired anyway."""
+    jti, expires_at = payload.get('jti'), float(payload['exp'])
+    token_cache.discard(token)
+    if not jti:
+        return   # issued before tokens carried an id — can only expire
+    with get_db() as conn:
+        conn.execute('INSERT OR IGNORE INTO revoked_tokens (jti, user_id, expires_at) VALUES (?, ?, ?)',
+                     (jti, payload['sub'], expires_at))
+    revoked_jtis.revoke(jti, expires_at)
+    notify_peers('revoke', jti=jti, exp=expires_at)
+
+
+def bearer_token() -> str | None:
     auth_header = request.headers.get('Authorization', '')
     if not auth_header.startswith('Bearer '):
         return None
-    return decode_jwt(auth_header[len('Bearer '):])
+    return auth_header[len('Bearer '):]
+
+
+def get_current_user() -> dict | None:
+    token = bearer_token()
+    return decode_jwt(token) if token else None
+
+
+def load_profile(user_id: str) -> dict | None:
+    with get_db() as conn:
+        user = conn.execute(
+            '''SELECT id, username, email,
+                      (SELECT COUNT(*) FROM faces WHERE faces.username = users.username) AS face_samples
+               FROM users WHERE id = ?''', (user_id,)
+        ).fetchone()
+    if not user:
+        return None
+    return {'id': user['id'], 'username': user['username'], 'email': user['email'],
+            'faceSamples': user['face_samples']}
 
 
 # ---------------------------------------------------------------------------
-# Image / face helpers
+# Face worker helpers
 # ---------------------------------------------------------------------------
-def embedding_to_blob(embedding: np.ndarray) -> bytes:
-    buf = io.BytesIO()
-    np.save(buf, embedding)
-    return buf.getvalue()
+def face_pool_error(e: Exception, **extra):
+    """Response for a saturated (429) or too-slow (503) face worker pool."""
+    if isinstance(e, FaceWorkerBusy):
+        return jsonify({'success': False, **extra,
+                        'message': 'Face service is busy. Please try again.'}), 429, {'Retry-After': '1'}
+    return jsonify({'success': False, **extra,
+                    'message': 'Face processing timed out. Please try again.'}), 503
 
 
-def blob_to_embedding(blob: bytes) -> np.ndarray:
-    return np.load(io.BytesIO(blob))
+def face_stack_unavailable(names=FACE_SUBSYSTEMS, **extra):
+    """
+    None once the face subsystems in names are loaded (waiting up to
+    FACE_WARMUP_WAIT_S for them), else a 503 saying why.
+    """
+    if readiness.wait(names, FACE_WARMUP_WAIT_S):
+        return None
+    if readiness.failed(names):
+        return jsonify({'success': False, **extra, 'message': 'Face recognition is unavailable.'}), 503
+    return jsonify({'success': False, **extra,
+                    'message': 'Face recognition is still starting. Please try again.'}), 503, {'Retry-After': '2'}
 
 
-def decode_image(image_bytes: bytes) -> np.ndarray:
-    return np.array(Image.open(io.BytesIO(image_bytes)).convert('RGB'))
+def frame_rejected(e: FrameRejected, **extra):
+    """422 saying why the frame was turned away, so the camera UI can ask for a retake."""
+    print(f'[face] Frame rejected: {e}')
+    metrics.inc('face_frames_rejected_total', reason=e.reason)
+    return jsonify({'success': False, **extra, 'reason': e.reason, 'retake': True,
+                    'message': e.message}), 422
 
 
-def extract_embedding(image_array: np.ndarray) -> np.ndarray | None:
-    locations = face_recognition.face_locations(image_array, model='hog')
-    if not locations:
-        return None
-    encodings = face_recognition.face_encodings(image_array, known_face_locations=locations)
-    return encodings[0] if encodings else None
+def match_face(embedding) -> dict | None:
+    with metrics.timer('face_stage_seconds', stage='match'):
+        return face_gallery.match(embedding)
+
+
+def face_login(matched: dict, **extra):
+    """Issue the JWT and open the door for an accepted gallery match."""
+    with get_db() as conn:
+        user = conn.execute(
+            'SELECT id, username, email FROM users WHERE id = ?', (matched['user_id'],)
+        ).fetchone()
+        # Keeps the sample that matched from being evicted as least-used
+        conn.execute('UPDATE faces SET last_used_at = ? WHERE id = ?', (now_iso(), matched['face_id']))
+        conn.commit()
+
+    if user:
+        user_id, username, email = user['id'], user['username'], user['email']
+    else:
+        user_id, username, email = matched['user_id'], matched['username'], ''
+
+    token = make_jwt(user_id, username, email)
+
+    # Unlock door
+    device_call('grant', username=username, controller=DOOR_CONTROLLER, distance=round(matched['distance'], 4))
+    print(f'[face/authenticate] Authenticated "{username}"')
+
+    return jsonify({
+        'success': True, 'authenticated': True, 'token': token, **extra,
+        'user': {'id': user_id, 'username': username, 'email': email},
+        'message': f'Welcome, {username}!',
+    })
+
+
+def face_refused(matched: dict, **extra):
+    """401 for a face too far from everyone enrolled; the nearest identity goes in the audit log."""
+    audit_event('face_denied', matched['username'], distance=round(matched['distance'], 4),
+                threshold=FACE_DISTANCE_THRESHOLD, route=request.path, **extra)
+    return jsonify({'success': False, 'authenticated': False, **extra,
+                    'message': 'Face not recognised. Please try again.'}), 401
+
+
+def parse_time(value: str | None, default: float) -> float:
+    """Unix seconds or a (UTC) ISO timestamp → Unix seconds. Raises ValueError."""
+    if not value:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parsed = datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=datetime.timezone.utc)
+    return parsed.timestamp()
 
 
 def now_iso() -> str:
     return datetime.datetime.utcnow().isoformat()
 
 
+# ---------------------------------------------------------------------------
+# Face enrollment helpers
+# ---------------------------------------------------------------------------
+def save_face(conn: sqlite3.Connection, username: str, embedding) -> tuple[str, str, list]:
+    """
+    Add a face sample for username (caller commits). Once the user holds
+    more than FACE_MAX_SAMPLES, the least recently matched samples are
+    deleted. Returns (face_id, user_id, evicted_face_ids).
+    """
+    user    = conn.execute('SELECT id FROM users WHERE username = ?', (username,)).fetchone()
+    user_id = user['id'] if user else username
+    face_id = str(uuid.uuid4())
+    conn.execute(
+        'INSERT INTO faces (id, user_id, username, embedding, created_at) VALUES (?, ?, ?, ?, ?)',
+        (face_id, user_id, username, embedding_to_blob(embedding), now_iso())
+    )
+    evicted = [r['id'] for r in conn.execute(
+        '''SELECT id FROM faces WHERE username = ?
+           ORDER BY COALESCE(last_used_at, created_at) DESC, rowid DESC
+           LIMIT -1 OFFSET ?''',
+        (username, FACE_MAX_SAMPLES)
+    )]
+    if evicted:
+        conn.executemany('DELETE FROM faces WHERE id = ?', [(f,) for f in evicted])
+    return face_id, user_id, evicted
+
+
+def enroll_batch(items, options: DetectionOptions) -> dict:
+    """
+    Embed (username, filename, image_bytes) items in parallel on the face
+    worker pool, then write every face row in a single transaction. An
+    image that times out is reported as `timeout`; if the pool stops
+    taking images altogether the rest of the batch is not read
+    (`complete` is false), but the faces embedded so far are still saved.
+    """
+    start    = time.perf_counter()
+    pending  = collections.deque()   # result dicts of the images in flight
+    results  = []                    # in input order
+    found    = []                    # (result dict, username, embedding)
+    complete = True
+
+    def feed():
+        for username, filename, data in items:
+            result = {'username': username, 'file': filename}
+            results.append(result)
+            pending.append(result)
+            yield data
+
+    try:
+        for embedding in face_pool.embed_many(feed(), options):
+            result   = pending.popleft()
+            username = result['username']
+            if isinstance(embedding, ImageDecodeError):
+                result['status'] = 'unreadable'
+            elif isinstance(embedding, FrameRejected):
+                result['status'] = embedding.reason
+            elif isinstance(embedding, FaceWorkerTimeout):
+                result['status'] = 'timeout'
+            elif embedding is None:
+                result['status'] = 'no_face'
+            else:
+                result['status'] = 'registered'
+                found.append((result, username, embedding))
+    except FaceWorkerTimeout:
+        complete = False
+        for result in pending:
+            result['status'] = 'timeout'
+
+    saved, evicted = [], []
+    if found:
+        with get_db() as conn:
+            for result, username, embedding in found:
+                face_id, user_id, gone = save_face(conn, username, embedding)
+                result['faceId'] = face_id
+                saved.append((face_id, user_id, username, embedding))
+                evicted.extend(gone)
+            conn.commit()
+        for face in saved:
+            face_gallery.upsert(*face)
+            profile_cache.invalidate(face[1])
+        # A large folder for one user may evict samples added earlier in this batch
+        face_gallery.remove_faces(evicted)
+        for user_id, username in {(face[1], face[2]) for face in saved}:
+            notify_peers('faces', username=username, user_id=user_id)
+        for result in results:
+            if result.get('faceId') in evicted:
+                result['status'] = 'evicted'
+
+    elapsed = time.perf_counter() - start
+    return {
+        'results':         results,
+        'registered':      len(saved),
+        'failed':          len(results) - len(saved),
+        'complete':        complete,
+        'elapsedSeconds':  round(elapsed, 3),
+        'imagesPerSecond': round(len(results) / elapsed, 2) if elapsed > 0 else None,
+    }
+
+
 # ===========================================================================
 # ROUTES
 # ===========================================================================
@@ -304,36 +1235,51 @@ def signup():
     if not password or len(password) < 6:
         return jsonify({'success': False, 'message': 'Password must be at least 6 characters'}), 400
 
+    embedding    = None
+    face_warning = None
+    if face_file:
+        unavailable = face_stack_unavailable()
+        if unavailable:
+            return unavailable
+        try:
+            embedding = face_pool.embed(face_file.read(), FACE_DETECTION['signup'])
+            if embedding is None:
+                face_warning = 'No face detected — register your face separately.'
+        except (FaceWorkerBusy, FaceWorkerTimeout) as e:
+            return face_pool_error(e)
+        except FrameRejected as e:
+            face_warning = f'Face image rejected ({e.reason.replace("_", " ")}) — register your face separately.'
+        except Exception:
+            face_warning = 'Face image unreadable — register your face separately.'
+
     with get_db() as conn:
         if conn.execute('SELECT id FROM users WHERE username = ?', (username,)).fetchone():
             return jsonify({'success': False, 'message': 'Username already taken'}), 409
         if conn.execute('SELECT id FROM users WHERE email = ?', (email,)).fetchone():
             return jsonify({'success': False, 'message': 'Email already registered'}), 409
 
-        user_id    = str(uuid.uuid4())
-        face_warning = None
+        user_id  = str(uuid.uuid4())
+        new_face = None
 
         conn.execute(
             'INSERT INTO users (id, username, email, password_hash, created_at) VALUES (?, ?, ?, ?, ?)',
             (user_id, username, email, hash_password(password), now_iso())
         )
 
-        if face_file:
-            try:
-                image_array = decode_image(face_file.read())
-                embedding   = extract_embedding(image_array)
-                if embedding is None:
-                    face_warning = 'No face detected — register your face separately.'
-                else:
-                    conn.execute(
-                        'INSERT INTO faces (id, user_id, username, embedding, created_at) VALUES (?, ?, ?, ?, ?)',
-                        (str(uuid.uuid4()), user_id, username, embedding_to_blob(embedding), now_iso())
-                    )
-            except Exception:
-                face_warning = 'Face image unreadable — register your face separately.'
+        if embedding is not None:
+            new_face = (str(uuid.uuid4()), user_id, username, embedding)
+            conn.execute(
+                'INSERT INTO faces (id, user_id, username, embedding, created_at) VALUES (?, ?, ?, ?, ?)',
+                (new_face[0], user_id, username, embedding_to_blob(embedding), now_iso())
+            )
 
         conn.commit()
 
+    if new_face:
+        face_gallery.upsert(*new_face)
+        notify_peers('faces', username=username, user_id=user_id)
+    profile_cache.invalidate(user_id)
+
     token   = make_jwt(user_id, username, email)
     message = 'Account created successfully'
     if face_warning:
@@ -376,16 +1322,21 @@ def me():
     payload = get_current_user()
     if not payload:
         return jsonify({'success': False, 'message': 'Invalid or expired token'}), 401
-    with get_db() as conn:
-        user = conn.execute(
-            'SELECT id, username, email FROM users WHERE id = ?', (payload['sub'],)
-        ).fetchone()
+    user = profile_cache.get(payload['sub'], load_profile)
     if not user:
         return jsonify({'success': False, 'message': 'User not found'}), 404
-    return jsonify({
-        'success': True,
-        'user': {'id': user['id'], 'username': user['username'], 'email': user['email']},
-    })
+    return jsonify({'success': True, 'user': user})
+
+
+@app.route('/auth/logout', methods=['POST'])
+def logout():
+    token   = bearer_token()
+    payload = decode_jwt(token) if token else None
+    if not payload:
+        return jsonify({'success': False, 'message': 'Invalid or expired token'}), 401
+    revoke_jwt(token, payload)
+    print(f'[logout] "{payload.get("username")}" token revoked')
+    return jsonify({'success': True, 'message': 'Logged out'})
 
 
 # ---------------------------------------------------------------------------
@@ -399,197 +1350,330 @@ def register_face():
     username = (request.form.get('username') or '').strip()
     if not username:
         return jsonify({'success': False, 'message': 'Username is required'}), 400
+    unavailable = face_stack_unavailable()
+    if unavailable:
+        return unavailable
 
     try:
-        image_array = decode_image(request.files['image'].read())
-    except Exception:
+        embedding = face_pool.embed(request.files['image'].read(), FACE_DETECTION['register'])
+    except ImageDecodeError:
         return jsonify({'success': False, 'message': 'Could not decode image'}), 400
+    except FrameRejected as e:
+        return frame_rejected(e)
+    except (FaceWorkerBusy, FaceWorkerTimeout) as e:
+        return face_pool_error(e)
 
-    embedding = extract_embedding(image_array)
     if embedding is None:
-        return jsonify({'success': False,
+        return jsonify({'success': False, 'reason': 'no_face', 'retake': True,
                         'message': 'No face detected. Ensure your face is clearly visible.'}), 422
 
     with get_db() as conn:
-        user    = conn.execute('SELECT id FROM users WHERE username = ?', (username,)).fetchone()
-        user_id = user['id'] if user else username
-        existing = conn.execute('SELECT id FROM faces WHERE username = ?', (username,)).fetchone()
-        if existing:
-            conn.execute('UPDATE faces SET embedding = ?, created_at = ? WHERE username = ?',
-                         (embedding_to_blob(embedding), now_iso(), username))
-            face_id = existing['id']
-        else:
-            face_id = str(uuid.uuid4())
-            conn.execute(
-                'INSERT INTO faces (id, user_id, username, embedding, created_at) VALUES (?, ?, ?, ?, ?)',
-                (face_id, user_id, username, embedding_to_blob(embedding), now_iso())
-            )
+        face_id, user_id, evicted = save_face(conn, username, embedding)
         conn.commit()
 
-    print(f'[face/register] "{username}"')
-    return jsonify({'success': True, 'message': f'Face registered for {username}', 'faceId': face_id})
+    face_gallery.upsert(face_id, user_id, username, embedding)
+    face_gallery.remove_faces(evicted)
+    profile_cache.invalidate(user_id)
+    notify_peers('faces', username=username, user_id=user_id)
+    samples = face_gallery.sample_count(username)
+    print(f'[face/register] "{username}" ({samples}/{FACE_MAX_SAMPLES} samples)')
+    return jsonify({'success': True, 'message': f'Face registered for {username}', 'faceId': face_id,
+                    'samples': samples, 'maxSamples': FACE_MAX_SAMPLES})
+
+
+@app.route('/face/register/batch', methods=['POST'])
+def register_faces_batch():
+    """
+    Enroll many faces in one request, written in a single transaction.
+    Form fields: either `archive` (a .zip of <username>.jpg or
+    <username>/*.jpg) or several `images` files named <username>.jpg.
+    """
+    if 'archive' in request.files:
+        items = enrollment.iter_zip(request.files['archive'].stream)
+    elif request.files.getlist('images'):
+        items = (
+            (enrollment.username_for(f.filename or ''), f.filename, f.read())
+            for f in request.files.getlist('images')
+            if enrollment.username_for(f.filename or '')
+        )
+    else:
+        return jsonify({'success': False, 'message': 'No archive or images provided'}), 400
+    unavailable = face_stack_unavailable()
+    if unavailable:
+        return unavailable
+
+    try:
+        report = enroll_batch(items, FACE_DETECTION['register'])
+    except zipfile.BadZipFile:
+        return jsonify({'success': False, 'message': 'Could not read zip archive'}), 400
+    except enrollment.ArchiveTooLarge as e:
+        return jsonify({'success': False, 'message': str(e)}), 413
+
+    print(f'[face/register/batch] {report["registered"]} registered, {report["failed"]} failed '
+          f'({report["imagesPerSecond"]} images/s)')
+    return jsonify({'success': True, **report})
 
 
 @app.route('/face/authenticate', methods=['POST'])
 def authenticate_face():
     if 'image' not in request.files:
         return jsonify({'success': False, 'authenticated': False, 'message': 'No image provided'}), 400
+    unavailable = face_stack_unavailable(authenticated=False)
+    if unavailable:
+        return unavailable
 
     try:
-        image_array = decode_image(request.files['image'].read())
-    except Exception:
+        incoming_embedding = face_pool.embed(request.files['image'].read(), FACE_DETECTION['authenticate'])
+    except ImageDecodeError:
         return jsonify({'success': False, 'authenticated': False, 'message': 'Could not decode image'}), 400
+    except FrameRejected as e:
+        # Turned away before the encoder ran — mostly before detection too
+        return frame_rejected(e, authenticated=False)
+    except (FaceWorkerBusy, FaceWorkerTimeout) as e:
+        return face_pool_error(e, authenticated=False)
 
-    incoming_embedding = extract_embedding(image_array)
     if incoming_embedding is None:
-        return jsonify({'success': False, 'authenticated': False,
+        return jsonify({'success': False, 'authenticated': False, 'reason': 'no_face', 'retake': True,
                         'message': 'No face detected. Please ensure your face is clearly visible.'}), 422
 
-    with get_db() as conn:
-        rows = conn.execute('SELECT id, user_id, username, embedding FROM faces').fetchall()
-
-    if not rows:
+    matched = match_face(incoming_embedding)
+    if matched is None:
         return jsonify({'success': False, 'authenticated': False,
                         'message': 'No faces registered yet.'}), 403
 
-    known = [blob_to_embedding(r['embedding']) for r in rows]
-    distances    = face_recognition.face_distance(known, incoming_embedding)
-    best_idx     = int(np.argmin(distances))
-    best_distance = float(distances[best_idx])
+    best_distance = matched['distance']
 
     print(f'[face/authenticate] Best distance: {best_distance:.4f}')
 
     if best_distance > FACE_DISTANCE_THRESHOLD:
-        return jsonify({'success': False, 'authenticated': False,
-                        'message': 'Face not recognised. Please try again.'}), 401
-
-    matched = rows[best_idx]
-    with get_db() as conn:
-        user = conn.execute(
-            'SELECT id, username, email FROM users WHERE id = ?', (matched['user_id'],)
-        ).fetchone()
-
-    if user:
-        user_id, username, email = user['id'], user['username'], user['email']
-    else:
-        user_id, username, email = matched['user_id'], matched['username'], ''
+        return face_refused(matched)
 
-    token = make_jwt(user_id, username, email)
+    return face_login(matched)
 
-    # Unlock door
-    send_to_esp('GRANTED')
-    door_state.update({'status': 'GRANTED', 'username': username,
-                       'granted_at': datetime.datetime.utcnow()})
-    print(f'[face/authenticate] Authenticated "{username}"')
 
-    return jsonify({
-        'success': True, 'authenticated': True, 'token': token,
-        'user': {'id': user_id, 'username': username, 'email': email},
-        'message': f'Welcome, {username}!',
-    })
+@app.route('/face/authenticate/stream', methods=['POST'])
+def authenticate_face_stream():
+    """
+    Face login from a burst of frames: a multipart body with one `frames`
+    part per frame, read and scored as it arrives (see face_stream.py).
+    Answers once, with the same responses as /face/authenticate plus
+    `frames` (how many were scored).
+    """
+    unavailable = face_stack_unavailable(authenticated=False)
+    if unavailable:
+        return unavailable
+    session = AuthSession(match_face, FACE_DISTANCE_THRESHOLD, FACE_STREAM_CONFIDENT)
+    frames  = iter_frames(request.stream, request.mimetype_params.get('boundary'), FACE_STREAM_MAX_FRAMES)
+    results = face_pool.embed_many(frames, FACE_DETECTION['authenticate'])
+    try:
+        for result in results:
+            if isinstance(result, FaceWorkerTimeout):
+                raise result
+            if session.add(result):
+                break
+    except StreamError as e:
+        return jsonify({'success': False, 'authenticated': False, 'message': str(e)}), 400
+    except FaceWorkerTimeout as e:
+        return face_pool_error(e, authenticated=False)
+    finally:
+        results.close()
+
+    decision = session.decision()
+    best = session.best
+    print(f'[face/authenticate/stream] {decision} after {session.frames} frame(s)'
+          + (f', best distance {best["distance"]:.4f}' if best else ''))
+
+    if decision == 'match':
+        return face_login(best, frames=session.frames)
+    if decision == 'no_match':
+        return face_refused(best, frames=session.frames)
+    if decision == 'rejected':
+        return frame_rejected(FrameRejected(session.reason), authenticated=False, frames=session.frames)
+    if decision == 'no_face':
+        return jsonify({'success': False, 'authenticated': False, 'frames': session.frames,
+                        'reason': 'no_face', 'retake': True,
+                        'message': 'No face detected. Please ensure your face is clearly visible.'}), 422
+    if decision == 'empty_gallery':
+        return jsonify({'success': False, 'authenticated': False,
+                        'message': 'No faces registered yet.'}), 403
+    if decision == 'undecodable':
+        return jsonify({'success': False, 'authenticated': False, 'message': 'Could not decode image'}), 400
+    return jsonify({'success': False, 'authenticated': False, 'message': 'No frames provided'}), 400
 
 
 @app.route('/face/list', methods=['GET'])
 def list_faces():
     with get_db() as conn:
-        rows = conn.execute('SELECT id, username, created_at FROM faces').fetchall()
+        rows = conn.execute('SELECT id, username, created_at, last_used_at FROM faces').fetchall()
     return jsonify({
         'success': True, 'count': len(rows),
-        'faces': [{'id': r['id'], 'username': r['username'], 'createdAt': r['created_at']} for r in rows],
+        'faces': [{'id': r['id'], 'username': r['username'], 'createdAt': r['created_at'],
+                   'lastUsedAt': r['last_used_at']} for r in rows],
     })
 
 
 @app.route('/face/delete/<username>', methods=['DELETE'])
 def delete_face(username: str):
+    unavailable = face_stack_unavailable(('gallery',))
+    if unavailable:
+        return unavailable
     with get_db() as conn:
         result = conn.execute('DELETE FROM faces WHERE username = ?', (username,))
+        user   = conn.execute('SELECT id FROM users WHERE username = ?', (username,)).fetchone()
         conn.commit()
+    face_gallery.remove_username(username)
+    if user:
+        profile_cache.invalidate(user['id'])
+    notify_peers('faces', username=username, user_id=user['id'] if user else None)
     if result.rowcount == 0:
         return jsonify({'success': False, 'message': f'No face for "{username}"'}), 404
     return jsonify({'success': True, 'message': f'Face for "{username}" deleted'})
 
 
 # ---------------------------------------------------------------------------
-# Sensor + Device routes  (polled by the Dashboard every 2 s)
+# Sensor + Device routes  (polled by the Dashboard when /events is unavailable)
 # ---------------------------------------------------------------------------
 
 @app.route('/sensors', methods=['GET'])
 def get_sensors():
     """Return the latest sensor readings received from the ESP."""
-    with _state_lock:
-        temp    = esp_state['temperature']
-        hum     = esp_state['humidity']
-        motion  = esp_state['motion']
-        updated = esp_state['last_update']
-
-    sensors = [
-        {
-            'id':     'temperature',
-            'name':   'Temperature Sensor',
-            'value':  temp if temp is not None else '--',
-            'unit':   '°C',
-            'status': 'active' if temp is not None else 'inactive',
-        },
-        {
-            'id':     'humidity',
-            'name':   'Humidity Sensor',
-            'value':  hum if hum is not None else '--',
-            'unit':   '%',
-            'status': 'active' if hum is not None else 'inactive',
-        },
-        {
-            'id':     'motion',
-            'name':   'IR Motion Sensor',
-            'value':  'Detected' if motion else 'Not detected',
-            'status': 'detected' if motion else 'not_detected',
-        },
-    ]
-    return jsonify(sensors)
+    return cached_json('sensors')
+
+
+@app.route('/sensors/history', methods=['GET'])
+def get_sensor_history():
+    """
+    One controller's sensor readings over a time range.
+    Query: controller     — controller id (default: the first controller)
+           from, to       — ISO timestamps (UTC) or Unix seconds; default the last 24 h
+           resolution     — raw | 1m | 1h | auto (default: finest that fits the range)
+    """
+    controller = device_hub.get(request.args.get('controller'))
+    if controller is None:
+        return jsonify({'success': False, 'message': 'Unknown controller'}), 404
+
+    now = time.time()
+    try:
+        end   = parse_time(request.args.get('to'),   now)
+        start = parse_time(request.args.get('from'), end - 86400)
+    except ValueError:
+        return jsonify({'success': False, 'message': '"from" and "to" must be ISO timestamps or Unix seconds'}), 400
+    if start > end:
+        return jsonify({'success': False, 'message': '"from" must be before "to"'}), 400
+
+    resolution = request.args.get('resolution', 'auto')
+    if resolution not in RESOLUTIONS + ('auto',):
+        return jsonify({'success': False,
+                        'message': f'resolution must be one of: {", ".join(RESOLUTIONS)}, auto'}), 400
+
+    history = device_call('history', controller=controller.id, start=start, end=end, resolution=resolution)
+    return jsonify({
+        'success':    True,
+        'controller': controller.id,
+        'from':       datetime.datetime.utcfromtimestamp(start).isoformat(),
+        'to':         datetime.datetime.utcfromtimestamp(end).isoformat(),
+        'resolution': history['resolution'],
+        'points':     history['points'],
+    })
 
 
 @app.route('/device/list', methods=['GET'])
 def get_devices():
     """Return current on/off state of each device as reported by the ESP."""
-    with _state_lock:
-        fan_status    = esp_state['fan']
-        lights_status = esp_state['lights']
-
-    devices = [
-        {'id': 'fan',    'name': 'Fan',    'status': fan_status},
-        {'id': 'lights', 'name': 'Lights', 'status': lights_status},
-    ]
-    return jsonify(devices)
+    return cached_json('devices')
 
 
 @app.route('/device/toggle', methods=['POST'])
 def toggle_device():
     """
-    Receive a toggle command from the dashboard and forward it to the ESP.
-    Body: { "deviceId": "fan" | "lights", "status": "on" | "off" }
+    Receive a toggle command from the dashboard and queue it for the owning ESP.
+    Body: { "deviceId": "<controller>/<device>", "status": "on" | "off" }
+    A bare device id ("fan") refers to the first controller.
+
+    Returns 202 straight away with the command id; follow it with
+    GET /device/command/<id>, or watch /events for the device state.
     """
     data      = request.get_json(silent=True) or {}
     device_id = (data.get('deviceId') or '').lower().strip()
     status    = (data.get('status') or '').lower().strip()
 
-    if device_id not in ('fan', 'lights'):
+    resolved = device_hub.resolve(device_id)
+    if resolved is None:
         return jsonify({'success': False, 'message': 'Unknown device'}), 400
     if status not in ('on', 'off'):
         return jsonify({'success': False, 'message': 'Status must be "on" or "off"'}), 400
+    controller, device = resolved
+    user    = get_current_user()
+    command = device_call('toggle', controller=controller.id, device=device, status=status,
+                          username=user['username'] if user else None)
 
-    # e.g.  "FAN:ON"  or  "LIGHTS:OFF"
-    command = f'{device_id.upper()}:{status.upper()}'
-    send_to_esp(command)
+    name = controller.devices[device]
+    return jsonify({
+        'success':   True,
+        'message':   f'{name} turning {status}',
+        'commandId': command['id'],
+        'command':   command,
+        'device':    build_device(controller, device, status),
+    }), 202
 
-    # Optimistically update our mirror so the next /device/list is correct
-    # even before the ESP echoes back a JSON packet
-    with _state_lock:
-        esp_state[device_id] = status
 
-    device_names = {'fan': 'Fan', 'lights': 'Lights'}
+@app.route('/device/command/<command_id>', methods=['GET'])
+def get_device_command(command_id: str):
+    """Status of a command queued by /device/toggle."""
+    command = device_call('command', id=command_id)
+    if command is None:
+        return jsonify({'success': False, 'message': 'Unknown command'}), 404
+    return jsonify({'success': True, 'command': command})
+
+
+# ---------------------------------------------------------------------------
+# Automation
+# ---------------------------------------------------------------------------
+@app.route('/automation/rules', methods=['GET'])
+def get_automation_rules():
+    """The loaded rules, with whether each is active and the reading it last saw."""
+    rules = device_call('automations')
+    return jsonify({'success': True, 'count': len(rules), 'rules': rules})
+
+
+# ---------------------------------------------------------------------------
+# Audit log
+# ---------------------------------------------------------------------------
+@app.route('/audit', methods=['GET'])
+def get_audit_log():
+    """
+    Journaled events, newest first. Requires a valid token.
+    Query: username   — only this user's events (for face_denied: the nearest identity)
+           kind       — comma-separated: door_grant, face_denied, device_toggle,
+                        command_failed, esp_connected, esp_disconnected
+           from, to   — ISO timestamps (UTC) or Unix seconds; default the last 24 h
+           limit      — at most this many events (default 100, max AUDIT_MAX_RESULTS)
+    """
+    if not get_current_user():
+        return jsonify({'success': False, 'message': 'Invalid or expired token'}), 401
+
+    now = time.time()
+    try:
+        end   = parse_time(request.args.get('to'),   now)
+        start = parse_time(request.args.get('from'), end - 86400)
+        limit = int(request.args.get('limit', 100))
+    except ValueError:
+        return jsonify({'success': False,
+                        'message': '"from" and "to" must be ISO timestamps or Unix seconds, "limit" a number'}), 400
+    if start > end:
+        return jsonify({'success': False, 'message': '"from" must be before "to"'}), 400
+    limit = min(max(limit, 1), AUDIT_MAX_RESULTS)
+    kinds = [k.strip() for k in request.args.get('kind', '').split(',') if k.strip()]
+
+    result = device_call('audit_query', start=start, end=end, username=request.args.get('username') or None,
+                         kinds=kinds or None, limit=limit)
     return jsonify({
-        'success': True,
-        'message': f'{device_names[device_id]} turned {status}',
-        'device': {'id': device_id, 'name': device_names[device_id], 'status': status},
+        'success':   True,
+        'from':      datetime.datetime.utcfromtimestamp(start).isoformat(),
+        'to':        datetime.datetime.utcfromtimestamp(end).isoformat(),
+        'count':     len(result['events']),
+        'truncated': result['truncated'],
+        'events':    result['events'],
     })
 
 
@@ -597,11 +1681,80 @@ def toggle_device():
 # Health
 # ---------------------------------------------------------------------------
 
+def health_version() -> list:
+    # Changes with every packet or (dis)connect, not just with state_versions.
+    # Lists, not tuples, so it compares equal after a trip through the gateway.
+    return [[c.connected, esp_state[c.id]['last_update']]
+            for c in device_hub.controllers.values()]
+
+
+def build_health() -> tuple:
+    """(version, payload) for /health — called under _state_lock."""
+    version = health_version()
+    controllers = {
+        c.id: {'connected': connected, 'last_seen': monotonic_iso(seen)}
+        for c, (connected, seen) in zip(device_hub.controllers.values(), version)
+    }
+    last = max((seen for _connected, seen in version if seen is not None), default=None)
+    return version, {
+        'status':        'ok',
+        'esp_last_seen': monotonic_iso(last),
+        'controllers':   controllers,
+    }
+
+
+def build_readiness() -> dict:
+    """/health fields for this process's subsystems: `status` is starting until all are ready."""
+    if readiness.failed():
+        status = 'degraded'
+    else:
+        status = 'ok' if readiness.ready() else 'starting'
+    return {'status': status, 'ready': status == 'ok', 'subsystems': readiness.report()}
+
+
 @app.route('/health', methods=['GET'])
 def health():
-    with _state_lock:
-        last = esp_state['last_update']
-    return jsonify({'status': 'ok', 'esp_last_seen': last})
+    return cached_json('health', local=(readiness.version, build_readiness))
+
+
+@app.route('/state', methods=['GET'])
+def get_state():
+    """
+    Everything the dashboard shows, from one snapshot. With ?since=<version>
+    (the `version` of the previous response) the request is held until
+    the state changes or STATE_LONG_POLL_S passes, then answered in full.
+    """
+    since = request.args.get('since')
+    if since:
+        wait_for_state(since)
+    return cached_json('state')
+
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """
+    Prometheus text format, or ?format=json for count / mean / p50 / p95 / p99
+    per series. In production mode: summed over the gateway and all workers.
+    """
+    if not metrics.ENABLED:
+        return jsonify({'success': False, 'message': 'Metrics are disabled (METRICS=0)'}), 404
+    if gateway is None:
+        snapshot = metrics.snapshot()
+    else:
+        snapshot = device_call('metrics', source=os.getpid(), snapshot=metrics.snapshot())
+    if request.args.get('format') == 'json':
+        return jsonify({'success': True, 'metrics': metrics.summarize(snapshot)})
+    return Response(metrics.render(snapshot), mimetype='text/plain; version=0.0.4')
+
+
+def push_metrics() -> None:
+    """Web worker: send this process's metrics to the gateway every METRICS_PUSH_S."""
+    while True:
+        time.sleep(METRICS_PUSH_S)
+        try:
+            gateway.call('metrics', source=os.getpid(), snapshot=metrics.snapshot(), merged=False)
+        except GatewayError:
+            pass   # gateway restarting — next round
 
 
 # ---------------------------------------------------------------------------
@@ -618,6 +1771,16 @@ def method_not_allowed(_e):
     return jsonify({'success': False, 'message': 'Method not allowed'}), 405
 
 
+@app.errorhandler(413)
+def too_large(_e):
+    return jsonify({'success': False, 'message': f'Request too large (max {MAX_UPLOAD_MB} MB)'}), 413
+
+
+@app.errorhandler(GatewayError)
+def gateway_error(e):
+    return jsonify({'success': False, 'message': str(e)}), e.status
+
+
 @app.errorhandler(Exception)
 def handle_exception(e):
     traceback.print_exc()
@@ -628,18 +1791,222 @@ def handle_exception(e):
 # Entry point
 # ---------------------------------------------------------------------------
 
-if __name__ == '__main__':
-    init_db()
+def start_devices() -> None:
+    """Everything that owns device state: history, audit log, ESP reader, command writer, SSE push."""
+    global audit
+    audit = AuditJournal(AUDIT_DIR, int(AUDIT_SEGMENT_MB * 1024 * 1024), AUDIT_KEEP_SEGMENTS, AUDIT_COMMIT_S)
+    audit.start()
+    atexit.register(audit.close)   # commit what is still pending
+
+    # Rebuild open rollups from disk, then flush new samples in the background
+    for controller_id in device_hub.controllers:
+        sensor_history[controller_id] = SensorHistory(os.path.join(HISTORY_DIR, controller_id), HISTORY_FLUSH_S)
+        sensor_history[controller_id].start()
+
+    # One background thread reads every ESP controller, another writes commands
+    device_hub.start(handle_esp_lines, on_connection=esp_connection_changed)
+    device_commands.start()
+
+    # Push sensor / device changes to dashboards over SSE
+    EventStreamServer(state_broker, state_snapshot, port=EVENTS_PORT).start()
+
 
-    # Start the serial reader in a background daemon thread
-    t = threading.Thread(target=serial_reader, daemon=True)
-    t.start()
+def serve(host: str, port: int) -> None:
+    """Development mode: devices and the API in one process, on the Werkzeug dev server."""
+    readiness.run('database', init_db, background=False)
+    start_devices()
+    # The face workers and gallery load while the server already answers
+    warm_up_face_stack()
 
     print(f'Database  : {DB_PATH}')
-    print(f'ESP port  : {ESP_PORT}')
+    print('ESPs      : ' + ', '.join(f'{c.id} ({c.port})' for c in device_hub.controllers.values()))
+    print(f'History   : {HISTORY_DIR}')
+    print(f'Audit log : {AUDIT_DIR}')
     print(f'Threshold : {FACE_DISTANCE_THRESHOLD}')
-    print('Server    : http://localhost:5000')
+    print(f'Matcher   : {FACE_MATCHER}')
+    print(f'Face pool : {FACE_WORKERS} worker(s), queue {FACE_QUEUE_SIZE}, timeout {FACE_TIMEOUT_S} s')
+    print(f'Server    : http://localhost:{port}')
+    print(f'Events    : http://localhost:{EVENTS_PORT}/events')
 
     # use_reloader=False is required — the reloader forks the process which
-    # would start two serial reader threads and cause port conflicts.
-    app.run(host='0.0.0.0', port=5000, debug=True, use_reloader=False)
+    # would start two device hubs and cause port conflicts.
+    app.run(host=host, port=port, debug=True, use_reloader=False)
+
+
+def run_gateway() -> None:
+    """The device gateway: owns the ESPs and their state, serves web workers on GATEWAY_SOCKET."""
+    global gateway_server
+    start_devices()
+    gateway_server = GatewayServer(GATEWAY_SOCKET, handle_gateway_request)
+    gateway_server.start()
+
+    print('ESPs      : ' + ', '.join(f'{c.id} ({c.port})' for c in device_hub.controllers.values()))
+    print(f'History   : {HISTORY_DIR}')
+    print(f'Audit log : {AUDIT_DIR}')
+    print(f'Gateway   : {GATEWAY_SOCKET}')
+    print(f'Events    : http://localhost:{EVENTS_PORT}/events')
+
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        gateway_server.close()
+        audit.close()   # forked gateways leave with os._exit(): atexit doesn't run
+
+
+def worker_app(face_workers: int | None = None) -> Flask:
+    """
+    Turn this process into a stateless web worker of the gateway on
+    GATEWAY_SOCKET and return the WSGI app. Also the app factory for
+    external WSGI servers:
+        gunicorn -w 4 -b 0.0.0.0:5000 'app:worker_app()'
+    """
+    global gateway, face_pool, audit
+    gateway = GatewayClient(GATEWAY_SOCKET)
+    # Audit events are batched here and journaled by the gateway
+    audit = AuditForwarder(lambda events, batch_id: gateway.call('audit', events=events, batch_id=batch_id),
+                           AUDIT_COMMIT_S)
+    audit.start()
+    # Subscribe before loading, so no change made by another worker meanwhile is missed
+    gateway.subscribe(on_peer_event)
+    readiness.run('database', init_db, background=False)
+    if face_workers is not None:
+        face_pool = FaceWorkerPool(face_workers, face_workers * 4, FACE_TIMEOUT_S, FACE_CACHE_SIZE)
+    warm_up_face_stack()
+    if metrics.ENABLED:
+        threading.Thread(target=push_metrics, daemon=True, name='metrics-push').start()
+    return app
+
+
+def run_worker(listener: socket.socket, host: str, port: int, face_workers: int | None) -> None:
+    # No per-request access log: at production request rates the log lines cost more than the requests
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server(host, port, worker_app(face_workers), threaded=True, fd=listener.fileno())
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        server.serve_forever()
+    finally:
+        face_pool.shutdown(wait=True)   # we leave with os._exit(): no atexit to stop them
+        audit.close()
+
+
+def serve_workers(workers: int, host: str, port: int) -> None:
+    """
+    Production mode: fork the device gateway and `workers` web workers that
+    accept from one shared listening socket, and restart any that exit.
+    """
+    if not hasattr(os, 'fork'):
+        sys.exit('serve --workers needs fork() and Unix sockets — use the dev server on Windows')
+
+    listener = socket.create_server((host, port), backlog=1024)
+    if os.path.exists(GATEWAY_SOCKET):
+        os.unlink(GATEWAY_SOCKET)   # so the wait below can't see a stale one
+
+    # Each web worker runs its own face pool: split the cores between them
+    face_workers = None if 'FACE_WORKERS' in os.environ else max((os.cpu_count() or 2) // workers, 1)
+    children, stopping = {}, False   # pid → 'gateway' | 'worker'
+
+    def spawn(role: str) -> None:
+        pid = os.fork()
+        if pid:
+            children[pid] = role
+            return
+        status = 0
+        try:
+            signal.signal(signal.SIGINT, signal.SIG_IGN)   # the parent stops us with SIGTERM
+            if role == 'gateway':
+                listener.close()
+                run_gateway()
+            else:
+                run_worker(listener, host, port, face_workers)
+        except SystemExit:
+            pass
+        except BaseException:
+            traceback.print_exc()
+            status = 1
+        finally:
+            os._exit(status)
+
+    def stop(_signum, _frame) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    spawn('gateway')
+    deadline = time.monotonic() + 10
+    while not os.path.exists(GATEWAY_SOCKET) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    for _ in range(workers):
+        spawn('worker')
+
+    print(f'Database  : {DB_PATH}')
+    print(f'Workers   : {workers} web worker(s) + device gateway ({GATEWAY_SOCKET})')
+    print(f'Face pool : {face_workers or FACE_WORKERS} process(es) per web worker')
+    print(f'Server    : http://localhost:{port}')
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        role = children.pop(pid, None)
+        if role and not stopping:
+            print(f'[serve] {role} {pid} exited (status {status}) — restarting')
+            time.sleep(1)
+            if not stopping:
+                spawn(role)
+    listener.close()
+
+
+def enroll(path: str, workers: int) -> None:
+    """Offline bulk enrollment from a directory or zip (python app.py enroll PATH)."""
+    global face_pool
+    init_db()
+    load_face_gallery()
+    face_pool = FaceWorkerPool(workers, workers * 2, FACE_TIMEOUT_S, cache_size=0)
+    face_pool.start()
+    try:
+        report = enroll_batch(enrollment.iter_path(path), FACE_DETECTION['register'])
+    finally:
+        face_pool.shutdown()
+
+    for r in report['results']:
+        print(f'  {r["status"]:<10} {r["username"]:<24} {r["file"]}')
+    print(f'[enroll] {report["registered"]} registered, {report["failed"]} failed in '
+          f'{report["elapsedSeconds"]} s ({report["imagesPerSecond"]} images/s)')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Smart home backend')
+    commands = parser.add_subparsers(dest='command')
+    serve_cmd = commands.add_parser('serve', help='run the API server (default)')
+    serve_cmd.add_argument('--host', default='0.0.0.0')
+    serve_cmd.add_argument('--port', type=int, default=5000)
+    serve_cmd.add_argument('--workers', type=int, default=int(os.environ.get('WEB_WORKERS', '0')),
+                           help='web worker processes behind a device gateway (0 = dev server)')
+    commands.add_parser('gateway', help='run only the device gateway, for an external WSGI server')
+    enroll_cmd = commands.add_parser('enroll', help='bulk-enroll faces from a directory or zip')
+    enroll_cmd.add_argument('path', help='directory or .zip of <username>.jpg or <username>/*.jpg')
+    enroll_cmd.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    if args.command == 'enroll':
+        enroll(args.path, args.workers)
+    elif args.command == 'gateway':
+        run_gateway()
+    elif args.command == 'serve' and args.workers > 0:
+        serve_workers(args.workers, args.host, args.port)
+    elif args.command == 'serve':
+        serve(args.host, args.port)
+    else:
+        serve('0.0.0.0', 5000)
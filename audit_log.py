@@ -0,0 +1,387 @@
+"""
+Audit log
+---------
+Append-only journal of who opened the door and who switched what:
+door grants, refused face matches (with the best distance), device
+toggles and failed commands, and ESP (dis)connects.
+
+    audit.record('door_grant', username='alice', controller='living')
+
+record() only appends to an in-memory list, so a request never waits on
+disk. A background writer group-commits whatever has gathered — at most
+`max_batch` events, lingering up to `commit_interval` for more — as one
+write and one fsync, so the disk cost is per batch, not per event, and
+a crash loses at most the batch in flight. Past MAX_PENDING unwritten
+events (a dead disk) new events are dropped and counted instead of
+growing without bound.
+
+Layout (AUDIT_DIR):
+  audit-000001.jsonl      one JSON event per line; a new segment is started
+  audit-000001.idx.npz    once the current one reaches `segment_bytes`, and
+  ...                     the sealed one gets an index of (ts, offset, user)
+
+Queries by time range and username skip every segment whose time span
+or user set doesn't match, then filter the survivors' index arrays and
+read only the matching lines. The active segment is indexed in memory
+as it is written; on startup it is re-scanned (and a torn last line
+from a crash cut off), sealed segments just load their index.
+
+In production mode only the gateway owns the journal; web workers batch
+their events the same way and ship each batch to it (AuditForwarder).
+"""
+
+import os
+import json
+import time
+import uuid
+import datetime
+import threading
+import collections
+
+import numpy as np
+
+import metrics
+
+MAX_PENDING = 100_000   # unwritten events kept before new ones are dropped
+
+metrics.histogram('audit_commit_seconds', 'Audit journal group commits (write + fsync) and forwards to the gateway')
+metrics.counter('audit_events_dropped_total', 'Audit events dropped because the writer fell too far behind')
+
+
+class _GroupCommit:
+    """Buffers events and hands them to commit(batch) in batches, on its own thread."""
+
+    def __init__(self, commit, commit_interval: float, max_batch: int, name: str):
+        """
+        commit(batch) — makes one batch durable (or delivers it). Raising
+        keeps it for the next try, which passes the very same list again.
+        """
+        self.commit          = commit
+        self.commit_interval = commit_interval
+        self.max_batch       = max_batch
+        self.dropped         = 0
+        self._pending        = []
+        self._inflight       = []   # the batch taken by the writer, until committed
+        self._cond           = threading.Condition()
+        self._closing        = False
+        self._thread         = None
+        self._name           = name
+
+    def start(self) -> None:
+        if self._thread:
+            return
+        self._thread = threading.Thread(target=self._run, daemon=True, name=self._name)
+        self._thread.start()
+
+    def record(self, kind: str, username: str | None = None, **fields) -> None:
+        """Journal one event, stamped now. Cheap — no I/O on the caller's thread."""
+        self.extend([{'ts': time.time(), 'kind': kind, 'username': username, **fields}])
+
+    def extend(self, events: list) -> None:
+        with self._cond:
+            room = MAX_PENDING - len(self._pending)
+            if len(events) > room:
+                self.dropped += len(events) - max(room, 0)
+                metrics.inc('audit_events_dropped_total', len(events) - max(room, 0))
+                events = events[:max(room, 0)]
+            if not events:
+                return
+            wake = not self._pending or len(self._pending) + len(events) >= self.max_batch
+            self._pending.extend(events)
+            if wake:
+                self._cond.notify()
+
+    def close(self) -> None:
+        """Commit what is pending and stop the writer."""
+        with self._cond:
+            self._closing = True
+            self._cond.notify()
+        if self._thread:
+            self._thread.join(timeout=10)
+
+    def _next_batch(self) -> list | None:
+        with self._cond:
+            if self._inflight:
+                return self._inflight   # a failed commit, retried as it was
+            while not self._pending and not self._closing:
+                self._cond.wait()
+            if not self._pending:
+                return None
+            # Linger a little so events arriving together share one commit
+            deadline = time.monotonic() + self.commit_interval
+            while len(self._pending) < self.max_batch and not self._closing:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    break
+                self._cond.wait(left)
+            batch = self._inflight = self._pending[:self.max_batch]
+            del self._pending[:self.max_batch]
+            return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            try:
+                with metrics.timer('audit_commit_seconds'):
+                    self.commit(batch)
+            except Exception as e:
+                print(f'[audit] Commit of {len(batch)} event(s) failed: {e} — retrying')
+                if self._closing:
+                    return
+                time.sleep(1)
+                continue
+            with self._cond:
+                self._inflight = []
+
+
+class _Segment:
+    """One journal file and its index: event time, byte offset and username code per line."""
+
+    def __init__(self, seq: int, path: str):
+        self.seq    = seq
+        self.path   = path
+        self.size   = 0
+        self.names  = {}   # username → code
+        self.ts, self.offsets, self.users = [], [], []
+        self.sealed = None   # (ts, offsets, users) arrays once the segment is closed
+
+    def add(self, ts: float, offset: int, username: str | None) -> None:
+        code = -1
+        if username is not None:
+            code = self.names.setdefault(username, len(self.names))
+        self.ts.append(ts)
+        self.offsets.append(offset)
+        self.users.append(code)
+
+    @property
+    def index_path(self) -> str:
+        return self.path[:-len('.jsonl')] + '.idx.npz'
+
+    def arrays(self) -> tuple:
+        if self.sealed is not None:
+            return self.sealed
+        return (np.array(self.ts, dtype=np.float64), np.array(self.offsets, dtype=np.int64),
+                np.array(self.users, dtype=np.int32))
+
+    def seal(self) -> None:
+        self.sealed = self.arrays()
+        ts, offsets, users = self.sealed
+        names = sorted(self.names, key=self.names.get)
+        np.savez(self.index_path, ts=ts, offsets=offsets, users=users, names=np.array(names, dtype=str))
+        self.ts, self.offsets, self.users = [], [], []
+
+    def load_index(self) -> bool:
+        if not os.path.exists(self.index_path):
+            return False
+        try:
+            with np.load(self.index_path) as index:
+                self.sealed = (index['ts'], index['offsets'], index['users'])
+                self.names  = {name: code for code, name in enumerate(index['names'].tolist())}
+        except Exception as e:   # half-written by a crash: rebuilt from the segment
+            print(f'[audit] {os.path.basename(self.index_path)}: unreadable ({e}) — rescanning')
+            self.sealed, self.names = None, {}
+            return False
+        self.size = os.path.getsize(self.path)
+        return True
+
+    def scan(self) -> None:
+        """Rebuild the index from the file, cutting off a torn last line."""
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        end = data.rfind(b'\n') + 1
+        if end < len(data):
+            with open(self.path, 'r+b') as f:
+                f.truncate(end)
+            print(f'[audit] {os.path.basename(self.path)}: cut {len(data) - end} byte(s) of a torn write')
+        offset = 0
+        for line in data[:end].splitlines(keepends=True):
+            try:
+                event = json.loads(line)
+                self.add(float(event['ts']), offset, event.get('username'))
+            except (ValueError, KeyError, TypeError):
+                pass   # a corrupt line is skipped, not fatal
+            offset += len(line)
+        self.size = end
+
+    def span(self) -> tuple[float, float] | None:
+        ts = self.sealed[0] if self.sealed is not None else self.ts
+        if not len(ts):
+            return None
+        return float(np.min(ts)), float(np.max(ts))
+
+
+class AuditJournal(_GroupCommit):
+    def __init__(self, directory: str, segment_bytes: int = 4 * 1024 * 1024, keep_segments: int = 0,
+                 commit_interval: float = 0.05, max_batch: int = 512):
+        """keep_segments: oldest segments past this many are deleted (0 keeps them all)."""
+        super().__init__(self._write, commit_interval, max_batch, 'audit-writer')
+        self.directory     = directory
+        self.segment_bytes = segment_bytes
+        self.keep_segments = keep_segments
+        self._index_lock   = threading.Lock()
+        self._segments     = []
+        self._file         = None
+        os.makedirs(directory, exist_ok=True)
+        self._recover()
+
+    def _path(self, seq: int) -> str:
+        return os.path.join(self.directory, f'audit-{seq:06d}.jsonl')
+
+    # ------------------------------------------------------------------
+    # Writing
+    # ------------------------------------------------------------------
+    def _recover(self) -> None:
+        seqs = sorted(int(f[len('audit-'):-len('.jsonl')]) for f in os.listdir(self.directory)
+                      if f.startswith('audit-') and f.endswith('.jsonl'))
+        for n, seq in enumerate(seqs):
+            segment = _Segment(seq, self._path(seq))
+            active = n == len(seqs) - 1
+            if active or not segment.load_index():
+                segment.scan()
+                if not active:
+                    segment.seal()   # an older segment whose index was never written
+            self._segments.append(segment)
+        if not self._segments:
+            self._segments.append(_Segment(1, self._path(1)))
+        self._file = open(self._segments[-1].path, 'ab', buffering=0)
+
+    def _rotate(self) -> None:
+        # Caller holds the index lock
+        self._file.close()
+        active = self._segments[-1]
+        active.seal()
+        segment = _Segment(active.seq + 1, self._path(active.seq + 1))
+        self._segments.append(segment)
+        self._file = open(segment.path, 'ab', buffering=0)
+        if self.keep_segments and len(self._segments) > self.keep_segments:
+            for old in self._segments[:-self.keep_segments]:
+                for path in (old.path, old.index_path):
+                    if os.path.exists(path):
+                        os.remove(path)
+            del self._segments[:-self.keep_segments]
+
+    def _write(self, batch: list) -> None:
+        lines = [json.dumps(event, separators=(',', ':'), default=str).encode('utf-8') + b'\n'
+                 for event in batch]
+        data = memoryview(b''.join(lines))
+        try:
+            while data:
+                data = data[self._file.write(data):]
+            os.fsync(self._file.fileno())
+        except OSError:
+            # Drop a partial write, so the retry doesn't leave a broken line behind
+            os.ftruncate(self._file.fileno(), self._segments[-1].size)
+            raise
+        # Indexed only once durable, so a query never finds a line that isn't there.
+        # Leaves _inflight in the same step, so a query sees each event exactly once.
+        with self._index_lock:
+            active = self._segments[-1]
+            for event, line in zip(batch, lines):
+                active.add(event['ts'], active.size, event.get('username'))
+                active.size += len(line)
+            if active.size >= self.segment_bytes:
+                self._rotate()
+            with self._cond:
+                self._inflight = []
+
+    def close(self) -> None:
+        super().close()
+        with self._index_lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+    def query(self, start: float, end: float, username: str | None = None,
+              kinds: set | None = None, limit: int = 100) -> tuple[list, bool]:
+        """
+        Events with start <= ts <= end, newest first, optionally of one user
+        and of some kinds. Returns (events, truncated).
+        """
+        def wanted(event: dict) -> bool:
+            return (start <= event['ts'] <= end
+                    and (username is None or event.get('username') == username)
+                    and (kinds is None or event['kind'] in kinds))
+
+        # One snapshot of all three places an event can be: queued, being written, indexed
+        with self._index_lock, self._cond:
+            pending  = [e for e in self._inflight + self._pending if wanted(e)]
+            segments = [(s.path, s.names.get(username), s.span(), s.arrays()) for s in self._segments]
+
+        found = sorted(pending, key=lambda e: e['ts'], reverse=True)
+        for path, code, span, (ts, offsets, users) in reversed(segments):
+            if len(found) > limit:
+                break
+            if span is None or span[1] < start or span[0] > end:
+                continue
+            if username is not None and code is None:
+                continue   # the user has no event in this segment
+            mask = (ts >= start) & (ts <= end)
+            if username is not None:
+                mask &= users == code
+            rows = np.flatnonzero(mask)
+            rows = rows[np.argsort(ts[rows], kind='stable')[::-1]]
+            try:
+                f = open(path, 'rb')
+            except FileNotFoundError:
+                continue   # removed by rotation since the index was copied
+            with f:
+                for row in rows.tolist():
+                    f.seek(int(offsets[row]))
+                    event = json.loads(f.readline())
+                    if kinds is None or event['kind'] in kinds:
+                        found.append(event)
+                        if len(found) > limit:
+                            break
+        found.sort(key=lambda e: e['ts'], reverse=True)
+        return [_public(e) for e in found[:limit]], len(found) > limit
+
+
+def _public(event: dict) -> dict:
+    event = dict(event)
+    ts = event.pop('ts')
+    return {'time': datetime.datetime.utcfromtimestamp(ts).isoformat(timespec='milliseconds'), **event}
+
+
+class AuditForwarder(_GroupCommit):
+    """
+    A web worker's side of the journal: batches events and sends each
+    batch to the gateway. Each batch carries an id that stays the same
+    when it is resent, so a batch that did arrive before the reply was
+    lost is recognised and journaled only once (AuditBatches).
+    """
+
+    def __init__(self, send, commit_interval: float = 0.05, max_batch: int = 512):
+        """send(events, batch_id) — delivers one batch; raising keeps it for the next try."""
+        super().__init__(self._send, commit_interval, max_batch, 'audit-forward')
+        self.send      = send
+        self._batch    = None
+        self._batch_id = None
+
+    def _send(self, batch: list) -> None:
+        if batch is not self._batch:
+            self._batch, self._batch_id = batch, uuid.uuid4().hex
+        self.send(batch, self._batch_id)
+
+
+class AuditBatches:
+    """The gateway's memory of the last `size` forwarded batch ids, to drop resent ones."""
+
+    def __init__(self, size: int = 4096):
+        self.size  = size
+        self._seen = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def first_time(self, batch_id: str) -> bool:
+        """True the first time batch_id is offered, False for a resend."""
+        with self._lock:
+            if batch_id in self._seen:
+                return False
+            self._seen[batch_id] = None
+            if len(self._seen) > self.size:
+                self._seen.popitem(last=False)
+            return True
@@ -0,0 +1,197 @@
+"""
+Automation rules
+----------------
+Server-side reactions to sensor readings ("fan on above 28 °C"), run on
+the device hub thread as each batch of packets is applied, not by
+polling.
+
+Rules are compiled into an index keyed by (controller, sensor): a packet
+only evaluates the rules that watch one of the readings it carried, so
+the cost per packet grows with the rules affected, not with all rules.
+
+Rules are read from a JSON file:
+
+    [
+      {"id": "living-fan", "controller": "living", "sensor": "temperature",
+       "above": 28, "hysteresis": 1, "debounce": 30,
+       "device": "fan", "then": "on", "otherwise": "off"},
+      {"id": "bedroom-night-light", "controller": "bedroom", "sensor": "motion",
+       "above": 0, "between": "18:00-06:00", "release_after": 120,
+       "device": "lights", "then": "on", "otherwise": "off"}
+    ]
+
+  above / below   threshold the reading must cross (exactly one of them)
+  hysteresis      once active, the rule holds until the reading is back
+                  past threshold ∓ hysteresis, so it doesn't flap
+  debounce        seconds the condition must hold before the rule fires
+  release_after   seconds it must be gone before the rule releases
+  between         local time window "HH:MM-HH:MM" (may wrap midnight);
+                  outside it the condition counts as false
+  then            device state when the rule fires
+  otherwise       device state when it releases (optional: leave as is)
+
+Rules act on edges only — firing and releasing — so a manual toggle in
+between is left alone until the rule next changes state.
+"""
+
+import os
+import json
+import time
+import threading
+import collections
+
+STATES = ('on', 'off')
+
+
+class Rule:
+    __slots__ = ('id', 'controller', 'sensor', 'above', 'threshold', 'hysteresis', 'debounce',
+                 'release_after', 'window', 'device', 'then', 'otherwise',
+                 'active', 'pending_since', 'last_value')
+
+    def __init__(self, id: str, controller: str, sensor: str, device: str, then: str,
+                 above: float | None = None, below: float | None = None, hysteresis: float = 0.0,
+                 debounce: float = 0.0, release_after: float = 0.0,
+                 between: str | None = None, otherwise: str | None = None):
+        if (above is None) == (below is None):
+            raise ValueError(f'rule "{id}": give exactly one of "above" and "below"')
+        if then not in STATES or otherwise not in (*STATES, None):
+            raise ValueError(f'rule "{id}": "then" / "otherwise" must be "on" or "off"')
+        self.id            = id
+        self.controller    = controller
+        self.sensor        = sensor
+        self.above         = above is not None
+        self.threshold     = float(above if above is not None else below)
+        self.hysteresis    = float(hysteresis)
+        self.debounce      = float(debounce)
+        self.release_after = float(release_after)
+        self.window        = parse_window(between, id) if between else None
+        self.device        = device
+        self.then          = then
+        self.otherwise     = otherwise
+        self.active        = False
+        self.pending_since = None   # monotonic time the condition started to differ from `active`
+        self.last_value    = None
+
+    def condition(self, value: float, wall: float) -> bool:
+        if self.window and not in_window(self.window, wall):
+            return False
+        # While active the threshold moves back by the hysteresis
+        margin = self.hysteresis if self.active else 0.0
+        if self.above:
+            return value > self.threshold - margin
+        return value < self.threshold + margin
+
+    def to_dict(self) -> dict:
+        return {
+            'id':         self.id,
+            'controller': self.controller,
+            'sensor':     self.sensor,
+            'condition':  f'{"above" if self.above else "below"} {self.threshold:g}',
+            'device':     f'{self.controller}/{self.device}',
+            'then':       self.then,
+            'otherwise':  self.otherwise,
+            'active':     self.active,
+            'pending':    self.pending_since is not None,
+            'lastValue':  self.last_value,
+        }
+
+
+def parse_window(text: str, rule_id: str) -> tuple[int, int]:
+    """'HH:MM-HH:MM' → (start, end) in minutes after midnight."""
+    try:
+        start, end = (h * 60 + m for h, m in (map(int, part.split(':')) for part in text.split('-')))
+    except ValueError:
+        raise ValueError(f'rule "{rule_id}": "between" must look like "18:00-06:00"') from None
+    return start, end
+
+
+def in_window(window: tuple[int, int], wall: float) -> bool:
+    local = time.localtime(wall)
+    minute = local.tm_hour * 60 + local.tm_min
+    start, end = window
+    if start <= end:
+        return start <= minute < end
+    return minute >= start or minute < end   # wraps midnight
+
+
+class AutomationEngine:
+    def __init__(self, rules: list[Rule], act):
+        """act(rule, status) — called outside the engine's lock when a rule fires or releases."""
+        self.rules  = rules
+        self.act    = act
+        self._lock  = threading.Lock()
+        self._index = collections.defaultdict(list)   # (controller, sensor) → rules
+        for rule in rules:
+            self._index[rule.controller, rule.sensor].append(rule)
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def on_readings(self, controller_id: str, readings: dict, now: float, wall: float) -> int:
+        """
+        Evaluate the rules watching these readings of one controller
+        (sensor → value, from one batch). Returns how many were evaluated.
+        """
+        actions, evaluated = [], 0
+        with self._lock:
+            for sensor, value in readings.items():
+                rules = self._index.get((controller_id, sensor))
+                if not rules or value is None:
+                    continue
+                for rule in rules:
+                    evaluated += 1
+                    rule.last_value = value
+                    wanted = rule.condition(float(value), wall)
+                    if wanted == rule.active:
+                        rule.pending_since = None
+                        continue
+                    if rule.pending_since is None:
+                        rule.pending_since = now
+                    if now - rule.pending_since < (rule.debounce if wanted else rule.release_after):
+                        continue
+                    rule.active, rule.pending_since = wanted, None
+                    status = rule.then if wanted else rule.otherwise
+                    if status:
+                        actions.append((rule, status))
+        for rule, status in actions:
+            try:
+                self.act(rule, status)
+            except Exception as e:
+                print(f'[automation] {rule.id}: action failed: {e}')
+        return evaluated
+
+    def status(self) -> list:
+        with self._lock:
+            return [rule.to_dict() for rule in self.rules]
+
+
+def load_rules(path: str, controllers: dict, sensors) -> list[Rule]:
+    """
+    Rules from the JSON file at path (none if it doesn't exist), checked
+    against controllers (id → Controller) and the known sensor names.
+    """
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        entries = json.load(f)
+
+    rules, seen = [], set()
+    for entry in entries:
+        entry = dict(entry)
+        rule_id = str(entry.pop('id', '')).strip()
+        if not rule_id or rule_id in seen:
+            raise ValueError(f'{path}: missing or duplicate rule id "{rule_id}"')
+        seen.add(rule_id)
+        controller = controllers.get(str(entry.get('controller', '')).lower())
+        if controller is None:
+            raise ValueError(f'{path}: rule "{rule_id}": unknown controller "{entry.get("controller")}"')
+        if entry.get('sensor') not in sensors:
+            raise ValueError(f'{path}: rule "{rule_id}": sensor must be one of {", ".join(sorted(sensors))}')
+        if str(entry.get('device', '')).lower() not in controller.devices:
+            raise ValueError(f'{path}: rule "{rule_id}": {controller.id} has no device "{entry.get("device")}"')
+        entry.update(controller=controller.id, device=str(entry['device']).lower())
+        try:
+            rules.append(Rule(rule_id, **entry))
+        except TypeError as e:
+            raise ValueError(f'{path}: rule "{rule_id}": {e}') from None
+    return rules
@@ -0,0 +1,91 @@
+"""
+Audit journal benchmark
+-----------------------
+Records --events synthetic events into a throwaway AuditJournal from
+--threads request-like threads and reports the caller-side cost of
+record(), events per group commit (one fsync each), and query latency by
+username and time range once the journal spans many segments.
+
+Usage:
+  python benchmarks/bench_audit.py [--events 200000] [--threads 8] [--users 500] [--segment-kb 1024]
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import metrics  # noqa: E402
+from audit_log import AuditJournal  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--events', type=int, default=200_000)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--segment-kb', type=int, default=1024)
+    parser.add_argument('--queries', type=int, default=50)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='audit-bench-')
+    try:
+        journal = AuditJournal(directory, args.segment_kb * 1024)
+        journal.start()
+        per_thread = args.events // args.threads
+        record_ns  = []
+
+        def client(n: int) -> None:
+            rng, spent = np.random.default_rng(n), 0
+            for i in range(per_thread):
+                t0 = time.perf_counter_ns()
+                journal.record('device_toggle', f'user{rng.integers(args.users)}',
+                               controller='living', device='fan', status='on' if i % 2 else 'off')
+                spent += time.perf_counter_ns() - t0
+            record_ns.append(spent / per_thread)
+
+        began = time.time()
+        threads = [threading.Thread(target=client, args=(n,)) for n in range(args.threads)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        recorded = time.time()
+        journal.close()
+        elapsed = time.time() - began
+
+        commits  = metrics.snapshot().get('audit_commit_seconds', {}).get('', [0])[-1]
+        total    = per_thread * args.threads
+        segments = sum(f.endswith('.jsonl') for f in os.listdir(directory))
+        print(f'{total:,} events from {args.threads} threads in {elapsed:.2f} s ({total / elapsed:,.0f} events/s)')
+        print(f'record(): {np.mean(record_ns) / 1000:.2f} µs per call on the caller\'s thread')
+        print(f'{commits:,} group commits ({total / max(commits, 1):.0f} events per fsync), '
+              f'{segments} segment(s) of {args.segment_kb} KB')
+
+        t0 = time.perf_counter()
+        journal = AuditJournal(directory, args.segment_kb * 1024)
+        print(f'reopen + index load: {(time.perf_counter() - t0) * 1000:.1f} ms')
+
+        now = time.time()
+        print(f'\n{"query":>24} {"events":>7} {"ms/query":>9}')
+        recent = now - recorded + (recorded - began) * 0.1   # the last 10 % of the recording
+        for label, username, span in (('one user, all time', 'user7', now), ('one user, last 10 %', 'user7', recent),
+                                      ('everyone, last 10 %', None, recent), ('everyone, all time', None, now)):
+            q0 = time.perf_counter()
+            for _ in range(args.queries):
+                events, _truncated = journal.query(now - span, now, username, limit=100)
+            ms = (time.perf_counter() - q0) / args.queries * 1000
+            print(f'{label:>24} {len(events):>7} {ms:>9.2f}')
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Automation rule benchmark
+-------------------------
+Generates --rules synthetic rules spread over --controllers controllers
+and feeds the engine one packet per controller at a time, as
+handle_esp_lines does. Compares the indexed engine (rules keyed by
+controller and sensor) with evaluating every rule on every packet, and
+reports µs per packet and rules evaluated per packet.
+
+Usage:
+  python benchmarks/bench_automation.py [--rules 10 100 1000 10000] [--controllers 20] [--packets 20000]
+"""
+
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from automation import AutomationEngine, Rule  # noqa: E402
+
+SENSORS = ('temperature', 'humidity', 'motion')
+
+
+def make_rules(n: int, controllers: int, rng) -> list[Rule]:
+    rules = []
+    for i in range(n):
+        sensor = SENSORS[i % len(SENSORS)]
+        threshold = {'temperature': rng.uniform(20, 30), 'humidity': rng.uniform(40, 70), 'motion': 0}[sensor]
+        rules.append(Rule(f'r{i}', f'c{rng.integers(controllers)}', sensor, 'fan', 'on',
+                          above=threshold, hysteresis=0.5, debounce=5, otherwise='off'))
+    return rules
+
+
+def scan_all(rules: list[Rule], controller_id: str, readings: dict, wall: float) -> int:
+    """The unindexed baseline: look at every rule for every packet."""
+    evaluated = 0
+    for rule in rules:
+        if rule.controller != controller_id or rule.sensor not in readings:
+            continue
+        evaluated += 1
+        rule.condition(float(readings[rule.sensor]), wall)
+    return evaluated
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rules', type=int, nargs='+', default=[10, 100, 1000, 10000])
+    parser.add_argument('--controllers', type=int, default=20)
+    parser.add_argument('--packets', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    packets = [
+        (f'c{rng.integers(args.controllers)}',
+         {'temperature': float(rng.normal(25, 3)), 'humidity': float(rng.normal(55, 8)),
+          'motion': bool(rng.random() < 0.1)})
+        for _ in range(args.packets)
+    ]
+    actions = []
+
+    print(f'{"rules":>7} {"evaluated/packet":>17} {"indexed µs":>11} {"scan-all µs":>12} {"actions":>8}')
+    for n in args.rules:
+        rules  = make_rules(n, args.controllers, rng)
+        engine = AutomationEngine(rules, act=lambda rule, status: actions.append(status))
+        actions.clear()
+
+        wall, evaluated = time.time(), 0
+        began = time.perf_counter()
+        for i, (controller_id, readings) in enumerate(packets):
+            evaluated += engine.on_readings(controller_id, readings, i * 2.0, wall)
+        indexed = (time.perf_counter() - began) / len(packets) * 1e6
+
+        began = time.perf_counter()
+        for controller_id, readings in packets:
+            scan_all(rules, controller_id, readings, wall)
+        scanned = (time.perf_counter() - began) / len(packets) * 1e6
+
+        print(f'{n:>7} {evaluated / len(packets):>17.1f} {indexed:>11.1f} {scanned:>12.1f} {len(actions):>8}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Face detection benchmark
+------------------------
+Runs every image in a fixture directory through the full-size pipeline
+(today's path: decode → HOG on the full frame → encode) and through the
+downscale-before-detect path at each --max-side, and reports per-image
+latency plus the embedding drift (Euclidean distance between the two
+encodings of the same image — compare against FACE_DISTANCE_THRESHOLD).
+
+Then runs them again with the quality pre-filter (face_quality) on, and
+reports how many frames it turned away per reason and how long a
+rejected frame took compared with one that went through the encoder.
+Mix some blurry / dark / multi-face frames into the directory to see it.
+
+Needs face_recognition installed and a directory of JPEG/PNG photos,
+e.g. frames saved from the FaceCamera page.
+
+Usage:
+  python benchmarks/bench_detect.py IMAGES_DIR [--max-side 320 480 640 800] [--model hog]
+"""
+
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from face_pipeline import DetectionOptions, embed_image, warm_up  # noqa: E402
+from face_quality import QualityThresholds, FrameRejected          # noqa: E402
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+
+def load_fixtures(directory: str) -> list[tuple[str, bytes]]:
+    fixtures = []
+    for root, _dirs, files in os.walk(directory):
+        for name in sorted(files):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                path = os.path.join(root, name)
+                with open(path, 'rb') as f:
+                    fixtures.append((path, f.read()))
+    return fixtures
+
+
+def run(fixtures, options: DetectionOptions) -> tuple[list, float]:
+    embeddings = []
+    start = time.perf_counter()
+    for _path, data in fixtures:
+        embeddings.append(embed_image(data, options))
+    return embeddings, (time.perf_counter() - start) / len(fixtures) * 1000.0
+
+
+def run_quality(fixtures, options: DetectionOptions) -> dict:
+    """outcome ('accepted', 'no_face' or a rejection reason) → per-image ms."""
+    outcomes = {}
+    for _path, data in fixtures:
+        start = time.perf_counter()
+        try:
+            outcome = 'accepted' if embed_image(data, options) is not None else 'no_face'
+        except FrameRejected as e:
+            outcome = e.reason
+        outcomes.setdefault(outcome, []).append((time.perf_counter() - start) * 1000.0)
+    return outcomes
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('images')
+    parser.add_argument('--max-side', type=int, nargs='+', default=[320, 480, 640, 800])
+    parser.add_argument('--model', default='hog', choices=('hog', 'cnn'))
+    parser.add_argument('--upsample', type=int, default=1)
+    parser.add_argument('--quality-side', type=int, default=640, help='max side for the pre-filter run')
+    args = parser.parse_args()
+
+    fixtures = load_fixtures(args.images)
+    if not fixtures:
+        sys.exit(f'No images found in {args.images}')
+    warm_up()
+
+    baseline, base_ms = run(fixtures, DetectionOptions(0, args.model, args.upsample))
+    print(f'{len(fixtures)} image(s), model={args.model}, upsample={args.upsample}')
+    print(f'{"max side":>9}  {"ms/image":>9}  {"speedup":>8}  {"detected":>8}  {"drift mean":>10}  {"drift max":>9}')
+    print(f'{"full":>9}  {base_ms:>9.1f}  {1.0:>7.1f}x  {sum(e is not None for e in baseline):>8}'
+          f'  {"-":>10}  {"-":>9}')
+
+    for max_side in args.max_side:
+        found, ms = run(fixtures, DetectionOptions(max_side, args.model, args.upsample))
+        drift = [float(np.linalg.norm(a - b)) for a, b in zip(baseline, found)
+                 if a is not None and b is not None]
+        print(f'{max_side:>9}  {ms:>9.1f}  {base_ms / ms:>7.1f}x  {sum(e is not None for e in found):>8}'
+              f'  {np.mean(drift) if drift else float("nan"):>10.4f}  {max(drift, default=float("nan")):>9.4f}')
+
+    outcomes = run_quality(fixtures, DetectionOptions(args.quality_side, args.model, args.upsample,
+                                                      QualityThresholds()))
+    print(f'\nquality pre-filter at max side {args.quality_side}')
+    print(f'{"outcome":>15}  {"images":>6}  {"ms/image":>9}')
+    for outcome, times in sorted(outcomes.items(), key=lambda kv: -len(kv[1])):
+        print(f'{outcome:>15}  {len(times):>6}  {np.mean(times):>9.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,385 @@
+"""
+Face path benchmark and regression suite
+----------------------------------------
+Offline, over a labelled image set laid out like `python app.py enroll`
+takes it (<username>/*.jpg or <username>.jpg), with the app's own
+settings (FACE_DETECTION['authenticate'], matcher, threshold):
+
+  stages      per-image time of each pipeline stage (decode, quality,
+              detect, encode) and of the gallery match, p50 / p95 / p99
+  accuracy    every 4th identity is never enrolled and only probes as an
+              impostor; the others enroll their first --enroll images and
+              probe with the rest. FAR / FRR at each --thresholds value,
+              plus frames that gave no embedding (failure to acquire)
+  synthetic   the same FAR / FRR and match latency on a synthetic gallery
+              of --synthetic identities, so matcher changes (exact / ivf,
+              aggregate) show up without a large photo set
+  throughput  POST /face/authenticate from N concurrent clients through
+              the Flask test client and the face worker pool: req/s and
+              p50 / p95 / p99 per --clients level
+
+--json writes every number to a file; --compare BASELINE.json prints
+what got slower or less accurate than a previous run and exits 1 past
+--tolerance (relative, for timings) / --accuracy-tolerance (absolute,
+for rates), so two releases can be compared on the same machine.
+
+Usage:
+  python benchmarks/bench_face.py [IMAGES_DIR] [--clients 1 4 16] [--requests 200]
+                                  [--json out.json] [--compare baseline.json]
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import atexit
+import shutil
+import platform
+import argparse
+import tempfile
+import threading
+import contextlib
+import subprocess
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# The app reads its configuration at import: keep it off the real database,
+# history and ESPs, and make sure the stage timers are on
+_scratch = tempfile.mkdtemp(prefix='face-bench-')
+atexit.register(shutil.rmtree, _scratch, ignore_errors=True)
+os.environ['METRICS'] = '1'
+os.environ.setdefault('DB_PATH', os.path.join(_scratch, 'faces.db'))
+os.environ.setdefault('HISTORY_DIR', os.path.join(_scratch, 'history'))
+os.environ.setdefault('AUDIT_DIR', os.path.join(_scratch, 'audit'))
+os.environ.setdefault('ESP_CONTROLLERS', os.path.join(_scratch, 'controllers.json'))
+os.environ.setdefault('AUTOMATION_RULES', os.path.join(_scratch, 'automations.json'))
+
+import app as backend                          # noqa: E402
+import metrics                                 # noqa: E402
+import enrollment                              # noqa: E402
+from face_gallery import FaceGallery, EMBEDDING_DIM   # noqa: E402
+from face_index import make_index              # noqa: E402
+from face_pipeline import embed_image, warm_up, ImageDecodeError   # noqa: E402
+from face_quality import FrameRejected         # noqa: E402
+
+IMPOSTOR_EVERY = 4   # every 4th identity is held out of the gallery
+DEFAULT_THRESHOLDS = (0.4, 0.45, 0.5, 0.55, 0.6, 0.65, 0.7)
+
+
+def percentiles(values_ms: list) -> dict:
+    if not values_ms:
+        return {'count': 0}
+    p50, p95, p99 = np.percentile(values_ms, (50, 95, 99))
+    return {'count': len(values_ms), 'mean_ms': round(float(np.mean(values_ms)), 3),
+            'p50_ms': round(float(p50), 3), 'p95_ms': round(float(p95), 3), 'p99_ms': round(float(p99), 3)}
+
+
+def new_gallery() -> FaceGallery:
+    """An empty gallery with the matcher the app is configured for."""
+    options = {'nprobe': backend.FACE_IVF_NPROBE} if backend.FACE_MATCHER == 'ivf' else {}
+    return FaceGallery(make_index(backend.FACE_MATCHER, **options), aggregate=backend.FACE_MATCH_AGGREGATE)
+
+
+def rates(gallery: FaceGallery, genuine: list, impostors: list, thresholds) -> tuple[dict, list]:
+    """
+    FAR / FRR per threshold. genuine: [(username, embedding)], impostors:
+    [embedding]. A genuine probe only counts as accepted when it matched
+    its own identity. Returns (rates, match times in ms).
+    """
+    times, genuine_hits, impostor_distances = [], [], []
+    for username, embedding in genuine:
+        t0 = time.perf_counter()
+        matched = gallery.match(embedding)
+        times.append((time.perf_counter() - t0) * 1000)
+        genuine_hits.append((matched['username'] == username, matched['distance']))
+    for embedding in impostors:
+        t0 = time.perf_counter()
+        matched = gallery.match(embedding)
+        times.append((time.perf_counter() - t0) * 1000)
+        impostor_distances.append(matched['distance'])
+
+    out = {}
+    for t in thresholds:
+        accepted = sum(own and d <= t for own, d in genuine_hits)
+        out[f'{t:g}'] = {
+            'far': round(sum(d <= t for d in impostor_distances) / len(impostors), 4) if impostors else None,
+            'frr': round(1 - accepted / len(genuine), 4) if genuine else None,
+            'misidentified': sum(not own and d <= t for own, d in genuine_hits),
+        }
+    return out, times
+
+
+# ---------------------------------------------------------------------------
+# Labelled images
+# ---------------------------------------------------------------------------
+def load_images(directory: str) -> dict:
+    """username → [(filename, bytes), …] in file order."""
+    identities = {}
+    for username, filename, data in enrollment.iter_directory(directory):
+        identities.setdefault(username, []).append((filename, data))
+    return identities
+
+
+def embed_all(identities: dict) -> tuple[dict, dict, dict]:
+    """(username → [embedding | None per image], failures by reason, stage summary)."""
+    options  = backend.FACE_DETECTION['authenticate']
+    before   = metrics.snapshot()
+    results, failures = {}, {}
+    for username, images in identities.items():
+        results[username] = []
+        for _filename, data in images:
+            try:
+                embedding = embed_image(data, options)
+                reason = None if embedding is not None else 'no_face'
+            except FrameRejected as e:
+                embedding, reason = None, e.reason
+            except ImageDecodeError:
+                embedding, reason = None, 'unreadable'
+            if reason:
+                failures[reason] = failures.get(reason, 0) + 1
+            results[username].append(embedding)
+    stages = metrics.summarize(stage_delta(before, metrics.snapshot())).get('face_stage_seconds', {})
+    return results, failures, {key.split('"')[1]: row for key, row in stages.items()}
+
+
+def stage_delta(before: dict, after: dict) -> dict:
+    """Observations made between two snapshots."""
+    out = {}
+    for name, series in after.items():
+        for key, cells in series.items():
+            old = before.get(name, {}).get(key)
+            out.setdefault(name, {})[key] = [a - b for a, b in zip(cells, old)] if old else list(cells)
+    return out
+
+
+def split(embeddings: dict, enroll: int) -> tuple[list, list, list]:
+    """(gallery entries, genuine probes, impostor probes) — see the module docstring."""
+    entries, genuine, impostors = [], [], []
+    for n, (username, found) in enumerate(sorted(embeddings.items())):
+        found = [e for e in found if e is not None]
+        if n % IMPOSTOR_EVERY == IMPOSTOR_EVERY - 1:
+            impostors.extend(found)
+            continue
+        for i, embedding in enumerate(found[:enroll]):
+            entries.append((f'{username}-{i}', f'user-{username}', username, embedding))
+        genuine.extend((username, e) for e in found[enroll:])
+    return entries, genuine, impostors
+
+
+# ---------------------------------------------------------------------------
+# Synthetic gallery
+# ---------------------------------------------------------------------------
+def synthetic(identities: int, samples: int, probes: int, thresholds, seed: int) -> dict:
+    """
+    Identities around a shared mean face, spread like face_recognition
+    encodings: same-person distances ~0.35, different people ~0.75.
+    """
+    rng       = np.random.default_rng(seed)
+    mean      = rng.normal(0.0, 0.06, EMBEDDING_DIM)
+    centroids = mean + rng.normal(0.0, 0.045, (identities + probes, EMBEDDING_DIM))
+    noise     = 0.022
+
+    gallery = new_gallery()
+    gallery.load((f'{i}-{s}', f'u{i}', f'user{i}', centroids[i] + rng.normal(0, noise, EMBEDDING_DIM))
+                 for i in range(identities) for s in range(samples))
+    who      = rng.integers(0, identities, probes)
+    genuine  = [(f'user{i}', centroids[i] + rng.normal(0, noise, EMBEDDING_DIM)) for i in who]
+    strangers = [centroids[identities + i] + rng.normal(0, noise, EMBEDDING_DIM) for i in range(probes)]
+    out, times = rates(gallery, genuine, strangers, thresholds)
+    return {'identities': identities, 'samples': samples, 'probes': probes * 2,
+            'rates': out, 'match': percentiles(times)}
+
+
+# ---------------------------------------------------------------------------
+# Throughput through the Flask test client
+# ---------------------------------------------------------------------------
+def throughput(images: list, clients: int, requests: int) -> dict:
+    latencies, statuses, lock = [], {}, threading.Lock()
+    counter = iter(range(requests))
+
+    def client() -> None:
+        http = backend.app.test_client()
+        for n in counter:
+            t0 = time.perf_counter()
+            response = http.post('/face/authenticate', data={'image': (io.BytesIO(images[n % len(images)]), 'f.jpg')},
+                                 content_type='multipart/form-data')
+            ms = (time.perf_counter() - t0) * 1000
+            with lock:
+                latencies.append(ms)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    began = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - began
+    return {'clients': clients, 'rps': round(len(latencies) / elapsed, 2), **percentiles(latencies),
+            'status': {str(code): n for code, n in sorted(statuses.items())}}
+
+
+# ---------------------------------------------------------------------------
+# Comparing runs
+# ---------------------------------------------------------------------------
+def compare(current: dict, baseline: dict, tolerance: float, accuracy_tolerance: float) -> list:
+    """Regressions of current against baseline, as printable lines."""
+    worse = []
+
+    def slower(label: str, new, old, higher_is_worse: bool = True) -> None:
+        if new is None or old is None or not old:
+            return
+        change = (new - old) / old if higher_is_worse else (old - new) / old
+        if change > tolerance:
+            worse.append(f'{label}: {old:g} → {new:g} ({change:+.0%})')
+
+    for stage, row in current.get('stages', {}).items():
+        old = baseline.get('stages', {}).get(stage, {})
+        slower(f'stage {stage} p50 ms', row.get('p50_ms'), old.get('p50_ms'))
+        slower(f'stage {stage} p95 ms', row.get('p95_ms'), old.get('p95_ms'))
+    for section in ('images', 'synthetic'):
+        new_rates = (current.get('accuracy', {}).get(section) or {}).get('rates', {})
+        old_rates = (baseline.get('accuracy', {}).get(section) or {}).get('rates', {})
+        for t, row in new_rates.items():
+            for key in ('far', 'frr'):
+                new, old = row.get(key), old_rates.get(t, {}).get(key)
+                if new is not None and old is not None and new - old > accuracy_tolerance:
+                    worse.append(f'{section} {key.upper()} @ {t}: {old:.4f} → {new:.4f}')
+        old_match = (baseline.get('accuracy', {}).get(section) or {}).get('match', {})
+        new_match = (current.get('accuracy', {}).get(section) or {}).get('match', {})
+        slower(f'{section} match p50 ms', new_match.get('p50_ms'), old_match.get('p50_ms'))
+    old_levels = {row['clients']: row for row in baseline.get('throughput', [])}
+    for row in current.get('throughput', []):
+        old = old_levels.get(row['clients'], {})
+        slower(f'{row["clients"]} client(s) req/s', row.get('rps'), old.get('rps'), higher_is_worse=False)
+        slower(f'{row["clients"]} client(s) p99 ms', row.get('p99_ms'), old.get('p99_ms'))
+    return worse
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def print_rates(title: str, rows: dict) -> None:
+    print(f'\n{title}')
+    print(f'{"threshold":>10} {"FAR":>8} {"FRR":>8} {"misid.":>7}')
+    for t, row in rows.items():
+        far = '-' if row['far'] is None else f'{row["far"]:.4f}'
+        frr = '-' if row['frr'] is None else f'{row["frr"]:.4f}'
+        mark = '  ← FACE_DISTANCE_THRESHOLD' if float(t) == backend.FACE_DISTANCE_THRESHOLD else ''
+        print(f'{t:>10} {far:>8} {frr:>8} {row["misidentified"]:>7}{mark}')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('images', nargs='?', help='labelled images: <username>/*.jpg or <username>.jpg')
+    parser.add_argument('--enroll', type=int, default=1, help='images per identity enrolled; the rest probe')
+    parser.add_argument('--thresholds', type=float, nargs='+', default=list(DEFAULT_THRESHOLDS))
+    parser.add_argument('--synthetic', type=int, default=1000, help='synthetic identities (0 = skip)')
+    parser.add_argument('--synthetic-probes', type=int, default=1000)
+    parser.add_argument('--clients', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--requests', type=int, default=200, help='requests per --clients level')
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--compare', help='results of an earlier run to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='allowed relative slowdown')
+    parser.add_argument('--accuracy-tolerance', type=float, default=0.01, help='allowed FAR / FRR increase')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    thresholds = sorted(set(args.thresholds) | {backend.FACE_DISTANCE_THRESHOLD})
+    results = {
+        'meta': {
+            'revision':  git_revision(),
+            'time':      time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python':    platform.python_version(),
+            'machine':   f'{platform.machine()} × {os.cpu_count()} CPU',
+            'threshold': backend.FACE_DISTANCE_THRESHOLD,
+            'matcher':   backend.FACE_MATCHER,
+            'aggregate': backend.FACE_MATCH_AGGREGATE,
+            'detection': backend.FACE_DETECTION['authenticate']._asdict(),
+        },
+        'stages': {}, 'accuracy': {}, 'throughput': [],
+    }
+
+    probe_images = []
+    if args.images:
+        identities = load_images(args.images)
+        if not identities:
+            sys.exit(f'No labelled images found in {args.images}')
+        warm_up()
+        embeddings, failures, stages = embed_all(identities)
+        entries, genuine, impostors = split(embeddings, args.enroll)
+        if failures:
+            print(f'no embedding: {failures}')
+        if not entries:
+            sys.exit('No image gave an embedding to enroll — see "no embedding" above')
+        gallery = new_gallery()
+        gallery.load(entries)
+        image_rates, match_ms = rates(gallery, genuine, impostors, thresholds)
+        stages['match'] = percentiles(match_ms)
+        results['stages'] = stages
+        results['accuracy']['images'] = {
+            'identities': len(identities), 'images': sum(map(len, identities.values())),
+            'enrolled': len(entries), 'genuine': len(genuine), 'impostor': len(impostors),
+            'failed_to_acquire': failures, 'rates': image_rates, 'match': stages['match'],
+        }
+        probe_images = [data for images in identities.values() for _name, data in images]
+
+        print(f'{len(identities)} identities, {results["accuracy"]["images"]["images"]} images '
+              f'({len(entries)} enrolled, {len(genuine)} genuine / {len(impostors)} impostor probes)')
+        print(f'\n{"stage":>8} {"count":>6} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8}')
+        for stage, row in stages.items():
+            print(f'{stage:>8} {row["count"]:>6} {row.get("p50_ms", 0):>8.2f} '
+                  f'{row.get("p95_ms", 0):>8.2f} {row.get("p99_ms", 0):>8.2f}')
+        print_rates('accuracy on the labelled images', image_rates)
+
+    if args.synthetic:
+        results['accuracy']['synthetic'] = synthetic(args.synthetic, args.enroll, args.synthetic_probes,
+                                                     thresholds, args.seed)
+        s = results['accuracy']['synthetic']
+        print_rates(f'synthetic gallery: {s["identities"]} identities, match p50 {s["match"]["p50_ms"]} ms',
+                    s['rates'])
+
+    if probe_images and args.clients:
+        backend.readiness.run('database', backend.init_db, background=False)
+        backend.readiness.run('gallery', lambda: backend.face_gallery.load(entries), background=False)
+        backend.readiness.run('face_models', backend.face_pool.start, background=False)
+        print(f'\n/face/authenticate through the test client ({backend.FACE_WORKERS} face worker(s))')
+        print(f'{"clients":>8} {"req/s":>8} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8}  status')
+        try:
+            for clients in args.clients:
+                with contextlib.redirect_stdout(io.StringIO()):   # the routes' per-request prints
+                    row = throughput(probe_images, clients, args.requests)
+                results['throughput'].append(row)
+                print(f'{clients:>8} {row["rps"]:>8.1f} {row["p50_ms"]:>8.1f} {row["p95_ms"]:>8.1f} '
+                      f'{row["p99_ms"]:>8.1f}  {row["status"]}')
+        finally:
+            backend.face_pool.shutdown(wait=True)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f'\nResults written to {args.json}')
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        worse = compare(results, baseline, args.tolerance, args.accuracy_tolerance)
+        print(f'\nAgainst {args.compare} (revision {baseline.get("meta", {}).get("revision")}):')
+        for line in worse:
+            print(f'  REGRESSION  {line}')
+        if worse:
+            sys.exit(1)
+        print('  no regressions')
+
+
+if __name__ == '__main__':
+    main()
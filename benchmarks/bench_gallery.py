@@ -0,0 +1,73 @@
+"""
+Gallery match benchmark
+-----------------------
+Compares the old per-request path (decode every embedding into a list,
+then face_distance + argmin) with FaceGallery.match on synthetic galleries.
+
+Usage:
+  python benchmarks/bench_gallery.py [--sizes 1000 10000 100000] [--queries 200]
+"""
+
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from face_gallery import FaceGallery, EMBEDDING_DIM  # noqa: E402
+
+
+def synthetic_embeddings(n: int, rng: np.random.Generator) -> np.ndarray:
+    # face_recognition encodings are roughly unit-ish vectors with small components
+    vectors = rng.normal(0.0, 0.09, size=(n, EMBEDDING_DIM))
+    return vectors.astype(np.float64)
+
+
+def legacy_match(known: list, query: np.ndarray) -> tuple[int, float]:
+    # Same maths as face_recognition.face_distance, without importing dlib
+    distances = np.linalg.norm(np.asarray(known) - query, axis=1)
+    best_idx  = int(np.argmin(distances))
+    return best_idx, float(distances[best_idx])
+
+
+def time_per_call(fn, queries) -> float:
+    start = time.perf_counter()
+    for q in queries:
+        fn(q)
+    return (time.perf_counter() - start) / len(queries) * 1000.0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000])
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    print(f'{"identities":>10}  {"legacy ms":>10}  {"gallery ms":>10}  {"speedup":>8}  agree')
+    for n in args.sizes:
+        embeddings = synthetic_embeddings(n, rng)
+        queries    = embeddings[rng.integers(0, n, args.queries)] + rng.normal(0, 0.02, (args.queries, EMBEDDING_DIM))
+
+        gallery = FaceGallery()
+        gallery.load((str(i), str(i), f'user{i}', e) for i, e in enumerate(embeddings))
+
+        # The legacy path rebuilt this list on every request; only the
+        # distance step is timed here, so the real-world gap is larger.
+        known = list(embeddings)
+
+        legacy_ms  = time_per_call(lambda q: legacy_match(known, q), queries)
+        gallery_ms = time_per_call(gallery.match, queries)
+
+        agree = sum(
+            legacy_match(known, q)[0] == int(gallery.match(q)['face_id']) for q in queries[:50]
+        )
+        print(f'{n:>10}  {legacy_ms:>10.3f}  {gallery_ms:>10.3f}  {legacy_ms / gallery_ms:>7.1f}x  {agree}/50')
+
+
+if __name__ == '__main__':
+    main()
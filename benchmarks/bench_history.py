@@ -0,0 +1,74 @@
+"""
+Sensor history benchmark
+------------------------
+Fills a throwaway SensorHistory with synthetic packets (one every
+--interval seconds, as the ESP sends them) and reports ingest rate, disk
+footprint and query latency per range / resolution.
+
+Usage:
+  python benchmarks/bench_history.py [--days 30] [--interval 2] [--queries 50]
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sensor_history import SensorHistory  # noqa: E402
+
+
+def dir_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--days', type=float, default=30)
+    parser.add_argument('--interval', type=float, default=2.0)
+    parser.add_argument('--queries', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng       = np.random.default_rng(args.seed)
+    directory = tempfile.mkdtemp(prefix='history-bench-')
+    try:
+        history = SensorHistory(directory)
+        end     = time.time()
+        start   = end - args.days * 86400
+        stamps  = np.arange(start, end, args.interval)
+        temps   = 22 + 4 * np.sin(stamps / 86400 * 2 * np.pi) + rng.normal(0, 0.3, len(stamps))
+        hums    = 55 + rng.normal(0, 2, len(stamps))
+        motion  = rng.random(len(stamps)) < 0.05
+
+        began = time.perf_counter()
+        for n, ts in enumerate(stamps):
+            history.append(float(ts), float(temps[n]), float(hums[n]), bool(motion[n]))
+            if n % 10_000 == 0:
+                history.flush()
+        history.flush()
+        elapsed = time.perf_counter() - began
+        print(f'Ingested {len(stamps):,} samples in {elapsed:.1f} s '
+              f'({len(stamps) / elapsed:,.0f} samples/s), {dir_size(directory) / 1e6:.1f} MB on disk')
+
+        print(f'\n{"range":>8} {"resolution":>10} {"points":>8} {"ms/query":>10}')
+        for label, span in (('1 h', 3600), ('1 day', 86400), ('1 week', 7 * 86400), ('30 days', 30 * 86400)):
+            for resolution in ('raw', '1m', '1h'):
+                if resolution == 'raw' and span > 86400:
+                    continue   # that is what the rollups are for
+                q0 = time.perf_counter()
+                for _ in range(args.queries):
+                    _res, points = history.query(end - span, end, resolution)
+                ms = (time.perf_counter() - q0) / args.queries * 1000.0
+                print(f'{label:>8} {resolution:>10} {len(points):>8} {ms:>10.2f}')
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
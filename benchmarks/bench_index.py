@@ -0,0 +1,78 @@
+"""
+Face matcher recall / latency benchmark
+---------------------------------------
+Runs the exact and IVF backends from face_index over a synthetic, clustered
+gallery and reports, for each nprobe setting, recall@1 against the exact
+answer (for enrolled people and over all queries), the fraction of queries whose accept/reject decision at
+FACE_DISTANCE_THRESHOLD changes, and per-query latency.
+
+Usage:
+  python benchmarks/bench_index.py [--size 100000] [--nprobe 1 4 8 16 32]
+"""
+
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from face_index import EMBEDDING_DIM, ExactIndex, IVFIndex  # noqa: E402
+
+THRESHOLD = 0.6
+
+
+def clustered_gallery(n: int, rng: np.random.Generator) -> np.ndarray:
+    # Real encodings are not uniform: people of similar appearance cluster.
+    centres = rng.normal(0.0, 0.09, size=(max(n // 200, 1), EMBEDDING_DIM))
+    members = centres[rng.integers(0, len(centres), n)]
+    return (members + rng.normal(0.0, 0.05, size=(n, EMBEDDING_DIM))).astype(np.float32)
+
+
+def run(index, queries) -> tuple[list, float]:
+    start   = time.perf_counter()
+    results = [index.search(q) for q in queries]
+    return results, (time.perf_counter() - start) / len(queries) * 1000.0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=int, default=100_000)
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[1, 4, 8, 16, 32])
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng     = np.random.default_rng(args.seed)
+    gallery = clustered_gallery(args.size, rng)
+    ids     = [str(i) for i in range(args.size)]
+    # Half the queries are enrolled people (should match), half are strangers
+    known   = gallery[rng.integers(0, args.size, args.queries // 2)] + rng.normal(0, 0.02, (args.queries // 2, EMBEDDING_DIM))
+    strange = clustered_gallery(args.queries - len(known), rng)
+    queries = np.vstack([known, strange]).astype(np.float32)
+
+    exact = ExactIndex()
+    exact.build(ids, gallery)
+    truth, exact_ms = run(exact, queries)
+    print(f'gallery={args.size}  queries={len(queries)}')
+    print(f'{"backend":>14}  {"ms/query":>9}  {"recall enrolled":>15}  {"recall all":>10}  {"decision drift":>14}')
+    print(f'{"exact":>14}  {exact_ms:>9.3f}  {1.0:>15.3f}  {1.0:>10.3f}  {0.0:>14.3f}')
+
+    ivf = IVFIndex()
+    start = time.perf_counter()
+    ivf.build(ids, gallery)
+    print(f'(ivf build: {len(ivf._state.lists)} lists in {time.perf_counter() - start:.2f} s)')
+
+    for nprobe in args.nprobe:
+        ivf.nprobe = nprobe
+        found, ms = run(ivf, queries)
+        hits   = [f[0] == t[0] for f, t in zip(found, truth)]
+        drift  = np.mean([(f[1] <= THRESHOLD) != (t[1] <= THRESHOLD) for f, t in zip(found, truth)])
+        print(f'{"ivf nprobe=" + str(nprobe):>14}  {ms:>9.3f}  {np.mean(hits[:len(known)]):>15.3f}'
+              f'  {np.mean(hits):>10.3f}  {drift:>14.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+"""
+Serial path benchmark
+---------------------
+Runs the real device hub and command queue in-process against simulated
+ESPs (esp_simulator, POSIX ptys) — no hardware, no HTTP server.
+
+Measures:
+  parse      packets/second read, parsed and applied to esp_state,
+             with every controller bursting at once
+  toggle     end-to-end POST /device/toggle → command acked latency
+             (includes the queue's coalescing window)
+  contention _state_lock wait and hold times while the simulators stream
+             and N threads hit /sensors and /device/list through the
+             Flask test client
+
+Usage:
+  python benchmarks/bench_serial.py [--controllers 4] [--packets 20000] [--clients 8]
+                                    [--protocol json|compact]
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from esp_simulator import PROTOCOLS, start_simulators, write_registry  # noqa: E402
+
+
+class TimedLock:
+    """Drop-in for threading.Lock that records wait and hold times."""
+
+    def __init__(self):
+        self._lock  = threading.Lock()
+        self._since = 0.0
+        self.waits, self.holds = [], []
+
+    def __enter__(self):
+        start = time.perf_counter()
+        self._lock.acquire()
+        self._since = time.perf_counter()
+        self.waits.append(self._since - start)
+        return self
+
+    def __exit__(self, *exc):
+        self.holds.append(time.perf_counter() - self._since)
+        self._lock.release()
+
+    def reset(self) -> None:
+        self.waits, self.holds = [], []
+
+
+def percentiles(values: list) -> str:
+    if not values:
+        return 'n/a'
+    ms = np.asarray(values) * 1000.0
+    return f'p50 {np.percentile(ms, 50):7.3f} ms   p99 {np.percentile(ms, 99):7.3f} ms   max {ms.max():7.3f} ms'
+
+
+def wait_until(predicate, timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.001)
+    return False
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--controllers', type=int, default=4)
+    parser.add_argument('--packets', type=int, default=20_000, help='burst size per controller')
+    parser.add_argument('--toggles', type=int, default=50)
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=5.0)
+    parser.add_argument('--rate', type=float, default=50.0,
+                        help='packets/s per controller during the contention run')
+    parser.add_argument('--protocol', choices=PROTOCOLS, default='json')
+    args = parser.parse_args()
+
+    simulators = start_simulators(args.controllers, rate=0, protocol=args.protocol)
+    registry   = tempfile.NamedTemporaryFile('w', suffix='.json', delete=False).name
+    write_registry(simulators, registry)
+    os.environ['ESP_CONTROLLERS'] = registry
+
+    import app  # noqa: E402 — reads ESP_CONTROLLERS at import
+
+    lock = app._state_lock = TimedLock()
+    parsed, batches = 0, 0
+
+    def on_batch(batch):
+        nonlocal parsed, batches
+        app.handle_esp_lines(batch)
+        parsed  += sum(len(lines) for _controller, lines in batch)
+        batches += 1
+
+    app.device_hub.start(on_batch)
+    app.device_commands.start()
+    if not wait_until(lambda: all(c.connected for c in app.device_hub.controllers.values()), 10):
+        sys.exit('Simulated controllers did not connect')
+    client = app.app.test_client()
+
+    try:
+        # ---- parse throughput ----
+        total = args.packets * len(simulators)
+        lock.reset()
+        start = time.perf_counter()
+        bursts = [threading.Thread(target=s.burst, args=(args.packets,)) for s in simulators]
+        for t in bursts:
+            t.start()
+        wait_until(lambda: parsed >= total, 120)
+        elapsed = time.perf_counter() - start
+        print(f'parse      {parsed:,} {args.protocol} packets from {len(simulators)} controller(s) '
+              f'in {elapsed:.2f} s → {parsed / elapsed:,.0f} packets/s '
+              f'({batches:,} batches, {len(lock.waits):,} lock acquisitions)')
+        for t in bursts:
+            t.join()
+
+        # ---- toggle latency ----
+        latencies, failed = [], 0
+        device_ids = [f'{s.id}/{d}' for s in simulators for d in s.devices]
+        for n in range(args.toggles):
+            device_id = device_ids[n % len(device_ids)]
+            status    = 'on' if (n // len(device_ids)) % 2 == 0 else 'off'
+            start     = time.perf_counter()
+            reply     = client.post('/device/toggle', json={'deviceId': device_id, 'status': status})
+            command   = app.device_commands.get(reply.get_json()['commandId'])
+            if wait_until(lambda: command.state in ('acked', 'failed'), 10) and command.state == 'acked':
+                latencies.append(time.perf_counter() - start)
+            else:
+                failed += 1
+        print(f'toggle     {len(latencies)} acked, {failed} failed   {percentiles(latencies)}')
+        print(f'           (coalescing window alone: {app.device_commands.coalesce * 1000:.0f} ms)')
+
+        # ---- lock contention under HTTP load ----
+        streams = [threading.Thread(target=_stream, args=(s, args.rate, args.duration), daemon=True)
+                   for s in simulators]
+        lock.reset()
+        stop = time.perf_counter() + args.duration
+        served = [0] * args.clients
+
+        def http_client(n: int) -> None:
+            while time.perf_counter() < stop:
+                client.get('/sensors' if served[n] % 2 else '/device/list')
+                served[n] += 1
+
+        clients = [threading.Thread(target=http_client, args=(n,)) for n in range(args.clients)]
+        for t in streams + clients:
+            t.start()
+        for t in clients:
+            t.join()
+        print(f'contention {sum(served) / args.duration:,.0f} req/s from {args.clients} client(s) '
+              f'while streaming {args.rate:g} packets/s × {len(simulators)}')
+        print(f'           lock wait  {percentiles(lock.waits)}   ({len(lock.waits):,} acquisitions)')
+        print(f'           lock hold  {percentiles(lock.holds)}')
+    finally:
+        for sim in simulators:
+            sim.stop()
+        os.unlink(registry)
+
+
+def _stream(sim, rate: float, duration: float) -> None:
+    interval, stop = 1.0 / rate, time.perf_counter() + duration
+    while time.perf_counter() < stop:
+        sim.send_packet()
+        time.sleep(interval)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+"""
+Serving mode benchmark
+----------------------
+Starts the backend twice against the same simulated ESPs (esp_simulator,
+POSIX ptys) and a throwaway database, and load-tests each:
+
+  dev        python app.py serve                — one process, Werkzeug dev server
+  workers    python app.py serve --workers N    — device gateway + N web workers
+
+and reports requests/second and p50 / p99 latency per route side by side
+(routes and client loop from load_test.py, plus /sensors, /device/list,
+/health and POST /device/toggle).
+
+Usage:
+  python benchmarks/bench_serving.py [--workers 4] [--clients 32] [--duration 10]
+                                     [--controllers 2] [--processes 2] [--json]
+
+Run it on a machine with a few cores to spare for the load generator —
+on one core the workers mode only adds the gateway hop.
+"""
+
+import os
+import sys
+import json
+import time
+import signal
+import socket
+import argparse
+import tempfile
+import itertools
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from load_test import call, make_routes, run_route            # noqa: E402
+from esp_simulator import start_simulators, write_registry     # noqa: E402
+
+STATE_ROUTES = ('/sensors', '/device/list', '/health')
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(mode_args: list, env: dict, log_path: str) -> tuple[subprocess.Popen, str]:
+    port = free_port()
+    log  = open(log_path, 'w')
+    proc = subprocess.Popen([sys.executable, os.path.join(ROOT, 'app.py'), 'serve',
+                             '--host', '127.0.0.1', '--port', str(port), *mode_args],
+                            env=env, stdout=log, stderr=subprocess.STDOUT)
+    base = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f'Server exited during startup — see {log_path}')
+        try:
+            if call(f'{base}/health')[0] == 200:
+                return proc, base
+        except OSError:
+            pass
+        time.sleep(0.2)
+    proc.terminate()
+    raise SystemExit(f'Server did not come up within 60 s — see {log_path}')
+
+
+def stop_server(proc: subprocess.Popen) -> None:
+    proc.send_signal(signal.SIGINT)   # like Ctrl-C, so the dev server also stops its face pool
+    try:
+        proc.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+
+def toggle_route(base: str, device: str):
+    states = itertools.cycle((b'on', b'off'))
+
+    def request():
+        body = b'{"deviceId":"%s","status":"%s"}' % (device.encode(), next(states))
+        return call(f'{base}/device/toggle', 'POST', body, {'Content-Type': 'application/json'})[0]
+    return ('POST /device/toggle', request)
+
+
+def run_mode(name: str, mode_args: list, env: dict, args, workdir: str, device: str) -> list:
+    proc, base = start_server(mode_args, env, os.path.join(workdir, f'{name}.log'))
+    try:
+        routes = make_routes(base, gets=STATE_ROUTES) + [toggle_route(base, device)]
+        results = []
+        for route, request in routes:
+            results.append(run_route(route, request, args.clients, args.duration, args.processes))
+            print(f'  {name:<8} {route:<22} {results[-1]["rps"]:>9} req/s', file=sys.stderr)
+        return results
+    finally:
+        stop_server(proc)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2)
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per route and mode')
+    parser.add_argument('--controllers', type=int, default=2)
+    parser.add_argument('--processes', type=int, default=max((os.cpu_count() or 2) // 2, 1),
+                        help='load-generator processes (a single one saturates before the workers do)')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+    if os.name != 'posix':
+        raise SystemExit('Needs POSIX ptys for the simulated ESPs and fork() for --workers')
+
+    workdir = tempfile.mkdtemp(prefix='bench-serving-')
+    simulators = start_simulators(args.controllers, rate=2.0, seed=1)
+    registry = os.path.join(workdir, 'controllers.json')
+    write_registry(simulators, registry)
+    env = {
+        **os.environ,
+        'DB_PATH':         os.path.join(workdir, 'faces.db'),
+        'HISTORY_DIR':     os.path.join(workdir, 'history'),
+        'ESP_CONTROLLERS': registry,
+        'GATEWAY_SOCKET':  os.path.join(workdir, 'gateway.sock'),
+        'EVENTS_PORT':     str(free_port()),
+        'FACE_WORKERS':    '1',   # no face routes are loaded; keep startup cheap
+    }
+    device = f'{simulators[0].id}/fan'
+
+    try:
+        results = {
+            'dev':     run_mode('dev', [], env, args, workdir, device),
+            'workers': run_mode('workers', ['--workers', str(args.workers)], env, args, workdir, device),
+        }
+    finally:
+        for sim in simulators:
+            sim.stop()
+
+    if args.json:
+        print(json.dumps({'workers': args.workers, 'clients': args.clients, 'results': results}, indent=2))
+        return
+    print(f'{args.clients} clients, {args.duration:g} s per route; workers mode = gateway + {args.workers} web workers')
+    print(f'{"route":<22} {"dev req/s":>10} {"p50":>7} {"p99":>7}   {"workers req/s":>13} {"p50":>7} {"p99":>7}')
+    for dev, prod in zip(results['dev'], results['workers']):
+        print(f'{dev["route"]:<22} {dev["rps"]:>10} {dev["p50_ms"]:>7} {dev["p99_ms"]:>7}   '
+              f'{prod["rps"]:>13} {prod["p50_ms"]:>7} {prod["p99_ms"]:>7}')
+    print('(latencies in ms)')
+
+
+if __name__ == '__main__':
+    main()
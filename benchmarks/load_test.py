@@ -0,0 +1,178 @@
+"""
+HTTP load test
+--------------
+Hammers a running backend with N concurrent clients per route and
+reports requests/second and p50 / p99 latency. Run it against the
+server before and after a change to compare.
+
+Routes exercised:
+  login   POST /auth/login          (a throwaway account is created first)
+  me      GET  /auth/me             (with that account's JWT)
+  face    POST /face/authenticate   (only with --image; any photo works —
+                                     a 401 "not recognised" still counts)
+  plus any extra GET paths given with --get, e.g. --get /sensors /health
+
+Usage:
+  python app.py &                       # or any serving mode
+  python benchmarks/load_test.py [--url http://localhost:5000] [--clients 16] [--duration 10]
+                                 [--processes 4]
+"""
+
+import json
+import time
+import uuid
+import argparse
+import threading
+import multiprocessing
+import urllib.error
+import urllib.request
+
+import numpy as np
+
+
+def call(url: str, method: str = 'GET', body: bytes | None = None,
+         headers: dict | None = None) -> tuple[int, bytes]:
+    req = urllib.request.Request(url, data=body, method=method, headers=headers or {})
+    try:
+        with urllib.request.urlopen(req, timeout=30) as resp:
+            return resp.status, resp.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+
+
+def multipart(field: str, filename: str, data: bytes) -> tuple[bytes, str]:
+    boundary = uuid.uuid4().hex
+    body = (
+        f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+        f'Content-Type: application/octet-stream\r\n\r\n'
+    ).encode() + data + f'\r\n--{boundary}--\r\n'.encode()
+    return body, f'multipart/form-data; boundary={boundary}'
+
+
+def drive(request, clients: int, duration: float) -> tuple[list, dict, float]:
+    """Call request() from `clients` threads for duration seconds → (latencies, statuses, elapsed)."""
+    latencies, statuses = [], {}
+    lock = threading.Lock()
+    stop = time.perf_counter() + duration
+
+    def worker():
+        local, local_status = [], {}
+        while time.perf_counter() < stop:
+            start = time.perf_counter()
+            try:
+                status = request()
+            except OSError:
+                status = 'error'
+            local.append(time.perf_counter() - start)
+            local_status[status] = local_status.get(status, 0) + 1
+        with lock:
+            latencies.extend(local)
+            for k, v in local_status.items():
+                statuses[k] = statuses.get(k, 0) + v
+
+    threads = [threading.Thread(target=worker) for _ in range(clients)]
+    begin = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, statuses, time.perf_counter() - begin
+
+
+def _drive_child(request, clients: int, duration: float, conn) -> None:
+    latencies, statuses, elapsed = drive(request, clients, duration)
+    conn.send((latencies, {str(k): v for k, v in statuses.items()}, elapsed))
+    conn.close()
+
+
+def run_route(name: str, request, clients: int, duration: float, processes: int = 1) -> dict:
+    """
+    Load one route. With processes > 1 the clients are split over forked
+    processes, so a fast server isn't measured against one client GIL.
+    """
+    if processes <= 1:
+        latencies, statuses, elapsed = drive(request, clients, duration)
+    else:
+        ctx = multiprocessing.get_context('fork')   # request is usually a closure
+        children = []
+        for n in range(processes):
+            parent_conn, child_conn = ctx.Pipe(duplex=False)
+            share = clients // processes + (n < clients % processes)
+            proc = ctx.Process(target=_drive_child, args=(request, max(share, 1), duration, child_conn))
+            proc.start()
+            children.append((proc, parent_conn))
+        latencies, statuses, elapsed = [], {}, 0.0
+        for proc, conn in children:
+            child_latencies, child_statuses, child_elapsed = conn.recv()
+            proc.join()
+            latencies.extend(child_latencies)
+            for k, v in child_statuses.items():
+                statuses[k] = statuses.get(k, 0) + v
+            elapsed = max(elapsed, child_elapsed)
+
+    ms = np.array(latencies) * 1000.0
+    return {
+        'route':    name,
+        'requests': len(latencies),
+        'rps':      round(len(latencies) / elapsed, 1),
+        'p50_ms':   round(float(np.percentile(ms, 50)), 2) if len(ms) else None,
+        'p99_ms':   round(float(np.percentile(ms, 99)), 2) if len(ms) else None,
+        'statuses': {str(k): v for k, v in statuses.items()},
+    }
+
+
+def make_routes(base: str, image: str | None = None, gets=()) -> list:
+    """(name, request) pairs for the default routes, with a throwaway account."""
+    username = f'load-{uuid.uuid4().hex[:8]}'
+    password = 'load-test-password'
+    account  = json.dumps({'username': username, 'email': f'{username}@example.com',
+                           'password': password}).encode()
+    status, body = call(f'{base}/auth/signup', 'POST', account, {'Content-Type': 'application/json'})
+    if status != 201:
+        raise SystemExit(f'Could not create test account ({status}): {body[:200]!r}')
+    token = json.loads(body)['token']
+
+    login_body = json.dumps({'username': username, 'password': password}).encode()
+    routes = [
+        ('POST /auth/login', lambda: call(f'{base}/auth/login', 'POST', login_body,
+                                          {'Content-Type': 'application/json'})[0]),
+        ('GET /auth/me',     lambda: call(f'{base}/auth/me', headers={'Authorization': f'Bearer {token}'})[0]),
+    ]
+    if image:
+        with open(image, 'rb') as f:
+            face_body, face_type = multipart('image', 'frame.jpg', f.read())
+        routes.append(('POST /face/authenticate',
+                       lambda: call(f'{base}/face/authenticate', 'POST', face_body,
+                                    {'Content-Type': face_type})[0]))
+    for path in gets:
+        routes.append((f'GET {path}', lambda path=path: call(f'{base}{path}')[0]))
+    return routes
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per route')
+    parser.add_argument('--processes', type=int, default=1,
+                        help='client processes to split --clients over (POSIX; for multi-worker servers)')
+    parser.add_argument('--image', help='photo to POST to /face/authenticate')
+    parser.add_argument('--get', nargs='*', default=[], help='extra GET paths to load')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+    base = args.url.rstrip('/')
+
+    routes = make_routes(base, args.image, args.get)
+    results = [run_route(name, fn, args.clients, args.duration, args.processes) for name, fn in routes]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f'{args.clients} clients, {args.duration:g} s per route against {base}')
+    print(f'{"route":<26} {"requests":>8} {"req/s":>8} {"p50 ms":>8} {"p99 ms":>8}  statuses')
+    for r in results:
+        print(f'{r["route"]:<26} {r["requests"]:>8} {r["rps"]:>8} {r["p50_ms"]:>8} {r["p99_ms"]:>8}  {r["statuses"]}')
+
+
+if __name__ == '__main__':
+    main()
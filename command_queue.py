@@ -0,0 +1,238 @@
+"""
+Device command queue
+--------------------
+/device/toggle no longer writes to the serial port inside the request.
+It submits a command here and returns its id straight away; a single
+dispatcher thread does the writing, through one queue per ESP link.
+
+Per link, per device there is at most one queued and one in-flight
+command:
+  coalescing — a command waits COALESCE_S before it is written; a newer
+               command for the same device supersedes it (FAN:ON then
+               FAN:OFF sends only FAN:OFF, or nothing if the fan is
+               already off).
+  ack        — the ESP reports its device states in every JSON packet;
+               a sent command is acknowledged by the first packet that
+               shows the requested state.
+  retry      — without an ack within ack_timeout the command is written
+               again, up to max_attempts, and then marked failed.
+
+Command states: queued → sent → acked | failed, or superseded.
+"""
+
+import time
+import uuid
+import datetime
+import threading
+import collections
+
+COALESCE_S = 0.15
+KEEP_DONE  = 1000   # finished commands kept for status lookups
+
+DONE = frozenset({'acked', 'failed', 'superseded'})
+
+
+class Command:
+    __slots__ = ('id', 'controller_id', 'device', 'target', 'state', 'attempts',
+                 'error', 'created_at', 'updated_at', 'due', 'reported')
+
+    def __init__(self, controller_id: str, device: str, target: str, reported: str | None):
+        self.id            = uuid.uuid4().hex
+        self.controller_id = controller_id
+        self.device        = device
+        self.target        = target      # 'on' | 'off'
+        self.state         = 'queued'
+        self.attempts      = 0
+        self.error         = None
+        self.created_at    = time.time()
+        self.updated_at    = self.created_at
+        self.due           = 0.0         # monotonic: next write (queued) or ack deadline (sent)
+        self.reported      = reported    # device state last reported by the ESP
+
+    @property
+    def message(self) -> str:
+        return f'{self.device.upper()}:{self.target.upper()}'   # e.g. "FAN:ON"
+
+    def to_dict(self) -> dict:
+        return {
+            'id':        self.id,
+            'deviceId':  f'{self.controller_id}/{self.device}',
+            'target':    self.target,
+            'state':     self.state,
+            'attempts':  self.attempts,
+            'error':     self.error,
+            'createdAt': datetime.datetime.utcfromtimestamp(self.created_at).isoformat(),
+            'updatedAt': datetime.datetime.utcfromtimestamp(self.updated_at).isoformat(),
+        }
+
+
+class _Link:
+    """Outstanding commands for one ESP controller."""
+
+    def __init__(self):
+        self.queued   = {}   # device → Command waiting for its write
+        self.inflight = {}   # device → Command written, waiting for the ack
+
+
+class CommandQueue:
+    def __init__(self, send, ack_timeout: float = 5.0, max_attempts: int = 3,
+                 coalesce: float = COALESCE_S, on_done=None):
+        """
+        send:     callable(controller_id, message) -> bool, does the actual write
+        on_done:  optional callable(command) when a command is acked or failed
+        """
+        self._send        = send
+        self.ack_timeout  = ack_timeout
+        self.max_attempts = max_attempts
+        self.coalesce     = coalesce
+        self._on_done     = on_done
+        self._cond        = threading.Condition()
+        self._links       = collections.defaultdict(_Link)
+        self._commands    = collections.OrderedDict()   # id → Command, oldest first
+        self._done        = []                          # finished, on_done not yet called
+        self._thread      = None
+
+    # ------------------------------------------------------------------
+    # Producer side (request threads)
+    # ------------------------------------------------------------------
+    def start(self) -> None:
+        if self._thread:
+            return
+        self._thread = threading.Thread(target=self._run, daemon=True, name='device-commands')
+        self._thread.start()
+
+    def submit(self, controller_id: str, device: str, target: str, reported: str | None) -> Command:
+        """Queue a device command. reported: the device's current state per the ESP."""
+        command = Command(controller_id, device, target, reported)
+        with self._cond:
+            link = self._links[controller_id]
+            older = link.queued.pop(device, None)
+            if older:
+                command.reported = older.reported
+                self._finish(older, 'superseded')
+
+            inflight = link.inflight.get(device)
+            if inflight is None and target == command.reported:
+                # Coalesced to a no-op (e.g. ON then OFF while off) — nothing to write
+                self._finish(command, 'acked')
+            else:
+                command.due = time.monotonic() + self.coalesce
+                link.queued[device] = command
+            self._remember(command)
+            self._cond.notify()
+        self._notify_done()
+        return command
+
+    def get(self, command_id: str) -> Command | None:
+        with self._cond:
+            return self._commands.get(command_id)
+
+    def pending_devices(self, controller_id: str) -> set:
+        """Devices with a queued or unacknowledged command on this link."""
+        with self._cond:
+            link = self._links.get(controller_id)
+            return set(link.queued) | set(link.inflight) if link else set()
+
+    # ------------------------------------------------------------------
+    # Acks (device hub thread)
+    # ------------------------------------------------------------------
+    def on_state(self, controller_id: str, devices: dict) -> None:
+        """Feed device states from a JSON packet; acknowledges matching commands."""
+        with self._cond:
+            link = self._links.get(controller_id)
+            if not link:
+                return
+            for device, state in devices.items():
+                if device in link.queued:
+                    link.queued[device].reported = state
+                command = link.inflight.get(device)
+                if command is None:
+                    continue
+                command.reported = state
+                if state == command.target:
+                    del link.inflight[device]
+                    self._finish(command, 'acked')
+            self._cond.notify()
+        self._notify_done()
+
+    # ------------------------------------------------------------------
+    # Dispatcher thread
+    # ------------------------------------------------------------------
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                writes, wait = self._collect_due()
+                if not writes and not self._done:
+                    self._cond.wait(wait)
+                    continue
+            self._notify_done()
+            # Serial writes happen outside the lock so acks and submits never wait on them
+            for command in writes:
+                if not self._send(command.controller_id, command.message):
+                    with self._cond:
+                        command.error = 'ESP not connected'
+
+    def _collect_due(self) -> tuple[list, float | None]:
+        """Move due commands along; return (commands to write now, seconds until the next deadline)."""
+        now, writes, next_due = time.monotonic(), [], None
+        for link in self._links.values():
+            for device, command in list(link.inflight.items()):
+                if command.due > now:
+                    next_due = min(next_due or command.due, command.due)
+                elif command.attempts >= self.max_attempts:
+                    del link.inflight[device]
+                    command.error = command.error or 'No acknowledgement from ESP'
+                    self._finish(command, 'failed')
+                elif device not in link.queued:
+                    self._mark_sent(command, now)
+                    writes.append(command)
+                    next_due = min(next_due or command.due, command.due)
+                else:
+                    # A newer command is about to replace this one
+                    del link.inflight[device]
+                    self._finish(command, 'superseded')
+
+            for device, command in list(link.queued.items()):
+                if command.due > now:
+                    next_due = min(next_due or command.due, command.due)
+                    continue
+                del link.queued[device]
+                older = link.inflight.pop(device, None)
+                if older:
+                    self._finish(older, 'superseded')
+                link.inflight[device] = command
+                self._mark_sent(command, now)
+                writes.append(command)
+                next_due = min(next_due or command.due, command.due)
+        return writes, (None if next_due is None else max(next_due - now, 0.0))
+
+    def _mark_sent(self, command: Command, now: float) -> None:
+        command.state       = 'sent'
+        command.attempts   += 1
+        command.error       = None
+        command.due         = now + self.ack_timeout
+        command.updated_at  = time.time()
+
+    def _finish(self, command: Command, state: str) -> None:
+        # Caller holds the lock; on_done runs later, without it
+        command.state      = state
+        command.updated_at = time.time()
+        if state != 'superseded' and self._on_done:
+            self._done.append(command)
+
+    def _notify_done(self) -> None:
+        with self._cond:
+            done, self._done = self._done, []
+        for command in done:
+            try:
+                self._on_done(command)
+            except Exception as e:
+                print(f'[commands] on_done error: {e}')
+
+    def _remember(self, command: Command) -> None:
+        self._commands[command.id] = command
+        while len(self._commands) > KEEP_DONE:
+            oldest = next(iter(self._commands.values()))
+            if oldest.state not in DONE:
+                break
+            self._commands.popitem(last=False)
@@ -0,0 +1,96 @@
+"""
+SQLite connection pool
+----------------------
+The dev server handles every request on a fresh thread, so thread-local
+connections would still mean one connect() per request. Instead a fixed
+set of long-lived connections is shared: a request borrows one for the
+duration of a `with` block and hands it back.
+
+Long-lived connections also mean the sqlite3 statement cache actually
+gets reused, and the per-connection pragmas below are only paid once.
+
+Usage (drop-in for the old `with sqlite3.connect(...) as conn:`):
+
+    with pool.connection() as conn:
+        conn.execute(...)
+        conn.commit()        # optional — the block commits on success
+"""
+
+import queue
+import sqlite3
+import threading
+import contextlib
+
+import metrics
+
+# Applied to every new connection. journal_mode=WAL is persistent in the
+# database file; the rest are per connection.
+PRAGMAS = (
+    'PRAGMA journal_mode = WAL',        # readers no longer block the writer
+    'PRAGMA synchronous = NORMAL',      # safe with WAL, far fewer fsyncs
+    'PRAGMA cache_size = -16000',       # 16 MB page cache per connection
+    'PRAGMA mmap_size = 268435456',     # map up to 256 MB of the file
+    'PRAGMA temp_store = MEMORY',
+)
+
+metrics.histogram('db_seconds', 'Waiting for a pooled SQLite connection (wait) and holding it (transaction)')
+
+
+class ConnectionPool:
+    def __init__(self, path: str, size: int = 8, busy_timeout: float = 5.0,
+                 cached_statements: int = 256):
+        self.path              = path
+        self.size              = size
+        self.busy_timeout      = busy_timeout
+        self.cached_statements = cached_statements
+        self._idle    = queue.LifoQueue()   # LIFO keeps the hottest caches in use
+        self._created = 0
+        self._lock    = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.busy_timeout,
+            cached_statements=self.cached_statements,
+            # A connection is only ever used by one thread at a time,
+            # but not always the thread that created it.
+            check_same_thread=False,
+        )
+        conn.row_factory = sqlite3.Row
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                try:
+                    return self._connect()
+                except Exception:
+                    self._created -= 1
+                    raise
+        return self._idle.get()
+
+    @contextlib.contextmanager
+    def connection(self):
+        with metrics.timer('db_seconds', op='wait'):
+            conn = self._acquire()
+        try:
+            with metrics.timer('db_seconds', op='transaction'), conn:   # commit on success, roll back on error
+                yield conn
+        finally:
+            self._idle.put(conn)
+
+    def close(self) -> None:
+        with self._lock:
+            while True:
+                try:
+                    self._idle.get_nowait().close()
+                except queue.Empty:
+                    break
+            self._created = 0
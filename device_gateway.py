@@ -0,0 +1,309 @@
+"""
+Device gateway IPC
+------------------
+In production mode (python app.py serve --workers N) one process — the
+device gateway — owns the serial links, the device state, the command
+queue and the sensor history, and the web workers reach it over a Unix
+socket. The workers hold no device state of their own, so any number of
+them can run side by side.
+
+Protocol: one JSON object per line in each direction.
+
+    → {"op": "state", "args": {"group": "sensors", "known": 41}}
+    ← {"result": {"version": 41}}
+    ← {"error": "Unknown controller", "status": 404}
+
+A connection that sends {"op": "subscribe"} instead becomes a one-way
+stream of the events passed to GatewayServer.publish(). Web workers use
+it to tell each other about changes to their in-memory caches (face
+gallery, profiles, revoked tokens). publish() only queues: each
+subscriber has its own sender thread, and one that falls SUBSCRIBER_QUEUE
+events behind (a stalled worker) is disconnected, to resync when it
+reconnects, instead of blocking the publisher.
+"""
+
+import os
+import json
+import time
+import socket
+import threading
+import collections
+
+CONNECT_TIMEOUT_S = 2
+RETRY_S           = 1      # between subscription reconnects
+MAX_IDLE          = 32     # idle client connections kept per process
+SUBSCRIBER_QUEUE  = 1024   # events queued for one subscriber before it is dropped
+
+
+class GatewayError(Exception):
+    """An operation was rejected; status is the HTTP status to answer with."""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+class GatewayUnavailable(GatewayError):
+    def __init__(self, message: str = 'Device gateway unavailable'):
+        super().__init__(message, 503)
+
+
+def _encode(obj) -> bytes:
+    return json.dumps(obj, separators=(',', ':')).encode('utf-8') + b'\n'
+
+
+# ---------------------------------------------------------------------------
+# Server (runs in the gateway process)
+# ---------------------------------------------------------------------------
+class _Subscriber:
+    """One subscribed connection: a bounded queue of frames and the thread that sends them."""
+
+    def __init__(self, conn: socket.socket):
+        self.conn    = conn
+        self._frames = collections.deque()
+        self._cond   = threading.Condition()
+        self._closed = False
+        threading.Thread(target=self._send, daemon=True, name='gateway-publish').start()
+
+    def offer(self, frame: bytes) -> bool:
+        """Queue frame without blocking; False if the subscriber is too far behind (or gone)."""
+        with self._cond:
+            if self._closed or len(self._frames) >= SUBSCRIBER_QUEUE:
+                return False
+            self._frames.append(frame)
+            self._cond.notify()
+            return True
+
+    def close(self) -> None:
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._frames.clear()
+            self._cond.notify()
+        try:
+            self.conn.shutdown(socket.SHUT_RDWR)   # unblocks a stuck sendall and the reading thread
+        except OSError:
+            pass
+
+    def _send(self) -> None:
+        while True:
+            with self._cond:
+                while not self._frames and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                frame = self._frames.popleft()
+            try:
+                self.conn.sendall(frame)
+            except OSError:
+                self.close()
+                return
+
+
+class GatewayServer:
+    def __init__(self, path: str, handle):
+        """handle(op, args) → JSON-serializable result; may raise GatewayError."""
+        self.path    = path
+        self.handle  = handle
+        self._sock   = None
+        self._subscribers = set()
+        self._lock   = threading.Lock()
+
+    def start(self) -> None:
+        """Listen on the socket and accept connections on a daemon thread."""
+        if os.path.exists(self.path):
+            os.unlink(self.path)   # left over from a previous run
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.bind(self.path)
+        self._sock.listen(128)
+        threading.Thread(target=self._accept, daemon=True, name='gateway-accept').start()
+        print(f'[gateway] Listening on {self.path}')
+
+    def close(self) -> None:
+        if self._sock:
+            self._sock.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def publish(self, event: dict) -> None:
+        """Queue event for every subscriber. Never blocks: one too far behind is dropped."""
+        frame = _encode(event)
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            if not subscriber.offer(frame):
+                print(f'[gateway] Subscriber {SUBSCRIBER_QUEUE} events behind — disconnected, it will resync')
+                with self._lock:
+                    self._subscribers.discard(subscriber)
+                subscriber.close()
+
+    def _accept(self) -> None:
+        while True:
+            try:
+                conn, _addr = self._sock.accept()
+            except OSError:
+                return   # closed
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn: socket.socket) -> None:
+        reader     = conn.makefile('rb')
+        subscriber = None
+        try:
+            for line in reader:
+                if subscriber:
+                    continue   # a subscription only carries events; its sender thread owns the socket
+                try:
+                    message = json.loads(line)
+                    op = message['op']
+                except (ValueError, KeyError, TypeError):
+                    conn.sendall(_encode({'error': 'Malformed request', 'status': 400}))
+                    continue
+                if op == 'subscribe':
+                    # Acknowledged first, so no event can be taken for the reply
+                    conn.sendall(_encode({'result': 'subscribed'}))
+                    subscriber = _Subscriber(conn)
+                    with self._lock:
+                        self._subscribers.add(subscriber)
+                    continue
+                try:
+                    reply = {'result': self.handle(op, message.get('args') or {})}
+                except GatewayError as e:
+                    reply = {'error': str(e), 'status': e.status}
+                except Exception as e:
+                    print(f'[gateway] {op} failed: {e}')
+                    reply = {'error': 'Internal gateway error', 'status': 500}
+                conn.sendall(_encode(reply))
+        except OSError:
+            pass
+        finally:
+            if subscriber:
+                with self._lock:
+                    self._subscribers.discard(subscriber)
+                subscriber.close()
+            reader.close()
+            conn.close()
+
+
+# ---------------------------------------------------------------------------
+# Client (used by the web workers)
+# ---------------------------------------------------------------------------
+class _NotDelivered(ConnectionError):
+    """The connection failed before the gateway could have acted on the request."""
+
+
+class _Connection:
+    def __init__(self, path: str, timeout: float):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(CONNECT_TIMEOUT_S)
+        self.sock.connect(path)
+        self.sock.settimeout(timeout)
+        self.reader = self.sock.makefile('rb')
+
+    def request(self, frame: bytes) -> dict:
+        """Raises _NotDelivered when resending frame is safe, OSError / ValueError when not."""
+        try:
+            self.sock.sendall(frame)
+        except (BrokenPipeError, ConnectionResetError) as e:
+            raise _NotDelivered(str(e)) from None
+        line = self.reader.readline()
+        if not line:
+            raise _NotDelivered('gateway closed the connection')
+        if not line.endswith(b'\n'):
+            raise ConnectionResetError('gateway closed the connection mid-reply')
+        return json.loads(line)
+
+    def close(self) -> None:
+        self.reader.close()
+        self.sock.close()
+
+
+class GatewayClient:
+    """
+    Pooled connections to the gateway. A request thread borrows one for a
+    single call, so the dev server's thread-per-request model doesn't
+    cost a connect() per request.
+    """
+
+    def __init__(self, path: str, timeout: float = 10.0):
+        self.path    = path
+        self.timeout = timeout
+        self._idle   = []
+        self._lock   = threading.Lock()
+
+    def call(self, op: str, **args):
+        frame = _encode({'op': op, 'args': args})
+        # A pooled connection may have died with a restarted gateway: one retry on a fresh
+        # one, but only if the request can't have run — toggle, grant or audit mustn't run twice
+        for attempt in range(2):
+            conn = self._borrow(fresh=attempt > 0)
+            try:
+                reply = conn.request(frame)
+            except _NotDelivered:
+                conn.close()
+                continue
+            except (OSError, ValueError):   # timed out or cut off after the request was sent
+                conn.close()
+                raise GatewayUnavailable() from None
+            self._return(conn)
+            if 'error' in reply:
+                raise GatewayError(reply['error'], reply.get('status', 500))
+            return reply['result']
+        raise GatewayUnavailable()
+
+    def _borrow(self, fresh: bool = False) -> _Connection:
+        if not fresh:
+            with self._lock:
+                if self._idle:
+                    return self._idle.pop()
+        try:
+            return _Connection(self.path, self.timeout)
+        except OSError:
+            raise GatewayUnavailable() from None
+
+    def _return(self, conn: _Connection) -> None:
+        with self._lock:
+            if len(self._idle) < MAX_IDLE:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def subscribe(self, callback) -> None:
+        """
+        Call callback(event) for every published event, on a daemon thread.
+        If the gateway can't be reached straight away, or the link drops,
+        events may be missed: callback({"kind": "resync"}) is called once
+        the subscription is (re)established.
+        """
+        try:
+            conn = self._subscription()
+        except (OSError, ValueError):
+            conn = None
+        threading.Thread(target=self._listen, args=(callback, conn), daemon=True,
+                         name='gateway-events').start()
+
+    def _subscription(self) -> _Connection:
+        conn = _Connection(self.path, timeout=None)
+        conn.request(_encode({'op': 'subscribe'}))
+        return conn
+
+    def _listen(self, callback, conn: _Connection | None) -> None:
+        while True:
+            if conn is None:
+                try:
+                    conn = self._subscription()
+                except (OSError, ValueError):
+                    time.sleep(RETRY_S)
+                    continue
+                callback({'kind': 'resync'})
+            try:
+                for line in conn.reader:
+                    try:
+                        callback(json.loads(line))
+                    except Exception as e:
+                        print(f'[gateway] Event handler error: {e}')
+            except OSError:
+                pass
+            conn.close()
+            conn = None
+            time.sleep(RETRY_S)
@@ -0,0 +1,289 @@
+"""
+Device hub
+----------
+Registry of ESP controllers (one per room), each with its own serial
+port, line buffer and reconnect schedule.
+
+All controllers are served by ONE thread: ports are opened non-blocking
+and multiplexed with a selector, so dozens of controllers cost one
+thread instead of one blocked reader each. Where serial ports cannot be
+selected on (Windows), the same thread polls in_waiting instead.
+
+Each wake-up drains every byte available on every ready port and hands
+the complete lines over as one batch, so a burst costs one callback
+(and one state-lock acquisition in the app), not one per line.
+
+Controllers are read from a JSON file:
+
+    [
+      {"id": "living",  "name": "Living room", "port": "COM3"},
+      {"id": "bedroom", "name": "Bedroom",     "port": "COM4",
+       "devices": {"fan": "Fan", "lights": "Lights", "ac": "Air Conditioner"}}
+    ]
+
+Without that file there is a single controller, "main", on the default port.
+Devices are addressed as "<controller>/<device>", e.g. "living/fan".
+"""
+
+import os
+import json
+import time
+import selectors
+import threading
+
+import serial
+import serial.tools.list_ports
+
+import metrics
+
+RECONNECT_S = 3
+POLL_S      = 0.02    # poll period when ports can't be selected on
+MAX_LINE    = 4096    # a longer unterminated line is noise, not a packet
+
+DEFAULT_CONTROLLER = 'main'
+DEFAULT_DEVICES    = {'fan': 'Fan', 'lights': 'Lights'}
+
+# pyserial ports expose a selectable fd only on POSIX
+SELECTABLE = os.name == 'posix'
+
+metrics.histogram('serial_seconds', 'Serial port reads and writes per call, and handling of each batch of lines')
+metrics.counter('serial_bytes_total', 'Bytes read from (rx) and written to (tx) the ESP controllers')
+
+
+class Controller:
+    def __init__(self, id: str, port: str, name: str | None = None,
+                 baudrate: int = 115200, devices: dict | None = None):
+        self.id       = id
+        self.port     = port
+        self.name     = name or id
+        self.baudrate = baudrate
+        self.devices  = dict(devices or DEFAULT_DEVICES)   # device id → display name
+        self.conn: serial.Serial | None = None
+        self._buffer     = bytearray()
+        self._retry_at   = 0.0
+        self._write_lock = threading.Lock()
+
+    @property
+    def connected(self) -> bool:
+        return self.conn is not None
+
+    def open(self) -> bool:
+        try:
+            # timeout=0 → reads never block; the hub thread waits in select()
+            self.conn = serial.Serial(self.port, self.baudrate, timeout=0)
+        except serial.SerialException as e:
+            ports = [p.device for p in serial.tools.list_ports.comports()]
+            print(f'[hub] {self.id}: cannot open {self.port}: {e}')
+            print(f'[hub] Available ports: {ports}')
+            self._retry_at = time.monotonic() + RECONNECT_S
+            return False
+        self._buffer.clear()
+        print(f'[hub] {self.id}: connected on {self.port}')
+        return True
+
+    def close(self) -> None:
+        conn, self.conn = self.conn, None
+        self._retry_at  = time.monotonic() + RECONNECT_S
+        if conn:
+            try:
+                conn.close()
+            except (serial.SerialException, OSError):
+                pass
+
+    def write(self, message: str) -> bool:
+        """Write a newline-terminated command. Safe from any thread."""
+        conn = self.conn
+        if conn is None:
+            print(f'[hub] {self.id}: not connected — could not send: {message}')
+            return False
+        data = f'{message}\n'.encode('utf-8')
+        try:
+            with self._write_lock, metrics.timer('serial_seconds', op='write'):
+                conn.write(data)
+                conn.flush()
+        except (serial.SerialException, OSError) as e:
+            # The reader notices the dead port and schedules the reconnect
+            print(f'[hub] {self.id}: write error: {e}')
+            return False
+        metrics.inc('serial_bytes_total', len(data), direction='tx')
+        print(f'[hub] {self.id} >> {message}')
+        return True
+
+    def feed(self, data: bytes) -> list[str]:
+        """Buffer raw bytes and return the complete, non-empty lines."""
+        self._buffer += data
+        end = self._buffer.rfind(b'\n')
+        if end < 0:
+            if len(self._buffer) > MAX_LINE:
+                self._buffer.clear()
+            return []
+        # One decode for every complete line in the chunk
+        text = self._buffer[:end].decode('utf-8', errors='ignore')
+        del self._buffer[:end + 1]
+        return [line for line in map(str.strip, text.split('\n')) if line]
+
+
+def load_controllers(path: str, default_port: str, baudrate: int = 115200) -> list[Controller]:
+    """Controllers from the JSON file at path, or the single default controller."""
+    if not os.path.exists(path):
+        return [Controller(DEFAULT_CONTROLLER, default_port, baudrate=baudrate)]
+    with open(path, encoding='utf-8') as f:
+        entries = json.load(f)
+
+    controllers, seen = [], set()
+    for entry in entries:
+        controller_id = str(entry['id']).lower().strip()
+        if not controller_id or '/' in controller_id or controller_id in seen:
+            raise ValueError(f'{path}: invalid or duplicate controller id "{entry["id"]}"')
+        seen.add(controller_id)
+        controllers.append(Controller(
+            controller_id,
+            entry['port'],
+            name=entry.get('name'),
+            baudrate=int(entry.get('baudrate', baudrate)),
+            devices={str(k).lower(): v for k, v in entry['devices'].items()} if 'devices' in entry else None,
+        ))
+    if not controllers:
+        raise ValueError(f'{path}: no controllers defined')
+    return controllers
+
+
+class DeviceHub:
+    def __init__(self, controllers: list[Controller]):
+        self.controllers    = {c.id: c for c in controllers}   # config order
+        self._on_batch      = None
+        self._on_connection = None
+        self._selector      = selectors.DefaultSelector() if SELECTABLE else None
+        self._thread        = None
+
+    # ------------------------------------------------------------------
+    # Registry
+    # ------------------------------------------------------------------
+    @property
+    def default(self) -> Controller:
+        return next(iter(self.controllers.values()))
+
+    def get(self, controller_id: str | None) -> Controller | None:
+        if controller_id is None:
+            return self.default
+        return self.controllers.get(controller_id)
+
+    def resolve(self, device_id: str) -> tuple[Controller, str] | None:
+        """
+        "living/fan" → (living controller, "fan"). A bare "fan" refers to the
+        default controller, so single-ESP clients keep working.
+        """
+        controller_id, _, device = device_id.rpartition('/')
+        controller = self.get(controller_id or None)
+        if controller is None or device not in controller.devices:
+            return None
+        return controller, device
+
+    def send(self, controller_id: str | None, message: str) -> bool:
+        controller = self.get(controller_id)
+        return controller.write(message) if controller else False
+
+    # ------------------------------------------------------------------
+    # Reader thread
+    # ------------------------------------------------------------------
+    def start(self, on_batch, on_connection=None) -> None:
+        """
+        Start the reader thread. on_batch([(controller, [line, ...]), ...])
+        is called on it once per wake-up with the complete lines received
+        from each ready controller, oldest first. It must not block.
+        on_connection(controller, connected, error) is called on the same
+        thread when a port is opened or dropped.
+        """
+        if self._thread:
+            return
+        self._on_batch      = on_batch
+        self._on_connection = on_connection
+        self._thread        = threading.Thread(target=self._run, daemon=True, name='device-hub')
+        self._thread.start()
+
+    def _run(self) -> None:
+        mode = 'selector' if self._selector else 'polling'
+        print(f'[hub] Serving {len(self.controllers)} controller(s) on one thread ({mode})')
+        while True:
+            try:
+                self._reconnect_due()
+                if self._selector:
+                    self._select_once()
+                else:
+                    self._poll_once()
+            except Exception as e:
+                print(f'[hub] Unexpected error: {e}')
+                time.sleep(1)
+
+    def _reconnect_due(self) -> None:
+        now = time.monotonic()
+        for controller in self.controllers.values():
+            if controller.conn is None and now >= controller._retry_at and controller.open():
+                if self._selector:
+                    self._selector.register(controller.conn, selectors.EVENT_READ, controller)
+                self._connection(controller, True, None)
+
+    def _select_once(self) -> None:
+        if not self._selector.get_map():
+            time.sleep(1)   # nothing connected yet
+            return
+        batch = []
+        for key, _events in self._selector.select(timeout=1):
+            self._read(key.data, batch)
+        self._dispatch(batch)
+
+    def _poll_once(self) -> None:
+        batch, busy = [], False
+        for controller in self.controllers.values():
+            if controller.conn is None:
+                continue
+            try:
+                waiting = controller.conn.in_waiting
+            except (serial.SerialException, OSError) as e:
+                self._drop(controller, e)
+                continue
+            if waiting:
+                busy = True
+                self._read(controller, batch)
+        self._dispatch(batch)
+        if not busy:
+            time.sleep(POLL_S)
+
+    def _read(self, controller: Controller, batch: list) -> None:
+        try:
+            with metrics.timer('serial_seconds', op='read'):
+                data = controller.conn.read(controller.conn.in_waiting or 1)
+        except (serial.SerialException, OSError) as e:
+            self._drop(controller, e)
+            return
+        metrics.inc('serial_bytes_total', len(data), direction='rx')
+        lines = controller.feed(data)
+        if lines:
+            batch.append((controller, lines))
+
+    def _dispatch(self, batch: list) -> None:
+        if not batch:
+            return
+        try:
+            with metrics.timer('serial_seconds', op='handle'):
+                self._on_batch(batch)
+        except Exception as e:
+            print(f'[hub] Error handling packets: {e}')
+
+    def _drop(self, controller: Controller, error: Exception) -> None:
+        print(f'[hub] {controller.id}: serial error: {error} — reconnecting in {RECONNECT_S} s')
+        if self._selector and controller.conn is not None:
+            try:
+                self._selector.unregister(controller.conn)
+            except (KeyError, ValueError):
+                pass
+        controller.close()
+        self._connection(controller, False, str(error))
+
+    def _connection(self, controller: Controller, connected: bool, error: str | None) -> None:
+        if self._on_connection is None:
+            return
+        try:
+            self._on_connection(controller, connected, error)
+        except Exception as e:
+            print(f'[hub] Error handling connection change: {e}')
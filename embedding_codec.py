@@ -0,0 +1,107 @@
+"""
+Face embedding storage format
+-----------------------------
+Embeddings are stored in faces.embedding as
+
+  v1 (current)  4-byte header  b'EMB' + b'\\x01'
+                followed by 128 little-endian float32 values (512 bytes)
+
+  legacy        a full .npy file written by np.save (header + float64,
+                ~1.1 KB). Still readable so existing rows keep working
+                until they have been migrated.
+
+v1 blobs are read zero-copy with np.frombuffer — no header parsing on
+the authentication hot path.
+
+Migration (online — short batched transactions, safe while the server runs):
+  python embedding_codec.py [--db faces.db] [--batch-size 500] [--vacuum]
+"""
+
+import io
+import os
+import sqlite3
+import argparse
+
+import numpy as np
+
+MAGIC_V1   = b'EMB\x01'
+DTYPE_V1   = np.dtype('<f4')
+NPY_MAGIC  = b'\x93NUMPY'
+
+
+def embedding_to_blob(embedding: np.ndarray) -> bytes:
+    return MAGIC_V1 + np.asarray(embedding, dtype=DTYPE_V1).tobytes()
+
+
+def blob_to_embedding(blob: bytes) -> np.ndarray:
+    if blob[:4] == MAGIC_V1:
+        return np.frombuffer(blob, dtype=DTYPE_V1, offset=len(MAGIC_V1))
+    if blob[:6] == NPY_MAGIC:
+        return np.load(io.BytesIO(blob))
+    raise ValueError(f'Unknown embedding format (header {blob[:6]!r})')
+
+
+def is_legacy(blob: bytes) -> bool:
+    return blob[:4] != MAGIC_V1
+
+
+# ---------------------------------------------------------------------------
+# Migration
+# ---------------------------------------------------------------------------
+def migrate(db_path: str, batch_size: int = 500) -> tuple[int, int]:
+    """
+    Rewrite legacy rows in the faces table to the v1 format.
+    Each batch is its own transaction, so the write lock is only held
+    briefly and the server can keep serving while this runs.
+    Returns (rows_scanned, rows_converted).
+    """
+    conn = sqlite3.connect(db_path)
+    scanned = converted = 0
+    last_rowid = 0
+    try:
+        while True:
+            rows = conn.execute(
+                'SELECT rowid, embedding FROM faces WHERE rowid > ? ORDER BY rowid LIMIT ?',
+                (last_rowid, batch_size)
+            ).fetchall()
+            if not rows:
+                break
+            last_rowid = rows[-1][0]
+            scanned   += len(rows)
+
+            updates = [
+                (embedding_to_blob(blob_to_embedding(blob)), rowid)
+                for rowid, blob in rows if is_legacy(blob)
+            ]
+            if updates:
+                with conn:
+                    conn.executemany('UPDATE faces SET embedding = ? WHERE rowid = ?', updates)
+                converted += len(updates)
+            print(f'[migrate] {scanned} scanned, {converted} converted')
+    finally:
+        conn.close()
+    return scanned, converted
+
+
+def main() -> None:
+    default_db = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'faces.db')
+    parser = argparse.ArgumentParser(description='Convert face embeddings to the compact v1 format.')
+    parser.add_argument('--db', default=default_db)
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--vacuum', action='store_true',
+                        help='VACUUM afterwards to return the freed space to the OS')
+    args = parser.parse_args()
+
+    size_before = os.path.getsize(args.db)
+    scanned, converted = migrate(args.db, args.batch_size)
+    if args.vacuum:
+        conn = sqlite3.connect(args.db)
+        conn.execute('VACUUM')
+        conn.close()
+    size_after = os.path.getsize(args.db)
+    print(f'[migrate] Done: {converted}/{scanned} rows converted, '
+          f'{size_before / 1024:.1f} KB → {size_after / 1024:.1f} KB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Batch enrollment sources
+------------------------
+Yields (username, filename, image_bytes) from the layouts accepted by
+/face/register/batch and `python app.py enroll`:
+
+  <username>.jpg                     one image per user
+  <username>/<anything>.jpg          a folder per user
+
+either as a directory on disk or inside a .zip archive.
+
+A zip's central directory is checked against the limits below before any
+entry is decompressed, so a small archive that inflates to gigabytes (a
+zip bomb) is refused instead of read.
+"""
+
+import os
+import zipfile
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+MAX_ZIP_ENTRIES     = 10_000
+MAX_ZIP_IMAGE_BYTES = 20 * 1024 * 1024     # uncompressed, per image
+MAX_ZIP_TOTAL_BYTES = 1024 * 1024 * 1024   # uncompressed, all images together
+
+
+class ArchiveTooLarge(ValueError):
+    """The archive exceeds MAX_ZIP_ENTRIES, MAX_ZIP_IMAGE_BYTES or MAX_ZIP_TOTAL_BYTES."""
+
+
+def username_for(relative_path: str) -> str | None:
+    """Map a path inside the batch to the username it enrolls."""
+    parts = [p for p in relative_path.replace('\\', '/').split('/') if p]
+    if not parts or parts[0] == '__MACOSX' or parts[-1].startswith('.'):
+        return None
+    if not parts[-1].lower().endswith(IMAGE_EXTENSIONS):
+        return None
+    if len(parts) > 1:
+        return parts[-2].strip() or None
+    return os.path.splitext(parts[-1])[0].strip() or None
+
+
+def iter_directory(directory: str):
+    for root, _dirs, files in os.walk(directory):
+        for name in sorted(files):
+            path     = os.path.join(root, name)
+            username = username_for(os.path.relpath(path, directory))
+            if username:
+                with open(path, 'rb') as f:
+                    yield username, os.path.relpath(path, directory), f.read()
+
+
+def iter_zip(source):
+    """source: a path or a binary file object. Raises ArchiveTooLarge before reading any image."""
+    with zipfile.ZipFile(source) as archive:
+        infos = archive.infolist()
+        if len(infos) > MAX_ZIP_ENTRIES:
+            raise ArchiveTooLarge(f'Archive has {len(infos)} entries (max {MAX_ZIP_ENTRIES})')
+        images = [(info, username_for(info.filename)) for info in infos if not info.is_dir()]
+        images = [(info, username) for info, username in images if username]
+        for info, _username in images:
+            if info.file_size > MAX_ZIP_IMAGE_BYTES:
+                raise ArchiveTooLarge(f'{info.filename} is {info.file_size // (1024 * 1024)} MB '
+                                      f'uncompressed (max {MAX_ZIP_IMAGE_BYTES // (1024 * 1024)} MB)')
+        total = sum(info.file_size for info, _username in images)
+        if total > MAX_ZIP_TOTAL_BYTES:
+            raise ArchiveTooLarge(f'Archive is {total // (1024 * 1024)} MB uncompressed '
+                                  f'(max {MAX_ZIP_TOTAL_BYTES // (1024 * 1024)} MB)')
+        for info, username in images:
+            # zipfile stops inflating at the declared file_size (and fails its CRC check if there was more)
+            yield username, info.filename, archive.read(info)
+
+
+def iter_path(path: str):
+    if os.path.isdir(path):
+        return iter_directory(path)
+    if zipfile.is_zipfile(path):
+        return iter_zip(path)
+    raise ValueError(f'{path} is neither a directory nor a zip archive')
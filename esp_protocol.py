@@ -0,0 +1,82 @@
+"""
+ESP packet protocol
+-------------------
+Two packet encodings, one line each, which may be mixed on the same link:
+
+  JSON      {"temp":25.3,"hum":60.1,"motion":1,"fan":"on","lights":"off"}
+  compact   $25.3,60.1,1,1,0
+            temp, hum, motion, then one 0/1 per device in the order the
+            controller's devices are configured. An empty field means
+            "not reported" (e.g. "$,,1" is a motion-only packet).
+
+The compact form is about a third of the size and parses with a single
+split() instead of a JSON decode. Any other line is a debug print.
+"""
+
+import json
+
+COMPACT_PREFIX = '$'
+
+# JSON key → (state key, converter)
+_JSON_SENSORS = (
+    ('temp',   'temperature', lambda v: round(float(v), 1)),
+    ('hum',    'humidity',    lambda v: round(float(v), 1)),
+    ('motion', 'motion',      lambda v: bool(int(v))),
+)
+
+_SWITCH = {'1': 'on', '0': 'off'}
+
+
+def parse_packet(line: str, devices) -> tuple[dict, dict] | None:
+    """
+    Parse one line from an ESP into (sensor changes, device states), or
+    None when the line is not a packet. devices: the controller's device
+    ids in configured order. Raises ValueError on a malformed packet.
+    """
+    first = line[:1]
+    if first == COMPACT_PREFIX:
+        return _parse_compact(line, devices)
+    if first == '{':
+        return _parse_json(line, devices)
+    return None
+
+
+def _parse_json(line: str, devices) -> tuple[dict, dict]:
+    data = json.loads(line)
+    if not isinstance(data, dict):
+        raise ValueError('packet is not an object')
+    try:
+        sensors = {key: convert(data[field]) for field, key, convert in _JSON_SENSORS if field in data}
+    except TypeError as e:
+        raise ValueError(str(e)) from None
+    return sensors, {d: str(data[d]) for d in devices if d in data}
+
+
+def _parse_compact(line: str, devices) -> tuple[dict, dict]:
+    fields = line[1:].split(',')
+    sensors = {}
+    if len(fields) > 0 and fields[0]:
+        sensors['temperature'] = round(float(fields[0]), 1)
+    if len(fields) > 1 and fields[1]:
+        sensors['humidity'] = round(float(fields[1]), 1)
+    if len(fields) > 2 and fields[2]:
+        sensors['motion'] = fields[2] == '1'
+
+    states = {}
+    for device, value in zip(devices, fields[3:]):
+        if value:
+            if value not in _SWITCH:
+                raise ValueError(f'bad state "{value}" for {device}')
+            states[device] = _SWITCH[value]
+    return sensors, states
+
+
+def encode_compact(temperature, humidity, motion, states: dict) -> str:
+    """The compact packet for these readings; states in configured device order."""
+    fields = [
+        '' if temperature is None else f'{temperature:g}',
+        '' if humidity is None else f'{humidity:g}',
+        '1' if motion else '0',
+    ]
+    fields += ['1' if s == 'on' else '0' for s in states.values()]
+    return COMPACT_PREFIX + ','.join(fields)
@@ -0,0 +1,197 @@
+"""
+Simulated ESP controllers
+-------------------------
+Stand-ins for the real boards, so the device hub, command queue and the
+/sensors and /device/* routes can be exercised without hardware.
+
+Each simulator owns a pty pair (POSIX only): the backend opens the slave
+end like any serial port, the simulator drives the master end. It
+
+  - emits {"temp","hum","motion",<devices>} packets (or the compact
+    "$temp,hum,motion,..." form, see esp_protocol) every 1/rate seconds,
+    with a slow random walk on the readings;
+  - applies "<DEVICE>:ON|OFF" commands and immediately reports the new
+    state (which is what acknowledges a queued command);
+  - answers "GRANTED" with a debug line, like the door sketch does.
+
+Run a set of them and point the backend at the generated registry:
+
+    python esp_simulator.py --controllers 3 --config sim_controllers.json
+    ESP_CONTROLLERS=sim_controllers.json python app.py
+"""
+
+import os
+import sys
+import tty
+import json
+import time
+import random
+import select
+import argparse
+import threading
+
+from device_hub import DEFAULT_DEVICES
+from esp_protocol import encode_compact
+
+PROTOCOLS = ('json', 'compact')
+
+MOTION_P = 0.1   # chance that a packet flips the motion reading
+
+
+class SimulatedESP:
+    def __init__(self, controller_id: str = 'sim', rate: float = 0.5,
+                 devices: dict | None = None, seed: int | None = None, protocol: str = 'json'):
+        """rate: packets per second; 0 sends packets only in reply to commands."""
+        if os.name != 'posix':
+            raise RuntimeError('The ESP simulator needs a POSIX pty')
+        if protocol not in PROTOCOLS:
+            raise ValueError(f'Unknown protocol "{protocol}" (expected one of {PROTOCOLS})')
+        self.id       = controller_id
+        self.rate     = rate
+        self.protocol = protocol
+        self.devices  = dict(devices or DEFAULT_DEVICES)
+        self.state   = {device: 'off' for device in self.devices}
+        self.temp    = 24.0
+        self.hum     = 55.0
+        self.motion  = 0
+        self.sent     = 0   # packets written
+        self.commands = 0   # commands received
+
+        self._rng   = random.Random(seed)
+        self._write_lock = threading.Lock()
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)   # no echo or newline translation before the backend opens it
+        self.port   = os.ttyname(self._slave)
+        self._stop  = threading.Event()
+        self._thread = None
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+    def start(self) -> 'SimulatedESP':
+        self._thread = threading.Thread(target=self._run, daemon=True, name=f'esp-sim-{self.id}')
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=2)
+        for fd in (self._master, self._slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def controller_entry(self) -> dict:
+        """This simulator as an entry for the controllers.json registry."""
+        return {'id': self.id, 'name': f'Simulated {self.id}', 'port': self.port, 'devices': self.devices}
+
+    # ------------------------------------------------------------------
+    # Packets
+    # ------------------------------------------------------------------
+    def packet(self) -> bytes:
+        self.temp = round(min(max(self.temp + self._rng.uniform(-0.2, 0.2), 15.0), 35.0), 1)
+        self.hum  = round(min(max(self.hum  + self._rng.uniform(-0.5, 0.5), 20.0), 90.0), 1)
+        if self._rng.random() < MOTION_P:
+            self.motion ^= 1
+        if self.protocol == 'compact':
+            return (encode_compact(self.temp, self.hum, self.motion, self.state) + '\n').encode('utf-8')
+        data = {'temp': self.temp, 'hum': self.hum, 'motion': self.motion, **self.state}
+        return (json.dumps(data, separators=(',', ':')) + '\n').encode('utf-8')
+
+    def write(self, data: bytes) -> None:
+        with self._write_lock:
+            view = memoryview(data)
+            while view:
+                view = view[os.write(self._master, view):]
+
+    def send_packet(self) -> None:
+        self.write(self.packet())
+        self.sent += 1
+
+    def burst(self, count: int) -> None:
+        """Write count packets back to back (for throughput measurements)."""
+        self.write(b''.join(self.packet() for _ in range(count)))
+        self.sent += count
+
+    # ------------------------------------------------------------------
+    # Command handling
+    # ------------------------------------------------------------------
+    def handle(self, line: str) -> None:
+        self.commands += 1
+        if line == 'GRANTED':
+            self.write(b'Door unlocked\n')
+            return
+        device, _, status = line.partition(':')
+        device, status = device.lower(), status.lower()
+        if device in self.state and status in ('on', 'off'):
+            self.state[device] = status
+            self.send_packet()   # report straight away — this is the ack
+        else:
+            self.write(f'Unknown command: {line}\n'.encode('utf-8'))
+
+    def _run(self) -> None:
+        buffer   = b''
+        interval = 1.0 / self.rate if self.rate > 0 else None
+        next_due = time.monotonic() + (interval or 0)
+        while not self._stop.is_set():
+            timeout = max(next_due - time.monotonic(), 0) if interval else 0.5
+            try:
+                readable, _, _ = select.select([self._master], [], [], timeout)
+                if readable:
+                    buffer += os.read(self._master, 4096)
+                    *lines, buffer = buffer.split(b'\n')
+                    for line in lines:
+                        line = line.decode('utf-8', errors='ignore').strip()
+                        if line:
+                            self.handle(line)
+                if interval and time.monotonic() >= next_due:
+                    self.send_packet()
+                    next_due += interval
+            except OSError:
+                return   # pty closed
+
+
+def start_simulators(count: int, rate: float, seed: int | None = None,
+                     protocol: str = 'json') -> list[SimulatedESP]:
+    return [SimulatedESP(f'sim{n}', rate, seed=None if seed is None else seed + n, protocol=protocol).start()
+            for n in range(count)]
+
+
+def write_registry(simulators: list[SimulatedESP], path: str) -> None:
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump([s.controller_entry() for s in simulators], f, indent=2)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--controllers', type=int, default=1)
+    parser.add_argument('--rate', type=float, default=0.5, help='packets per second per controller')
+    parser.add_argument('--config', default='sim_controllers.json',
+                        help='controllers.json to write for ESP_CONTROLLERS')
+    parser.add_argument('--protocol', choices=PROTOCOLS, default='json')
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    simulators = start_simulators(args.controllers, args.rate, args.seed, args.protocol)
+    write_registry(simulators, args.config)
+    for sim in simulators:
+        print(f'[sim] {sim.id} on {sim.port}')
+    print(f'[sim] Registry written to {args.config} — start the backend with:')
+    print(f'      ESP_CONTROLLERS={args.config} python app.py')
+    try:
+        while True:
+            time.sleep(10)
+            print(f'[sim] sent {sum(s.sent for s in simulators)} packet(s), '
+                  f'received {sum(s.commands for s in simulators)} command(s)')
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for sim in simulators:
+            sim.stop()
+        sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
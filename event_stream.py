@@ -0,0 +1,163 @@
+"""
+Server-Sent Events push server
+------------------------------
+Streams ESP state changes to dashboards at GET /events, so they no longer
+need to poll /sensors and /device/list.
+
+Runs its own small asyncio HTTP server on a separate port, in a single
+thread: an idle dashboard is just an open socket and a queue, not a
+blocked request thread, so hundreds of them cost next to nothing.
+
+Each client receives:
+  event: snapshot   full state on connect
+  event: update     only the groups (sensors / devices) that changed
+                    (a client too slow to keep up gets a new snapshot instead)
+  : keepalive       comment line every KEEPALIVE_S to hold proxies open
+"""
+
+import json
+import asyncio
+import threading
+
+KEEPALIVE_S  = 15
+CLIENT_QUEUE = 32   # events buffered per slow client before they are replaced by a snapshot
+
+
+class EventStreamServer:
+    def __init__(self, broker, snapshot, host: str = '0.0.0.0', port: int = 5001):
+        """
+        broker:   a StateBroker to subscribe to
+        snapshot: callable returning the full-state event for new clients
+        """
+        self.broker   = broker
+        self.snapshot = snapshot
+        self.host     = host
+        self.port     = port
+        self._loop    = None
+        self._clients = set()
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+    def start(self) -> None:
+        """Start the event loop in a daemon thread and return immediately."""
+        ready = threading.Event()
+        threading.Thread(target=self._run, args=(ready,), daemon=True, name='event-stream').start()
+        ready.wait()
+        self.broker.subscribe(self._on_event)
+
+    def _run(self, ready: threading.Event) -> None:
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        try:
+            server = self._loop.run_until_complete(
+                asyncio.start_server(self._handle, self.host, self.port)
+            )
+        except OSError as e:
+            print(f'[events] Cannot listen on {self.host}:{self.port}: {e}')
+            ready.set()
+            return
+        print(f'[events] SSE on http://{self.host}:{self.port}/events')
+        ready.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            server.close()
+
+    @property
+    def client_count(self) -> int:
+        return len(self._clients)
+
+    # ------------------------------------------------------------------
+    # Fan-out (called on the publishing thread)
+    # ------------------------------------------------------------------
+    def _on_event(self, event: dict) -> None:
+        if self._loop is None or not self._clients:
+            return
+        frame = _frame('update', event)
+        self._loop.call_soon_threadsafe(self._fan_out, frame)
+
+    def _fan_out(self, frame: bytes) -> None:
+        snapshot = None
+        for queue in self._clients:
+            if not queue.full():
+                queue.put_nowait(frame)
+                continue
+            # An update only carries the groups that changed, so dropping one would
+            # leave its group stale: replace the backlog with the full state instead
+            # (taken after this event was published, so it already includes it).
+            if snapshot is None:
+                snapshot = _frame('snapshot', self.snapshot())
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(snapshot)
+
+    # ------------------------------------------------------------------
+    # Per-connection handler
+    # ------------------------------------------------------------------
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=10)
+            while (await asyncio.wait_for(reader.readline(), timeout=10)) not in (b'\r\n', b'\n', b''):
+                pass   # headers are not needed
+        except (asyncio.TimeoutError, ConnectionError):
+            writer.close()
+            return
+
+        parts  = request_line.decode('latin-1').split()
+        method = parts[0] if parts else ''
+        path   = parts[1].split('?')[0] if len(parts) > 1 else ''
+
+        if method == 'OPTIONS':
+            writer.write(_headers('204 No Content', {'Content-Length': '0'}))
+            await _close(writer)
+            return
+        if method != 'GET' or path != '/events':
+            body = b'{"success": false, "message": "Endpoint not found"}'
+            writer.write(_headers('404 Not Found', {'Content-Type': 'application/json',
+                                                    'Content-Length': str(len(body))}) + body)
+            await _close(writer)
+            return
+
+        queue = asyncio.Queue(maxsize=CLIENT_QUEUE)
+        self._clients.add(queue)
+        try:
+            writer.write(_headers('200 OK', {
+                'Content-Type':  'text/event-stream',
+                'Cache-Control': 'no-cache',
+                'Connection':    'keep-alive',
+            }))
+            writer.write(_frame('snapshot', self.snapshot()))
+            await writer.drain()
+            while True:
+                try:
+                    frame = await asyncio.wait_for(queue.get(), timeout=KEEPALIVE_S)
+                except asyncio.TimeoutError:
+                    frame = b': keepalive\n\n'
+                writer.write(frame)
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self._clients.discard(queue)
+            writer.close()
+
+
+def _frame(event: str, data: dict) -> bytes:
+    return f'id: {data.get("version", 0)}\nevent: {event}\ndata: {json.dumps(data)}\n\n'.encode('utf-8')
+
+
+def _headers(status: str, extra: dict) -> bytes:
+    lines = [f'HTTP/1.1 {status}',
+             'Access-Control-Allow-Origin: *',
+             'Access-Control-Allow-Headers: *']
+    lines += [f'{k}: {v}' for k, v in extra.items()]
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+
+async def _close(writer: asyncio.StreamWriter) -> None:
+    try:
+        await writer.drain()
+    except ConnectionError:
+        pass
+    writer.close()
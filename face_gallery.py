@@ -0,0 +1,186 @@
+"""
+In-memory face gallery
+----------------------
+Keeps every enrolled embedding in memory, with the face → user mapping,
+so /face/authenticate can match against the whole gallery without
+re-reading and re-parsing the faces table on every request.
+
+A user may hold several samples (e.g. taken under different lighting).
+Matching is aggregated per user:
+  min  — a user's distance is that of their closest sample
+  mean — a user's distance is the mean over all their samples
+
+Nearest-neighbour search is delegated to a matcher backend from
+face_index (exact brute-force or approximate IVF).
+
+The gallery is loaded once at startup and then kept in sync by the routes
+that write to the faces table (signup, /face/register, /face/delete).
+"""
+
+import threading
+
+import numpy as np
+
+from face_index import EMBEDDING_DIM, ExactIndex
+
+# For mean matching: how many nearest samples are used to pick the
+# candidate users whose full sample sets are then scored
+MEAN_CANDIDATES = 64
+
+
+class FaceGallery:
+    """
+    Process-wide gallery of known face embeddings.
+
+    index:     a face_index backend; defaults to exact matching.
+    aggregate: 'min' or 'mean' — how a user's samples are combined.
+    """
+
+    def __init__(self, index=None, aggregate: str = 'min', dim: int = EMBEDDING_DIM):
+        if aggregate not in ('min', 'mean'):
+            raise ValueError(f'Unknown aggregate "{aggregate}" (expected "min" or "mean")')
+        self.dim       = dim
+        self.index     = index if index is not None else ExactIndex(dim)
+        self.aggregate = aggregate
+        self._lock     = threading.Lock()
+        self._meta     = {}   # face_id  → (user_id, username)
+        self._by_user  = {}   # username → [face_id, ...]
+
+    def _collect(self, entries) -> tuple[list, np.ndarray, dict]:
+        face_ids, vectors, meta = [], [], {}
+        for face_id, user_id, username, embedding in entries:
+            face_ids.append(face_id)
+            vectors.append(np.asarray(embedding, dtype=np.float32).reshape(self.dim))
+            meta[face_id] = (user_id, username)
+        matrix = (np.vstack(vectors) if vectors
+                  else np.empty((0, self.dim), dtype=np.float32))
+        return face_ids, matrix, meta
+
+    def _add_meta(self, face_id: str, user_id: str, username: str) -> None:
+        old = self._meta.get(face_id)
+        if old and old[1] != username:
+            self._drop_meta(face_id)
+        self._meta[face_id] = (user_id, username)
+        samples = self._by_user.setdefault(username, [])
+        if face_id not in samples:
+            samples.append(face_id)
+
+    def _drop_meta(self, face_id: str) -> None:
+        _user_id, username = self._meta.pop(face_id)
+        samples = self._by_user.get(username, [])
+        if face_id in samples:
+            samples.remove(face_id)
+        if not samples:
+            self._by_user.pop(username, None)
+
+    # ------------------------------------------------------------------
+    # Writers
+    # ------------------------------------------------------------------
+    def load(self, entries, index_path: str | None = None) -> None:
+        """
+        Replace the gallery contents.
+        entries:    iterable of (face_id, user_id, username, embedding)
+        index_path: where the matcher may persist its state between runs
+        """
+        face_ids, matrix, meta = self._collect(entries)
+        with self._lock:
+            self._meta, self._by_user = {}, {}
+            for face_id, (user_id, username) in meta.items():
+                self._add_meta(face_id, user_id, username)
+            if index_path:
+                self.index.restore(index_path, face_ids, matrix)
+            else:
+                self.index.build(face_ids, matrix)
+
+    def upsert(self, face_id: str, user_id: str, username: str, embedding: np.ndarray) -> None:
+        """Add a sample, or replace the embedding of an existing face_id."""
+        with self._lock:
+            self.index.upsert(face_id, np.asarray(embedding, dtype=np.float32))
+            self._add_meta(face_id, user_id, username)
+
+    def remove_faces(self, face_ids) -> int:
+        """Drop individual samples (e.g. evicted ones). Returns the number removed."""
+        with self._lock:
+            gone = [f for f in face_ids if f in self._meta]
+            for face_id in gone:
+                self._drop_meta(face_id)
+            return self.index.remove(gone) if gone else 0
+
+    def remove_username(self, username: str) -> int:
+        """Drop every sample belonging to username. Returns the number removed."""
+        return self.remove_faces(list(self._by_user.get(username, ())))
+
+    # ------------------------------------------------------------------
+    # Readers
+    # ------------------------------------------------------------------
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def sample_count(self, username: str) -> int:
+        return len(self._by_user.get(username, ()))
+
+    def match(self, embedding: np.ndarray) -> dict | None:
+        """
+        Return the closest known user as
+          {'face_id', 'user_id', 'username', 'distance', 'samples'}
+        or None when the gallery is empty. face_id is the user's closest
+        sample; distance is aggregated over the user's samples.
+        Distances are Euclidean, same as face_recognition.face_distance.
+        """
+        if self.aggregate == 'mean':
+            return self._match_mean(embedding)
+
+        found = self.index.search(embedding)
+        if found is None:
+            return None
+        face_id, distance = found
+        meta = self._meta.get(face_id)
+        if meta is None:   # removed between search and lookup
+            return None
+        return {
+            'face_id':  face_id,
+            'user_id':  meta[0],
+            'username': meta[1],
+            'distance': distance,
+            'samples':  self.sample_count(meta[1]),
+        }
+
+    def _match_mean(self, embedding: np.ndarray) -> dict | None:
+        hits = self.index.search_k(embedding, MEAN_CANDIDATES)
+        closest = {}   # username → closest sample id, in nearest-first order
+        for face_id, _distance in hits:
+            meta = self._meta.get(face_id)
+            if meta and meta[1] not in closest:
+                closest[meta[1]] = face_id
+        if not closest:
+            return None
+
+        # Score every sample of every candidate user in one vectorized pass
+        face_ids, owners = [], []
+        for n, username in enumerate(closest):
+            samples = list(self._by_user.get(username, ()))
+            face_ids.extend(samples)
+            owners.extend([n] * len(samples))
+        try:
+            vectors = self.index.vectors(face_ids)
+        except KeyError:   # a sample was removed mid-match; try again next frame
+            return None
+
+        query     = np.asarray(embedding, dtype=np.float32).reshape(self.dim)
+        distances = np.linalg.norm(vectors - query, axis=1)
+        owners    = np.asarray(owners)
+        means     = np.bincount(owners, weights=distances) / np.bincount(owners)
+        best      = int(np.argmin(means))
+
+        username = list(closest)[best]
+        face_id  = closest[username]
+        meta     = self._meta.get(face_id)
+        if meta is None:
+            return None
+        return {
+            'face_id':  face_id,
+            'user_id':  meta[0],
+            'username': username,
+            'distance': float(means[best]),
+            'samples':  int(np.count_nonzero(owners == best)),
+        }
@@ -0,0 +1,521 @@
+"""
+Face matcher backends
+---------------------
+Nearest-neighbour search over face embeddings, used by FaceGallery.
+
+  exact — brute-force scan over every embedding (same result as
+          face_recognition.face_distance + np.argmin)
+  ivf   — inverted-file index: embeddings are bucketed by their nearest
+          k-means centroid and a query only scans the `nprobe` closest
+          buckets. Approximate, but sub-linear at large enrollment counts.
+
+Both backends expose the same interface:
+  build(ids, matrix)      replace contents
+  upsert(face_id, vector) add / replace a single embedding
+  remove(face_ids)        drop embeddings, returns number removed
+  search(query)           -> (face_id, distance) or None
+  search_k(query, k)      -> up to k (face_id, distance), nearest first
+  vectors(face_ids)       -> the stored embeddings for those ids
+  save(path) / restore(path, ids, matrix)
+"""
+
+import os
+import threading
+
+import numpy as np
+
+EMBEDDING_DIM = 128
+
+
+# ---------------------------------------------------------------------------
+# Immutable block of embeddings (copy-on-write)
+# ---------------------------------------------------------------------------
+class _Block:
+    """
+    A contiguous float32 matrix with precomputed squared norms and the
+    face ids of each row. Never mutated — writers build a new block and
+    swap it in, so readers need no lock. (ExactIndex's views are the one
+    exception: see there.)
+    """
+
+    __slots__ = ('matrix', 'norms', 'ids', 'pos', 'live')
+
+    def __init__(self, matrix: np.ndarray, ids: tuple):
+        self.matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        self.norms  = np.einsum('ij,ij->i', self.matrix, self.matrix)
+        self.ids    = ids
+        self.pos    = {face_id: i for i, face_id in enumerate(ids)}
+        self.live   = len(ids)
+
+    @classmethod
+    def view(cls, matrix: np.ndarray, norms: np.ndarray, ids, pos: dict, live: int) -> '_Block':
+        """A block over existing arrays, without copying them or recomputing norms."""
+        block = object.__new__(cls)
+        block.matrix, block.norms, block.ids, block.pos, block.live = matrix, norms, ids, pos, live
+        return block
+
+    @classmethod
+    def empty(cls, dim: int) -> '_Block':
+        return cls(np.empty((0, dim), dtype=np.float32), ())
+
+    def with_upsert(self, face_id: str, vector: np.ndarray) -> '_Block':
+        if face_id in self.pos:
+            matrix = self.matrix.copy()
+            matrix[self.pos[face_id]] = vector
+            return _Block(matrix, self.ids)
+        return _Block(np.vstack([self.matrix, vector.reshape(1, -1)]), self.ids + (face_id,))
+
+    def without(self, face_ids: set) -> '_Block':
+        keep = [i for i, f in enumerate(self.ids) if f not in face_ids]
+        return _Block(self.matrix[keep], tuple(self.ids[i] for i in keep))
+
+    def squared(self, query: np.ndarray, query_sq: float) -> np.ndarray:
+        # |a - b|^2 = |a|^2 + |b|^2 - 2 a.b  — one matrix-vector product
+        return self.norms + query_sq - 2.0 * (self.matrix @ query)
+
+    def nearest(self, query: np.ndarray, query_sq: float) -> tuple[int, float]:
+        """Row index and squared distance of the closest embedding."""
+        sq  = self.squared(query, query_sq)
+        idx = int(np.argmin(sq))
+        return idx, float(sq[idx])
+
+    def nearest_k(self, query: np.ndarray, query_sq: float, k: int) -> list[tuple[str, float]]:
+        """Up to k (face_id, squared distance), nearest first."""
+        sq = self.squared(query, query_sq)
+        if k < len(sq):
+            rows = np.argpartition(sq, k)[:k]
+        else:
+            rows = np.arange(len(sq))
+        rows = rows[np.argsort(sq[rows])]
+        return [(self.ids[i], float(sq[i])) for i in rows if sq[i] != np.inf]
+
+
+def _as_query(query: np.ndarray, dim: int) -> tuple[np.ndarray, float]:
+    q = np.asarray(query, dtype=np.float32).reshape(dim)
+    return q, float(q @ q)
+
+
+def _distance(sq: float) -> float:
+    return float(np.sqrt(max(sq, 0.0)))
+
+
+def _merge_k(candidates, k: int) -> list[tuple[str, float]]:
+    return [(f, _distance(sq)) for f, sq in sorted(candidates, key=lambda c: c[1])[:k]]
+
+
+# ---------------------------------------------------------------------------
+# Exact
+# ---------------------------------------------------------------------------
+class ExactIndex:
+    """
+    Rows are appended to a buffer that doubles when full, and readers get
+    a _Block view of its first n rows — an append writes one row and
+    publishes a longer view instead of copying the matrix. Removed (or
+    replaced) rows are tombstoned with an infinite norm, which older views
+    see too, and dropped when the buffer is compacted: on growth, or once
+    they outnumber the live rows.
+    """
+
+    name = 'exact'
+
+    MIN_CAPACITY = 64
+
+    def __init__(self, dim: int = EMBEDDING_DIM):
+        self.dim   = dim
+        self._lock = threading.Lock()
+        self._load(np.empty((0, dim), dtype=np.float32), [])
+
+    def __len__(self) -> int:
+        return self._block.live
+
+    def _load(self, matrix: np.ndarray, ids: list) -> None:
+        # Caller holds the lock. Fresh buffers, so views already handed out are untouched.
+        n        = len(ids)
+        capacity = max(2 * n, self.MIN_CAPACITY)
+        self._matrix = np.zeros((capacity, self.dim), dtype=np.float32)
+        self._norms  = np.full(capacity, np.inf, dtype=np.float32)
+        self._matrix[:n] = matrix
+        self._norms[:n]  = np.einsum('ij,ij->i', self._matrix[:n], self._matrix[:n])
+        self._ids    = list(ids)
+        self._pos    = {face_id: i for i, face_id in enumerate(ids)}
+        self._publish()
+
+    def _publish(self) -> None:
+        n = len(self._ids)
+        self._block = _Block.view(self._matrix[:n], self._norms[:n], self._ids, self._pos, len(self._pos))
+
+    def _compact(self) -> None:
+        keep = sorted(self._pos.values())
+        self._load(self._matrix[keep], [self._ids[i] for i in keep])
+
+    def _tombstone(self, face_id: str) -> bool:
+        row = self._pos.pop(face_id, None)
+        if row is None:
+            return False
+        self._norms[row] = np.inf
+        return True
+
+    def build(self, ids, matrix: np.ndarray) -> None:
+        with self._lock:
+            self._load(np.asarray(matrix, dtype=np.float32).reshape(-1, self.dim), list(ids))
+
+    def upsert(self, face_id: str, vector: np.ndarray) -> None:
+        vector = np.asarray(vector, dtype=np.float32).reshape(self.dim)
+        with self._lock:
+            self._tombstone(face_id)
+            if len(self._ids) == len(self._matrix):
+                self._compact()
+            row = len(self._ids)
+            self._matrix[row] = vector
+            self._norms[row]  = vector @ vector
+            self._ids.append(face_id)
+            self._pos[face_id] = row
+            self._publish()
+
+    def remove(self, face_ids) -> int:
+        with self._lock:
+            removed = sum(self._tombstone(face_id) for face_id in set(face_ids))
+            if len(self._ids) - len(self._pos) > max(len(self._pos), self.MIN_CAPACITY):
+                self._compact()
+            elif removed:
+                self._publish()
+            return removed
+
+    def search(self, query: np.ndarray) -> tuple[str, float] | None:
+        block = self._block
+        if not block.live:
+            return None
+        idx, sq = block.nearest(*_as_query(query, self.dim))
+        if sq == np.inf:
+            return None   # everything in this view was removed since
+        return block.ids[idx], _distance(sq)
+
+    def search_k(self, query: np.ndarray, k: int) -> list[tuple[str, float]]:
+        block = self._block
+        if not block.live:
+            return []
+        return _merge_k(block.nearest_k(*_as_query(query, self.dim), k), k)
+
+    def vectors(self, face_ids) -> np.ndarray:
+        # Under the lock: the row map is shared with the writer, not frozen per view
+        with self._lock:
+            return self._matrix[[self._pos[f] for f in face_ids]]
+
+    # Nothing worth persisting — the faces table is the source of truth
+    def save(self, path: str) -> None:
+        pass
+
+    def restore(self, path: str, ids, matrix: np.ndarray) -> None:
+        self.build(ids, matrix)
+
+
+# ---------------------------------------------------------------------------
+# IVF (inverted file, k-means coarse quantiser)
+# ---------------------------------------------------------------------------
+IVF_MIN_TRAIN = 1024   # below this a single bucket is as fast as any index
+
+
+def _kmeans(data: np.ndarray, k: int, iters: int, rng: np.random.Generator) -> np.ndarray:
+    centroids = data[rng.choice(len(data), k, replace=False)].copy()
+    for _ in range(iters):
+        labels = _assign(data, centroids)
+        for c in range(k):
+            members = data[labels == c]
+            if len(members):
+                centroids[c] = members.mean(axis=0)
+            else:
+                # Re-seed empty clusters on a random point
+                centroids[c] = data[rng.integers(len(data))]
+    return centroids
+
+
+def _assign(data: np.ndarray, centroids: np.ndarray, chunk: int = 8192) -> np.ndarray:
+    c_norms = np.einsum('ij,ij->i', centroids, centroids)
+    labels  = np.empty(len(data), dtype=np.int64)
+    for start in range(0, len(data), chunk):
+        part = data[start:start + chunk]
+        labels[start:start + chunk] = np.argmin(c_norms - 2.0 * (part @ centroids.T), axis=1)
+    return labels
+
+
+class _IVFState:
+    """
+    Centroids and the lists bucketed by them, swapped in as one object:
+    a search never pairs the centroids of one training with the lists of
+    another. Never mutated, like _Block.
+    """
+
+    __slots__ = ('centroids', 'c_norms', 'lists', 'count')
+
+    def __init__(self, centroids: np.ndarray, lists: tuple, count: int):
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.c_norms   = np.einsum('ij,ij->i', self.centroids, self.centroids)
+        self.lists     = lists
+        self.count     = count
+
+    def nearest_list(self, vector: np.ndarray) -> int:
+        return int(np.argmin(self.c_norms - 2.0 * (self.centroids @ vector)))
+
+    def with_upsert(self, assignment: dict, face_id: str, vector: np.ndarray) -> '_IVFState':
+        lists = list(self.lists)
+        old   = assignment.get(face_id)
+        new   = self.nearest_list(vector)
+        if old is not None and old != new:
+            lists[old] = lists[old].without({face_id})
+        lists[new] = lists[new].with_upsert(face_id, vector)
+        assignment[face_id] = new
+        return _IVFState(self.centroids, tuple(lists), len(assignment))
+
+    def without(self, assignment: dict, face_ids) -> '_IVFState':
+        by_list = {}
+        for face_id in face_ids:
+            c = assignment.pop(face_id, None)
+            if c is not None:
+                by_list.setdefault(c, set()).add(face_id)
+        if not by_list:
+            return self
+        lists = list(self.lists)
+        for c, gone in by_list.items():
+            lists[c] = lists[c].without(gone)
+        return _IVFState(self.centroids, tuple(lists), len(assignment))
+
+
+def _filled(centroids: np.ndarray, ids, matrix: np.ndarray,
+            labels: np.ndarray) -> tuple[_IVFState, dict]:
+    order  = np.argsort(labels, kind='stable')
+    bounds = np.searchsorted(labels[order], np.arange(len(centroids) + 1))
+    lists  = []
+    for c in range(len(centroids)):
+        rows = order[bounds[c]:bounds[c + 1]]
+        lists.append(_Block(matrix[rows], tuple(ids[i] for i in rows)))
+    assignment = {ids[i]: int(labels[i]) for i in range(len(ids))}
+    return _IVFState(centroids, tuple(lists), len(assignment)), assignment
+
+
+class IVFIndex:
+    name = 'ivf'
+
+    def __init__(self, dim: int = EMBEDDING_DIM, nlist: int | None = None,
+                 nprobe: int = 8, train_iters: int = 10, seed: int = 0):
+        self.dim           = dim
+        self.nlist         = nlist          # None → ~sqrt(N), chosen at train time
+        self.nprobe        = nprobe
+        self.train_iters   = train_iters
+        self._rng          = np.random.default_rng(seed)
+        self._lock         = threading.Lock()
+        self._save_path    = None
+        self._save_timer   = None
+        self._state        = _IVFState(np.zeros((1, dim), dtype=np.float32), (_Block.empty(dim),), 0)
+        self._assignment   = {}     # face_id → list number; writers only, under the lock
+        self._trained_size = 0
+        self._generation   = 0      # bumped by build / restore, which discard a running retrain
+        self._retrain_log  = None   # writes made while a retrain runs, replayed onto its result
+
+    def __len__(self) -> int:
+        return self._state.count
+
+    # ------------------------------------------------------------------
+    # Building
+    # ------------------------------------------------------------------
+    def _train(self, matrix: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+        n = len(matrix)
+        if n < IVF_MIN_TRAIN:
+            return np.zeros((1, self.dim), dtype=np.float32)
+        k = min(self.nlist or int(np.sqrt(n)), n)
+        # k-means on a sample is plenty for a coarse quantiser
+        sample = matrix[rng.choice(n, min(n, 64 * k), replace=False)]
+        return _kmeans(sample, k, self.train_iters, rng)
+
+    def _install(self, state: _IVFState, assignment: dict, trained_size: int) -> None:
+        # Caller holds the lock
+        self._state, self._assignment, self._trained_size = state, assignment, trained_size
+        self._generation += 1
+
+    def build(self, ids, matrix: np.ndarray) -> None:
+        ids    = list(ids)
+        matrix = np.asarray(matrix, dtype=np.float32).reshape(-1, self.dim)
+        with self._lock:
+            centroids = self._train(matrix, self._rng)
+            self._install(*_filled(centroids, ids, matrix, _assign(matrix, centroids)), len(ids))
+        self._schedule_save()
+
+    def _maybe_retrain(self) -> None:
+        """
+        Caller holds the lock. Centroids trained on a much smaller gallery
+        give badly unbalanced buckets, so retrain as it grows — on a
+        background thread, since k-means over the gallery takes far longer
+        than a registration should. Searches keep using the old centroids
+        until the new state is swapped in.
+        """
+        n = len(self._assignment)
+        if n < IVF_MIN_TRAIN or n < 4 * max(self._trained_size, IVF_MIN_TRAIN // 4):
+            return
+        if self._retrain_log is not None:
+            return   # already running
+        self._retrain_log = []
+        rng = np.random.default_rng(self._rng.integers(2**32))
+        threading.Thread(target=self._retrain, args=(self._state, self._generation, rng),
+                         name='ivf-retrain', daemon=True).start()
+
+    def _retrain(self, state: _IVFState, generation: int, rng: np.random.Generator) -> None:
+        try:
+            ids       = [f for lst in state.lists for f in lst.ids]
+            matrix    = np.vstack([lst.matrix for lst in state.lists])
+            centroids = self._train(matrix, rng)
+            fresh, assignment = _filled(centroids, ids, matrix, _assign(matrix, centroids))
+        except Exception as e:
+            print(f'[ivf] Retrain failed: {e}')
+            with self._lock:
+                self._retrain_log = None
+            return
+
+        with self._lock:
+            log, self._retrain_log = self._retrain_log, None
+            if generation != self._generation:
+                return   # rebuilt meanwhile; that build is newer than this snapshot
+            # Writes that landed after the snapshot, re-bucketed on the new centroids
+            for face_id, vector in log:
+                if vector is None:
+                    fresh = fresh.without(assignment, (face_id,))
+                else:
+                    fresh = fresh.with_upsert(assignment, face_id, vector)
+            self._install(fresh, assignment, len(ids))
+        print(f'[ivf] Retrained {len(centroids)} lists over {len(ids)} faces')
+        self._schedule_save()
+
+    # ------------------------------------------------------------------
+    # Incremental updates
+    # ------------------------------------------------------------------
+    def upsert(self, face_id: str, vector: np.ndarray) -> None:
+        vector = np.asarray(vector, dtype=np.float32).reshape(self.dim)
+        with self._lock:
+            self._state = self._state.with_upsert(self._assignment, face_id, vector)
+            if self._retrain_log is not None:
+                self._retrain_log.append((face_id, vector))
+            self._maybe_retrain()
+        self._schedule_save()
+
+    def remove(self, face_ids) -> int:
+        face_ids = list(face_ids)
+        with self._lock:
+            before      = len(self._assignment)
+            self._state = self._state.without(self._assignment, face_ids)
+            removed     = before - len(self._assignment)
+            if removed and self._retrain_log is not None:
+                self._retrain_log.extend((face_id, None) for face_id in face_ids)
+        if removed:
+            self._schedule_save()
+        return removed
+
+    # ------------------------------------------------------------------
+    # Search — each reads self._state once and works on that snapshot
+    # ------------------------------------------------------------------
+    def _probe(self, state: _IVFState, q: np.ndarray):
+        if len(state.lists) <= self.nprobe:
+            return range(len(state.lists))
+        return np.argpartition(state.c_norms - 2.0 * (state.centroids @ q), self.nprobe)[:self.nprobe]
+
+    def search(self, query: np.ndarray) -> tuple[str, float] | None:
+        state = self._state
+        if not state.count:
+            return None
+
+        q, q_sq = _as_query(query, self.dim)
+        best_id, best_sq = None, np.inf
+        for c in self._probe(state, q):
+            block = state.lists[c]
+            if not block.ids:
+                continue
+            idx, sq = block.nearest(q, q_sq)
+            if sq < best_sq:
+                best_id, best_sq = block.ids[idx], sq
+        if best_id is None:
+            return None
+        return best_id, _distance(best_sq)
+
+    def search_k(self, query: np.ndarray, k: int) -> list[tuple[str, float]]:
+        state = self._state
+        if not state.count:
+            return []
+        q, q_sq = _as_query(query, self.dim)
+        candidates = []
+        for c in self._probe(state, q):
+            if state.lists[c].ids:
+                candidates.extend(state.lists[c].nearest_k(q, q_sq, k))
+        return _merge_k(candidates, k)
+
+    def vectors(self, face_ids) -> np.ndarray:
+        lists = self._state.lists
+        rows  = []
+        for face_id in face_ids:
+            # The assignment is only a hint: it may already belong to a newer state
+            c = self._assignment.get(face_id)
+            if c is None or c >= len(lists) or face_id not in lists[c].pos:
+                c = next(i for i, lst in enumerate(lists) if face_id in lst.pos)
+            rows.append(lists[c].matrix[lists[c].pos[face_id]])
+        return np.vstack(rows) if rows else np.empty((0, self.dim), dtype=np.float32)
+
+    # ------------------------------------------------------------------
+    # Persistence — centroids + assignments; vectors stay in faces.db
+    # ------------------------------------------------------------------
+    def save(self, path: str) -> None:
+        with self._lock:
+            ids    = np.array(list(self._assignment.keys()), dtype=str)
+            labels = np.array(list(self._assignment.values()), dtype=np.int64)
+            centroids, trained = self._state.centroids, self._trained_size
+        tmp = path + '.tmp.npz'
+        np.savez(tmp, centroids=centroids, ids=ids, labels=labels, trained_size=trained)
+        os.replace(tmp, path)
+
+    def restore(self, path: str, ids, matrix: np.ndarray) -> None:
+        """
+        Load from the faces table, reusing persisted centroids (and
+        assignments, if the face set is unchanged) instead of retraining.
+        Further writes are saved back to `path` in the background.
+        """
+        self._save_path = path
+        ids    = list(ids)
+        matrix = np.asarray(matrix, dtype=np.float32).reshape(-1, self.dim)
+        try:
+            saved = np.load(path)
+        except (OSError, ValueError):
+            self.build(ids, matrix)
+            return
+
+        centroids = np.asarray(saved['centroids'], dtype=np.float32)
+        with self._lock:
+            saved_ids = saved['ids'].tolist()
+            if saved_ids == ids and len(saved['labels']) == len(ids):
+                labels = saved['labels']
+            else:
+                labels = _assign(matrix, centroids)
+            self._install(*_filled(centroids, ids, matrix, labels), int(saved['trained_size']))
+            self._maybe_retrain()
+        print(f'[ivf] Restored {len(centroids)} lists from {path}')
+
+    def _schedule_save(self, delay: float = 5.0) -> None:
+        """Debounced background save so bursts of enrollments write once."""
+        if not self._save_path:
+            return
+        if self._save_timer:
+            self._save_timer.cancel()
+        self._save_timer = threading.Timer(delay, self._save_quietly)
+        self._save_timer.daemon = True
+        self._save_timer.start()
+
+    def _save_quietly(self) -> None:
+        try:
+            self.save(self._save_path)
+        except OSError as e:
+            print(f'[ivf] Could not save index: {e}')
+
+
+# ---------------------------------------------------------------------------
+# Factory
+# ---------------------------------------------------------------------------
+def make_index(kind: str, dim: int = EMBEDDING_DIM, **options):
+    if kind == 'exact':
+        return ExactIndex(dim)
+    if kind == 'ivf':
+        return IVFIndex(dim, **options)
+    raise ValueError(f'Unknown face matcher "{kind}" (expected "exact" or "ivf")')
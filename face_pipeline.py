@@ -0,0 +1,167 @@
+"""
+Face pipeline
+-------------
+Image → 128-d embedding. Kept in its own module (with no Flask / serial
+imports) so it can run inside the face worker processes.
+
+Detection is the expensive step and its cost grows with pixel count, so
+large frames are detected on a downscaled copy:
+  1. JPEGs are decoded with PIL draft mode straight to a reduced size
+     (DCT scaling — much cheaper than decoding full size and resizing)
+  2. face_locations runs on a copy no larger than `max_side`
+  3. the box is scaled back up and face_encodings runs on a crop of the
+     higher-resolution decode around the face
+
+With options.quality set, blurry or badly exposed frames are rejected
+before detection, and frames without exactly one large enough face
+before encoding (see face_quality) — FrameRejected says why.
+
+Each stage is timed into face_stage_seconds{stage=decode|quality|detect|encode}.
+
+face_recognition loads its dlib models when it is imported (a second or
+more), so it is imported on first use through models() — in the face
+worker processes, or by warm_up() — and importing this module stays cheap.
+"""
+
+import io
+import threading
+from typing import NamedTuple
+
+import numpy as np
+from PIL import Image
+
+import metrics
+from face_quality import QualityThresholds, check_frame, check_faces
+
+
+class ImageDecodeError(ValueError):
+    """The uploaded bytes are not a readable image."""
+
+
+class DetectionOptions(NamedTuple):
+    max_side: int = 640     # longest side for detection; 0 = full size
+    model:    str = 'hog'   # 'hog' (CPU) or 'cnn' (much slower without CUDA)
+    upsample: int = 1       # face_locations number_of_times_to_upsample
+    quality:  QualityThresholds | None = None   # pre-filter thresholds; None = off
+
+
+metrics.histogram('face_stage_seconds', 'Face pipeline and matching time per stage')
+
+_face_recognition = None
+_models_lock = threading.Lock()
+
+
+def models():
+    """The face_recognition module, imported (dlib models loaded) on first call."""
+    global _face_recognition
+    if _face_recognition is None:
+        with _models_lock:
+            if _face_recognition is None:
+                import face_recognition
+                _face_recognition = face_recognition
+    return _face_recognition
+
+
+# Margin around the detected box kept when cropping for the encoder,
+# as a fraction of the box size (the landmark model needs some context)
+CROP_MARGIN = 0.5
+
+
+def decode_image(image_bytes: bytes) -> np.ndarray:
+    return np.array(Image.open(io.BytesIO(image_bytes)).convert('RGB'))
+
+
+def extract_embedding(image_array: np.ndarray, model: str = 'hog', upsample: int = 1,
+                      quality: QualityThresholds | None = None) -> np.ndarray | None:
+    with metrics.timer('face_stage_seconds', stage='detect'):
+        locations = models().face_locations(
+            image_array, number_of_times_to_upsample=upsample, model=model
+        )
+    if quality:
+        check_faces(locations, (image_array.shape[1], image_array.shape[0]), quality)
+    if not locations:
+        return None
+    with metrics.timer('face_stage_seconds', stage='encode'):
+        encodings = models().face_encodings(image_array, known_face_locations=locations)
+    return encodings[0] if encodings else None
+
+
+def _open_reduced(image_bytes: bytes, max_side: int) -> Image.Image:
+    """
+    Open an image, letting the JPEG decoder skip detail we won't use.
+    The result keeps at least 2 x max_side on its longest side so the
+    encoder still gets a sharp face crop.
+    """
+    img = Image.open(io.BytesIO(image_bytes))
+    if img.format == 'JPEG':
+        img.draft('RGB', (2 * max_side, 2 * max_side))
+    return img.convert('RGB')
+
+
+def extract_embedding_scaled(img: Image.Image, options: DetectionOptions) -> np.ndarray | None:
+    """Detect on a copy no larger than options.max_side, encode on a crop of img."""
+    width, height = img.size
+    scale = options.max_side / max(width, height)
+    if scale >= 1.0:
+        return extract_embedding(np.asarray(img), options.model, options.upsample, options.quality)
+
+    with metrics.timer('face_stage_seconds', stage='detect'):
+        small = img.resize((max(int(width * scale), 1), max(int(height * scale), 1)), Image.BILINEAR)
+        locations = models().face_locations(
+            np.asarray(small), number_of_times_to_upsample=options.upsample, model=options.model
+        )
+    if options.quality:
+        check_faces(locations, small.size, options.quality)
+    if not locations:
+        return None
+
+    # face_locations returns (top, right, bottom, left) in small-image pixels
+    top, right, bottom, left = (v / scale for v in locations[0])
+    margin_y = (bottom - top) * CROP_MARGIN
+    margin_x = (right - left) * CROP_MARGIN
+    crop_box = (
+        max(int(left - margin_x), 0),  max(int(top - margin_y), 0),
+        min(int(right + margin_x), width), min(int(bottom + margin_y), height),
+    )
+    box  = (
+        int(top) - crop_box[1], int(right) - crop_box[0],
+        int(bottom) - crop_box[1], int(left) - crop_box[0],
+    )
+    with metrics.timer('face_stage_seconds', stage='encode'):
+        crop = np.asarray(img.crop(crop_box))
+        encodings = models().face_encodings(crop, known_face_locations=[box])
+    return encodings[0] if encodings else None
+
+
+def embed_image(image_bytes: bytes, options: DetectionOptions | None = None) -> np.ndarray | None:
+    """
+    Decode an uploaded image and return its face embedding,
+    or None if no face was found. Raises ImageDecodeError, or
+    FrameRejected when options.quality is set.
+    """
+    options = options or DetectionOptions()
+    try:
+        with metrics.timer('face_stage_seconds', stage='decode'):
+            if options.max_side <= 0:
+                image_array = decode_image(image_bytes)
+            else:
+                img = _open_reduced(image_bytes, options.max_side)
+    except Exception as e:
+        raise ImageDecodeError(str(e)) from None
+
+    if options.max_side <= 0:
+        if options.quality:
+            with metrics.timer('face_stage_seconds', stage='quality'):
+                check_frame(Image.fromarray(image_array), options.quality)
+        return extract_embedding(image_array, options.model, options.upsample, options.quality)
+    if options.quality:
+        with metrics.timer('face_stage_seconds', stage='quality'):
+            check_frame(img, options.quality)
+    return extract_embedding_scaled(img, options)
+
+
+def warm_up() -> None:
+    """Run the detector and encoder once so their models are loaded."""
+    blank = np.zeros((64, 64, 3), dtype=np.uint8)
+    models().face_locations(blank, model='hog')
+    models().face_encodings(blank, known_face_locations=[(8, 56, 56, 8)])
@@ -0,0 +1,118 @@
+"""
+Face frame quality
+------------------
+Cheap NumPy checks that turn away frames the matcher could never use,
+before the expensive pipeline stages run on them:
+
+  before detection   sharpness   variance of the Laplacian of the luma,
+                                 measured at ANALYSIS_SIDE px so the
+                                 threshold doesn't depend on camera resolution
+                     exposure    mean luma, and the share of clipped pixels
+  before encoding    face count  exactly one face in the frame
+                     face size   box side relative to the frame's shorter side
+
+A rejected frame raises FrameRejected with a reason code the client can
+act on (the FaceCamera UI asks for a retake straight away):
+
+  too_blurry, too_dark, too_bright, face_too_small, multiple_faces
+"""
+
+from typing import NamedTuple
+
+import numpy as np
+from PIL import Image
+
+ANALYSIS_SIDE = 320   # longest side of the grayscale copy the frame checks run on
+
+MESSAGES = {
+    'too_blurry':     'Image is too blurry. Hold still and retake.',
+    'too_dark':       'Image is too dark. Face the light and retake.',
+    'too_bright':     'Image is overexposed. Move away from direct light and retake.',
+    'face_too_small': 'Face is too far away. Move closer and retake.',
+    'multiple_faces': 'More than one face in view. Only one person should be in frame.',
+}
+
+
+class QualityThresholds(NamedTuple):
+    min_sharpness:     float = 15.0    # Laplacian variance at ANALYSIS_SIDE px
+    min_brightness:    float = 40.0    # mean luma, 0–255
+    max_brightness:    float = 215.0
+    max_clipped:       float = 0.35    # share of pixels at ≤ 5 or ≥ 250
+    min_face_fraction: float = 0.12    # face box side / shorter frame side
+    max_faces:         int   = 1
+
+
+class FrameRejected(ValueError):
+    """The frame is unusable; reason is one of MESSAGES."""
+
+    def __init__(self, reason: str, detail: str = ''):
+        super().__init__(reason, detail)   # both in args, so it pickles across processes
+        self.reason = reason
+        self.detail = detail
+
+    @property
+    def message(self) -> str:
+        return MESSAGES[self.reason]
+
+    def __str__(self) -> str:
+        return f'{self.reason} ({self.detail})' if self.detail else self.reason
+
+
+def _luma(img: Image.Image) -> np.ndarray:
+    # Gray first, then a cheap integer box reduce, then the exact resize
+    gray = img.convert('L')
+    factor = max(gray.size) // ANALYSIS_SIDE
+    if factor > 1:
+        gray = gray.reduce(factor)
+    scale = ANALYSIS_SIDE / max(gray.size)
+    if scale < 1.0:
+        gray = gray.resize((max(int(gray.width * scale), 1), max(int(gray.height * scale), 1)), Image.BILINEAR)
+    return np.asarray(gray, dtype=np.float32)
+
+
+def frame_metrics(img: Image.Image) -> dict:
+    """Sharpness, mean brightness and clipped share of a frame."""
+    luma = _luma(img)
+    if luma.shape[0] < 3 or luma.shape[1] < 3:
+        return {'sharpness': 0.0, 'brightness': float(luma.mean()), 'clipped': 0.0}
+    # 4-neighbour Laplacian on the interior pixels
+    laplacian = (luma[:-2, 1:-1] + luma[2:, 1:-1] + luma[1:-1, :-2] + luma[1:-1, 2:]
+                 - 4.0 * luma[1:-1, 1:-1])
+    clipped = np.count_nonzero((luma <= 5) | (luma >= 250)) / luma.size
+    return {
+        'sharpness':  float(laplacian.var()),
+        'brightness': float(luma.mean()),
+        'clipped':    float(clipped),
+    }
+
+
+def check_frame(img: Image.Image, thresholds: QualityThresholds) -> dict:
+    """Raise FrameRejected for a blurry or badly exposed frame; returns the metrics."""
+    m = frame_metrics(img)
+    if m['brightness'] < thresholds.min_brightness:
+        raise FrameRejected('too_dark', f'brightness {m["brightness"]:.0f}')
+    if m['brightness'] > thresholds.max_brightness:
+        raise FrameRejected('too_bright', f'brightness {m["brightness"]:.0f}')
+    if m['clipped'] > thresholds.max_clipped:
+        reason = 'too_dark' if m['brightness'] < 128 else 'too_bright'
+        raise FrameRejected(reason, f'{m["clipped"]:.0%} clipped')
+    # Checked after exposure: a dark frame also has little detail
+    if m['sharpness'] < thresholds.min_sharpness:
+        raise FrameRejected('too_blurry', f'sharpness {m["sharpness"]:.1f}')
+    return m
+
+
+def check_faces(locations: list, size: tuple[int, int], thresholds: QualityThresholds) -> None:
+    """
+    Raise FrameRejected unless there is exactly one large enough face.
+    locations: face_recognition boxes (top, right, bottom, left) in an
+    image of size (width, height). No face at all is left to the caller.
+    """
+    if len(locations) > thresholds.max_faces:
+        raise FrameRejected('multiple_faces', f'{len(locations)} faces')
+    if not locations:
+        return
+    top, right, bottom, left = max(locations, key=lambda b: (b[2] - b[0]) * (b[1] - b[3]))
+    fraction = min(bottom - top, right - left) / min(size)
+    if fraction < thresholds.min_face_fraction:
+        raise FrameRejected('face_too_small', f'face {fraction:.0%} of frame')
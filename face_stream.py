@@ -0,0 +1,154 @@
+"""
+Streaming face authentication
+-----------------------------
+POST /face/authenticate/stream takes a burst of frames in one multipart
+body (a `frames` part per frame, e.g. 3–5 captures a few hundred ms
+apart) instead of one frame per request. Frames are pulled off the
+socket as they arrive, handed to the face worker pool, and scored
+against the gallery one by one; the session stops reading as soon as it
+can decide:
+
+  confident match    distance ≤ confident threshold   → accept now
+  hopeless frame     too dark / too bright / several faces — the next
+                     frames of the same burst won't differ → retake now
+  otherwise          blurry, small or missing faces may be motion: keep
+                     going and decide on the best frame at the end
+
+so a user who moved during the first frame still gets in on the first
+try, and a good first frame costs no more than the single-image route.
+
+A browser posts the burst as ordinary FormData. A client that really
+streams (chunked transfer encoding, a kiosk capturing as it uploads)
+should send each frame's closing delimiter (CRLF--boundary) right after
+the frame: a part only ends when its delimiter arrives, and the body is
+read CHUNK_SIZE at a time.
+"""
+
+import collections
+
+from werkzeug.sansio.multipart import MultipartDecoder, NeedData, Field, File, Data, Epilogue
+from werkzeug.exceptions import RequestEntityTooLarge
+
+import face_pipeline
+from face_quality import FrameRejected
+
+CHUNK_SIZE      = 16 * 1024
+MAX_FRAME_BYTES = 8 * 1024 * 1024
+
+# Rejections that another frame from the same burst won't fix
+STOP_REASONS = frozenset({'too_dark', 'too_bright', 'multiple_faces'})
+
+
+class StreamError(ValueError):
+    """The request body isn't a readable multipart burst."""
+
+
+def iter_frames(stream, boundary: str | None, max_frames: int, field: str = 'frames'):
+    """
+    Yield the bytes of each `field` file part of a multipart body as soon
+    as that part has been received, reading at most CHUNK_SIZE at a time.
+    Stops after max_frames frames without reading the rest of the body.
+    """
+    if not boundary:
+        raise StreamError('Expected a multipart/form-data body')
+    decoder = MultipartDecoder(boundary.encode('latin-1'), MAX_FRAME_BYTES, max_parts=max_frames * 2 + 8)
+    name, parts, yielded = None, [], 0
+    while True:
+        chunk = stream.read(CHUNK_SIZE)
+        decoder.receive_data(chunk or None)   # None marks the end of the body
+        try:
+            event = decoder.next_event()
+            while not isinstance(event, NeedData):
+                if isinstance(event, File):
+                    name, parts = event.name, []
+                elif isinstance(event, Field):
+                    name, parts = None, []   # plain form fields are ignored
+                elif isinstance(event, Data) and name == field:
+                    parts.append(event.data)
+                    if sum(map(len, parts)) > MAX_FRAME_BYTES:
+                        raise StreamError('Frame too large')
+                    if not event.more_data:
+                        yield b''.join(parts)
+                        name, parts = None, []
+                        yielded += 1
+                        if yielded >= max_frames:
+                            return
+                elif isinstance(event, Epilogue):
+                    return
+                event = decoder.next_event()
+        except StreamError:
+            raise
+        except (ValueError, RequestEntityTooLarge):
+            raise StreamError('Malformed multipart body') from None
+        if not chunk:
+            return
+
+
+class AuthSession:
+    """
+    Scores the results of one burst (from FaceWorkerPool.embed_many) and
+    decides when to stop.
+
+    match(embedding) → gallery match dict or None (empty gallery).
+    """
+
+    def __init__(self, match, threshold: float, confident: float):
+        self.match       = match
+        self.threshold   = threshold
+        self.confident   = confident
+        self.frames      = 0
+        self.best        = None
+        self.rejected    = collections.Counter()
+        self.no_face     = 0
+        self.undecodable = 0
+        self.outcome     = None   # set when the session stopped before the end of the burst
+        self.stop_reason = None
+
+    def add(self, result) -> bool:
+        """Account for one frame's result; True once no further frame can change the decision."""
+        self.frames += 1
+        if isinstance(result, FrameRejected):
+            self.rejected[result.reason] += 1
+            if result.reason in STOP_REASONS:
+                self.outcome, self.stop_reason = 'rejected', result.reason
+            return self.outcome is not None
+        if isinstance(result, face_pipeline.ImageDecodeError):
+            self.undecodable += 1
+            return False
+        if result is None:
+            self.no_face += 1
+            return False
+
+        matched = self.match(result)
+        if matched is None:
+            self.outcome = 'empty_gallery'
+            return True
+        if self.best is None or matched['distance'] < self.best['distance']:
+            self.best = matched
+        if matched['distance'] <= self.confident:
+            self.outcome = 'match'
+        return self.outcome is not None
+
+    def decision(self) -> str:
+        """
+        'match', 'no_match', 'rejected', 'no_face', 'undecodable',
+        'empty_gallery' or 'no_frames'.
+        """
+        if self.outcome:
+            return self.outcome
+        if self.best is not None:
+            return 'match' if self.best['distance'] <= self.threshold else 'no_match'
+        if self.rejected:
+            return 'rejected'
+        if self.no_face:
+            return 'no_face'
+        if self.undecodable:
+            return 'undecodable'
+        return 'no_frames'
+
+    @property
+    def reason(self) -> str | None:
+        """Why a 'rejected' decision: the stopping reason, else the most frequent one."""
+        if self.stop_reason:
+            return self.stop_reason
+        return self.rejected.most_common(1)[0][0] if self.rejected else None
@@ -0,0 +1,206 @@
+"""
+Face worker pool
+----------------
+Runs the face pipeline (decode + HOG detection + encoding) in a pool of
+worker processes instead of inside Flask request threads, so one slow
+image doesn't tie up a request thread and concurrent door terminals
+aren't serialised by the GIL.
+
+  - bounded: at most `max_pending` images queued or in flight; beyond
+    that submit() raises FaceWorkerBusy (→ 429) instead of queueing
+  - per-request timeout: FaceWorkerTimeout (→ 503)
+  - warm-up: every worker loads the dlib models at startup, so the first
+    request doesn't pay for it
+  - detection cache: results are kept in a small LRU keyed by the image
+    hash, so a re-submitted frame (double click, client retry) is free
+
+workers=0 runs the pipeline inline in the calling thread (handy when
+debugging), still with the same back-pressure limit.
+"""
+
+import os
+import time
+import hashlib
+import threading
+import collections
+import concurrent.futures as futures
+
+import numpy as np
+
+import metrics
+import face_pipeline
+from face_quality import FrameRejected
+
+
+class FaceWorkerBusy(Exception):
+    """Too many images already queued — caller should retry later."""
+
+
+class FaceWorkerTimeout(Exception):
+    """The image was not processed within the timeout."""
+
+
+def _init_worker() -> None:
+    # Runs once in each worker process
+    face_pipeline.warm_up()
+
+
+def _embed_job(image_bytes: bytes, options: face_pipeline.DetectionOptions):
+    # Stage timings recorded in a worker process would stay there: send them back with the result
+    with metrics.captured() as observations:
+        try:
+            result = face_pipeline.embed_image(image_bytes, options)
+        except (face_pipeline.ImageDecodeError, FrameRejected) as e:
+            result = e
+    return result, observations
+
+
+def _ping() -> int:
+    # Long enough that concurrent pings land on different processes
+    time.sleep(0.2)
+    return os.getpid()
+
+
+class FaceWorkerPool:
+    def __init__(self, workers: int, max_pending: int, timeout: float, cache_size: int = 64):
+        self.workers     = workers
+        self.max_pending = max_pending
+        self.timeout     = timeout
+        self.cache_size  = cache_size
+        self._cache      = collections.OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._slots      = threading.BoundedSemaphore(max_pending)
+        self._executor   = None
+        self._start_lock = threading.Lock()
+
+    def start(self) -> None:
+        """Create the worker processes and block until each has warmed up."""
+        with self._start_lock:
+            if self._executor is not None:
+                return
+            if self.workers <= 0:
+                face_pipeline.warm_up()
+                self._executor = False   # inline mode
+                print('[face_worker] Running inline (FACE_WORKERS=0)')
+                return
+            self._executor = futures.ProcessPoolExecutor(
+                max_workers=self.workers, initializer=_init_worker
+            )
+            # Processes are spawned on demand and run the initializer first,
+            # so keep every worker busy once and wait for all of them.
+            pids = {f.result() for f in [self._executor.submit(_ping) for _ in range(self.workers)]}
+            print(f'[face_worker] {len(pids)} worker(s) ready')
+
+    def shutdown(self, wait: bool = False) -> None:
+        """Stop the workers; wait=True blocks until they have exited (before the process exits)."""
+        with self._start_lock:
+            if self._executor:
+                self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
+
+    def _run(self, fn, *args):
+        """Run fn(*args) in a worker, enforcing the queue limit and timeout."""
+        if self._executor is None:
+            self.start()
+        if not self._slots.acquire(blocking=False):
+            raise FaceWorkerBusy()
+
+        if self._executor is False:
+            try:
+                return fn(*args)
+            finally:
+                self._slots.release()
+
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        # The slot is held until the worker is actually done with the image,
+        # not just until this request gives up on it.
+        future.add_done_callback(lambda _f: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except futures.TimeoutError:
+            future.cancel()
+            raise FaceWorkerTimeout() from None
+
+    def embed(self, image_bytes: bytes,
+              options: face_pipeline.DetectionOptions | None = None) -> np.ndarray | None:
+        """
+        Image bytes → embedding (None if no face).
+        Raises ImageDecodeError, FrameRejected, FaceWorkerBusy or FaceWorkerTimeout.
+        """
+        options = options or face_pipeline.DetectionOptions()
+        key = (hashlib.sha1(image_bytes).digest(), options)
+        with self._cache_lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        embedding = self._unpack(self._run(_embed_job, image_bytes, options))
+        if isinstance(embedding, Exception):
+            raise embedding
+
+        if self.cache_size > 0:
+            with self._cache_lock:
+                self._cache[key] = embedding
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return embedding
+
+    def embed_many(self, images, options: face_pipeline.DetectionOptions | None = None):
+        """
+        Embed an iterable of image bytes, yielding results in order: an
+        embedding, None (no face) or the ImageDecodeError / FrameRejected /
+        FaceWorkerTimeout for that image — one slow image doesn't cost the
+        results of the others.
+
+        Closing the generator early cancels the images not yet started.
+        Batches wait for a free slot instead of failing with FaceWorkerBusy,
+        and keep at most `workers` images in flight — enough to keep every
+        core busy while leaving the rest of the queue to interactive requests.
+        Raises FaceWorkerTimeout if no worker frees up within the timeout.
+        """
+        if self._executor is None:
+            self.start()
+        options = options or face_pipeline.DetectionOptions()
+
+        if self._executor is False:
+            for data in images:
+                try:
+                    yield face_pipeline.embed_image(data, options)
+                except (face_pipeline.ImageDecodeError, FrameRejected) as e:
+                    yield e
+            return
+
+        window = collections.deque()
+        try:
+            for data in images:
+                if not self._slots.acquire(timeout=self.timeout):
+                    raise FaceWorkerTimeout()
+                future = self._executor.submit(_embed_job, data, options)
+                future.add_done_callback(lambda _f: self._slots.release())
+                window.append(future)
+                if len(window) >= self.workers:
+                    yield self._batch_result(window.popleft())
+            while window:
+                yield self._batch_result(window.popleft())
+        finally:
+            # A caller that stops early (streamed auth) doesn't wait for queued images
+            for future in window:
+                future.cancel()
+
+    @staticmethod
+    def _unpack(reply):
+        """(result, stage timings) from _embed_job → result, with the timings recorded here."""
+        result, observations = reply
+        metrics.replay(observations)
+        return result
+
+    def _batch_result(self, future):
+        try:
+            return self._unpack(future.result(timeout=self.timeout))
+        except futures.TimeoutError:
+            future.cancel()
+            return FaceWorkerTimeout()
@@ -0,0 +1,207 @@
+"""
+Latency metrics
+---------------
+Histograms and counters for the hot paths — face pipeline stages, gallery
+matching, SQLite transactions, serial reads / writes, HTTP routes —
+rendered at GET /metrics in the Prometheus text format (p50 / p95 / p99
+via histogram_quantile), or as JSON with those quantiles estimated here
+(GET /metrics?format=json).
+
+    with metrics.timer('face_stage_seconds', stage='detect'):
+        locations = face_recognition.face_locations(...)
+
+Metrics are declared once at import time by the module that owns them;
+a series appears on first observation. METRICS=0 turns every timer into
+a shared no-op context manager and every observation into a return.
+
+Processes: face worker processes record into a capture list that is
+shipped back with their result (captured / replay); in production mode
+each web worker pushes its snapshot to the gateway, which serves the sum
+(snapshot / merge).
+"""
+
+import os
+import time
+import bisect
+import threading
+import contextlib
+
+ENABLED = os.environ.get('METRICS', '1') != '0'
+
+# Upper bounds in seconds, from a cache hit to a slow CNN detection
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+           0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUANTILES = (0.5, 0.95, 0.99)
+
+_meta    = {}   # name → (type, help)
+_series  = {}   # name → {label string → [bucket counts…, sum, count]} or [value]
+_lock    = threading.Lock()
+_local   = threading.local()   # .capture: observation list while captured() is active
+_NULL    = contextlib.nullcontext()
+
+
+def histogram(name: str, help: str) -> None:
+    _meta[name] = ('histogram', help)
+
+
+def counter(name: str, help: str) -> None:
+    _meta[name] = ('counter', help)
+
+
+def _labels(labels: dict) -> str:
+    return ','.join(f'{k}="{v}"' for k, v in sorted(labels.items()))
+
+
+def _record(name: str, key: str, value: float) -> None:
+    capture = getattr(_local, 'capture', None)
+    if capture is not None:
+        capture.append((name, key, value))
+        return
+    with _lock:
+        series = _series.setdefault(name, {})
+        if _meta[name][0] == 'counter':
+            series.setdefault(key, [0.0])[0] += value
+            return
+        cells = series.get(key)
+        if cells is None:
+            cells = series[key] = [0] * len(BUCKETS) + [0.0, 0]
+        i = bisect.bisect_left(BUCKETS, value)
+        if i < len(BUCKETS):
+            cells[i] += 1   # the +Inf bucket is the count
+        cells[-2] += value
+        cells[-1] += 1
+
+
+def observe(name: str, value: float, **labels) -> None:
+    if ENABLED:
+        _record(name, _labels(labels), value)
+
+
+def inc(name: str, amount: float = 1, **labels) -> None:
+    if ENABLED:
+        _record(name, _labels(labels), amount)
+
+
+class _Timer:
+    __slots__ = ('name', 'key', 'start')
+
+    def __init__(self, name: str, key: str):
+        self.name = name
+        self.key  = key
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *_exc):
+        _record(self.name, self.key, time.perf_counter() - self.start)
+
+
+def timer(name: str, **labels):
+    """Context manager observing its duration in seconds; a no-op when disabled."""
+    if not ENABLED:
+        return _NULL
+    return _Timer(name, _labels(labels))
+
+
+# ---------------------------------------------------------------------------
+# Across processes
+# ---------------------------------------------------------------------------
+@contextlib.contextmanager
+def captured():
+    """
+    Collect this thread's observations into the yielded list instead of
+    recording them, for a worker process to return with its result.
+    """
+    _local.capture = []
+    try:
+        yield _local.capture
+    finally:
+        _local.capture = None
+
+
+def replay(observations) -> None:
+    """Record observations collected by captured() in another process."""
+    for name, key, value in observations:
+        _record(name, key, value)
+
+
+def snapshot() -> dict:
+    with _lock:
+        return {name: {key: list(cells) for key, cells in series.items()}
+                for name, series in _series.items()}
+
+
+def merge(*snapshots) -> dict:
+    """Sum of several snapshots (histogram cells and counters add up)."""
+    total = {}
+    for snap in snapshots:
+        for name, series in snap.items():
+            into = total.setdefault(name, {})
+            for key, cells in series.items():
+                if key in into:
+                    into[key] = [a + b for a, b in zip(into[key], cells)]
+                else:
+                    into[key] = list(cells)
+    return total
+
+
+# ---------------------------------------------------------------------------
+# Output
+# ---------------------------------------------------------------------------
+def _le(key: str, bound: str) -> str:
+    return '{' + (f'{key},' if key else '') + f'le="{bound}"' + '}'
+
+
+def render(snap: dict) -> str:
+    """Prometheus text exposition format (version 0.0.4)."""
+    out = []
+    for name in sorted(snap):
+        kind, help = _meta.get(name, ('untyped', ''))
+        out.append(f'# HELP {name} {help}')
+        out.append(f'# TYPE {name} {kind}')
+        for key, cells in sorted(snap[name].items()):
+            labels = '{' + key + '}' if key else ''
+            if kind != 'histogram':
+                out.append(f'{name}{labels} {cells[0]:g}')
+                continue
+            cumulative = 0
+            for bound, n in zip(BUCKETS, cells):
+                cumulative += n
+                out.append(f'{name}_bucket{_le(key, repr(bound))} {cumulative}')
+            out.append(f'{name}_bucket{_le(key, "+Inf")} {cells[-1]}')
+            out.append(f'{name}_sum{labels} {cells[-2]:.6f}')
+            out.append(f'{name}_count{labels} {cells[-1]}')
+    return '\n'.join(out) + '\n'
+
+
+def quantile(cells: list, q: float) -> float | None:
+    """Estimate like Prometheus' histogram_quantile: linear within the bucket."""
+    count = cells[-1]
+    if not count:
+        return None
+    rank, cumulative, lower = q * count, 0, 0.0
+    for bound, n in zip(BUCKETS, cells):
+        if n and cumulative + n >= rank:
+            return lower + (bound - lower) * (rank - cumulative) / n
+        cumulative += n
+        lower = bound
+    return BUCKETS[-1]   # in the +Inf bucket: the highest finite bound, as Prometheus does
+
+
+def summarize(snap: dict) -> dict:
+    """{name: {labels: {count, mean_ms, p50_ms, p95_ms, p99_ms} or value}}"""
+    out = {}
+    for name, series in sorted(snap.items()):
+        if _meta.get(name, ('',))[0] != 'histogram':
+            out[name] = {key: cells[0] for key, cells in series.items()}
+            continue
+        out[name] = {}
+        for key, cells in series.items():
+            count = cells[-1]
+            row = {'count': count, 'mean_ms': round(cells[-2] / count * 1000, 3) if count else None}
+            for q in QUANTILES:
+                value = quantile(cells, q)
+                row[f'p{round(q * 100)}_ms'] = None if value is None else round(value * 1000, 3)
+            out[name][key] = row
+    return out
@@ -0,0 +1,105 @@
+"""
+Subsystem readiness
+-------------------
+The slow parts of startup — loading the face models into the worker
+processes, decoding the embedding gallery — run on background threads
+after the server is already answering, so sensor / device routes and
+/health are up straight away after a restart.
+
+Each subsystem moves pending → loading → ready (or failed). Routes that
+need one wait for it for a bounded time (wait), and /health reports
+every subsystem's state (report).
+
+    readiness.run('gallery', load_face_gallery)
+    if not readiness.wait(('gallery',), timeout=10): ...
+"""
+
+import time
+import datetime
+import threading
+
+
+class Readiness:
+    def __init__(self, *names: str):
+        self._cond  = threading.Condition()
+        self._items = {name: {'state': 'pending', 'started': None, 'seconds': None, 'error': None}
+                       for name in names}
+
+    def mark(self, name: str, state: str, error: str | None = None) -> None:
+        with self._cond:
+            item = self._items.setdefault(name, {'state': 'pending', 'started': None, 'seconds': None,
+                                                 'error': None})
+            if state == 'loading':
+                item['started'] = time.time()
+            elif item['started'] is not None:
+                item['seconds'] = round(time.time() - item['started'], 3)
+            item['state'], item['error'] = state, error
+            self._cond.notify_all()
+
+    def run(self, name: str, load, background: bool = True) -> None:
+        """
+        Run load() for subsystem name — on its own thread unless
+        background=False, in which case a failure is raised to the caller.
+        """
+        def target():
+            self.mark(name, 'loading')
+            try:
+                load()
+            except Exception as e:
+                print(f'[startup] {name} failed: {e}')
+                self.mark(name, 'failed', str(e))
+                if not background:
+                    raise
+                return
+            self.mark(name, 'ready')
+            print(f'[startup] {name} ready in {self._items[name]["seconds"]} s')
+
+        if background:
+            threading.Thread(target=target, daemon=True, name=f'warm-up-{name}').start()
+        else:
+            target()
+
+    def ready(self, names=None) -> bool:
+        with self._cond:
+            return all(self._items[n]['state'] == 'ready' for n in names or self._items)
+
+    def failed(self, names=None) -> str | None:
+        """The error of the first failed subsystem among names, if any."""
+        with self._cond:
+            for n in names or self._items:
+                if self._items[n]['state'] == 'failed':
+                    return f'{n}: {self._items[n]["error"]}'
+        return None
+
+    def wait(self, names, timeout: float) -> bool:
+        """Block until every subsystem in names is ready (True), one failed or timeout passed (False)."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                states = [self._items[n]['state'] for n in names]
+                if all(s == 'ready' for s in states):
+                    return True
+                left = deadline - time.monotonic()
+                if 'failed' in states or left <= 0:
+                    return False
+                self._cond.wait(left)
+
+    def version(self) -> tuple:
+        """Changes whenever a subsystem changes state (and only then)."""
+        with self._cond:
+            return tuple(item['state'] for item in self._items.values())
+
+    def report(self) -> dict:
+        """name → {state, since, seconds, error}: `since` while loading, `seconds` it took once done."""
+        with self._cond:
+            out = {}
+            for name, item in self._items.items():
+                row = {'state': item['state']}
+                if item['state'] == 'loading':
+                    row['since'] = datetime.datetime.utcfromtimestamp(item['started']).isoformat()
+                elif item['seconds'] is not None:
+                    row['seconds'] = item['seconds']
+                if item['error']:
+                    row['error'] = item['error']
+                out[name] = row
+            return out
@@ -0,0 +1,332 @@
+"""
+Sensor history store
+--------------------
+Append-only, compact on-disk time series of ESP readings, with automatic
+1-minute and 1-hour rollups so long-range queries never scan raw samples.
+
+Layout (HISTORY_DIR):
+  raw-YYYYMMDD.bin   one 17-byte record per packet  (ts, temp, hum, motion)
+  rollup-1m.bin      one record per closed minute   (count / min / max / sum)
+  rollup-1h.bin      one record per closed hour
+
+Writes are buffered in memory and flushed by a background thread every
+`flush_interval` seconds — the serial reader never waits on disk. Rollups
+are accumulated incrementally as samples arrive; a bucket is written once
+it closes. On startup the open buckets are rebuilt from the raw segments,
+so a restart loses at most the last unflushed interval.
+
+Queries memory-map the rollup files and binary-search the time range, so
+a month at 1-hour resolution is ~720 rows and answers in well under a ms.
+"""
+
+import os
+import time
+import datetime
+import threading
+
+import numpy as np
+
+RAW_DTYPE = np.dtype([
+    ('ts',     '<f8'),
+    ('temp',   '<f4'),   # NaN when unknown
+    ('hum',    '<f4'),
+    ('motion', 'u1'),
+])
+
+ROLLUP_DTYPE = np.dtype([
+    ('start',    '<f8'),
+    ('samples',  '<u4'),
+    ('t_count',  '<u4'), ('t_min', '<f4'), ('t_max', '<f4'), ('t_sum', '<f4'),
+    ('h_count',  '<u4'), ('h_min', '<f4'), ('h_max', '<f4'), ('h_sum', '<f4'),
+    ('motion',   '<u4'),   # samples with motion detected
+])
+
+# name → bucket width in seconds
+LEVELS = {'1m': 60, '1h': 3600}
+
+RESOLUTIONS = ('raw',) + tuple(LEVELS)
+
+# 'auto' picks the finest resolution that returns at most this many points
+AUTO_MAX_POINTS = 1500
+
+
+class _Bucket:
+    """Running aggregate for one open rollup bucket."""
+
+    __slots__ = ('start', 'samples', 't', 'h', 'motion')
+
+    def __init__(self, start: float):
+        self.start   = start
+        self.samples = 0
+        self.t       = [0, np.inf, -np.inf, 0.0]   # count, min, max, sum
+        self.h       = [0, np.inf, -np.inf, 0.0]
+        self.motion  = 0
+
+    @staticmethod
+    def _add(acc: list, value: float) -> None:
+        if value != value:   # NaN — reading unknown
+            return
+        acc[0] += 1
+        acc[1]  = min(acc[1], value)
+        acc[2]  = max(acc[2], value)
+        acc[3] += value
+
+    def add(self, temp: float, hum: float, motion: int) -> None:
+        self.samples += 1
+        self._add(self.t, temp)
+        self._add(self.h, hum)
+        self.motion += motion
+
+    def record(self) -> tuple:
+        t, h = self.t, self.h
+        return (
+            self.start, self.samples,
+            t[0], t[1] if t[0] else np.nan, t[2] if t[0] else np.nan, t[3],
+            h[0], h[1] if h[0] else np.nan, h[2] if h[0] else np.nan, h[3],
+            self.motion,
+        )
+
+
+class SensorHistory:
+    def __init__(self, directory: str, flush_interval: float = 5.0):
+        self.directory      = directory
+        self.flush_interval = flush_interval
+        self._lock          = threading.Lock()
+        self._flush_lock    = threading.Lock()
+        self._raw_pending   = []                         # RAW records not yet on disk
+        self._roll_pending  = {name: [] for name in LEVELS}
+        self._raw_flushing  = []                         # taken by flush(), until written
+        self._roll_flushing = {name: [] for name in LEVELS}
+        self._durable       = {}                         # path → bytes queries may read
+        self._open          = {name: None for name in LEVELS}   # name → _Bucket
+        self._closed_until  = {name: 0.0 for name in LEVELS}    # end of last bucket on disk
+        self._flusher       = None
+        os.makedirs(directory, exist_ok=True)
+        self._recover()
+
+    # ------------------------------------------------------------------
+    # Paths
+    # ------------------------------------------------------------------
+    def _raw_path(self, ts: float) -> str:
+        day = datetime.datetime.utcfromtimestamp(ts).strftime('%Y%m%d')
+        return os.path.join(self.directory, f'raw-{day}.bin')
+
+    def _rollup_path(self, name: str) -> str:
+        return os.path.join(self.directory, f'rollup-{name}.bin')
+
+    # ------------------------------------------------------------------
+    # Writing
+    # ------------------------------------------------------------------
+    def start(self) -> None:
+        """Start the background flush thread."""
+        if self._flusher:
+            return
+        self._flusher = threading.Thread(target=self._flush_loop, daemon=True, name='history-flush')
+        self._flusher.start()
+
+    def append(self, ts: float, temperature, humidity, motion) -> None:
+        """Record one reading. Cheap — no disk I/O on the caller's thread."""
+        temp = np.nan if temperature is None else float(temperature)
+        hum  = np.nan if humidity    is None else float(humidity)
+        mot  = 1 if motion else 0
+        with self._lock:
+            self._raw_pending.append((ts, temp, hum, mot))
+            self._accumulate(ts, temp, hum, mot)
+
+    def _accumulate(self, ts: float, temp: float, hum: float, motion: int) -> None:
+        # Caller holds the lock
+        for name, width in LEVELS.items():
+            if ts < self._closed_until[name]:
+                continue   # already rolled up (only happens while recovering)
+            start  = ts - ts % width
+            bucket = self._open[name]
+            if bucket is None:
+                bucket = self._open[name] = _Bucket(start)
+            elif start > bucket.start:
+                self._roll_pending[name].append(bucket.record())
+                self._closed_until[name] = bucket.start + width
+                bucket = self._open[name] = _Bucket(start)
+            # A sample older than the open bucket (clock stepped back) is
+            # folded into it rather than reopening a closed bucket
+            bucket.add(temp, hum, motion)
+
+    def _flush_loop(self) -> None:
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except OSError as e:
+                print(f'[history] Flush failed: {e}')
+
+    def _durable_size(self, path: str) -> int:
+        # Caller holds the lock. Bytes of `path` that are written and not
+        # also in memory: queries read this far and take the rest from the
+        # pending and flushing lists, so no sample is missed or doubled.
+        if path not in self._durable:
+            self._durable[path] = os.path.getsize(path) if os.path.exists(path) else 0
+        return self._durable[path]
+
+    def flush(self) -> None:
+        """Write buffered raw samples and closed rollup buckets to disk."""
+        with self._flush_lock:   # one batch in flight at a time
+            self._flush()
+
+    def _flush(self) -> None:
+        with self._lock:
+            raw, self._raw_pending = self._raw_pending, []
+            rollups, self._roll_pending = self._roll_pending, {name: [] for name in LEVELS}
+            self._raw_flushing, self._roll_flushing = raw, rollups
+
+        writes = []   # (path, bytes)
+        if raw:
+            records = np.array(raw, dtype=RAW_DTYPE)
+            # Split by UTC day so each segment file holds one day
+            days = (records['ts'] // 86400).astype(np.int64)
+            for day in np.unique(days):
+                part = records[days == day]
+                writes.append((self._raw_path(float(part['ts'][0])), part.tobytes()))
+        for name, pending in rollups.items():
+            if pending:
+                writes.append((self._rollup_path(name), np.array(pending, dtype=ROLLUP_DTYPE).tobytes()))
+        if not writes:
+            with self._lock:
+                self._raw_flushing, self._roll_flushing = [], {name: [] for name in LEVELS}
+            return
+
+        with self._lock:
+            for path, _data in writes:
+                self._durable_size(path)   # pin the size from before this write
+        try:
+            for path, data in writes:
+                with open(path, 'ab') as f:
+                    f.write(data)
+        finally:
+            # Visible on disk and gone from the flushing lists in one step.
+            # (After a failed write that is whatever made it to disk.)
+            with self._lock:
+                for path, _data in writes:
+                    self._durable[path] = os.path.getsize(path) if os.path.exists(path) else 0
+                self._raw_flushing, self._roll_flushing = [], {name: [] for name in LEVELS}
+
+    # ------------------------------------------------------------------
+    # Recovery
+    # ------------------------------------------------------------------
+    def _recover(self) -> None:
+        """Rebuild the open buckets from raw samples newer than the last rollup."""
+        for name, width in LEVELS.items():
+            rows = self._load_rollup(name)
+            if len(rows):
+                self._closed_until[name] = float(rows['start'][-1]) + width
+        since = min(self._closed_until.values())
+
+        segments = sorted(f for f in os.listdir(self.directory) if f.startswith('raw-'))
+        replayed = 0
+        for segment in segments[-2:]:   # an hour of data spans at most two days
+            records = np.fromfile(os.path.join(self.directory, segment), dtype=RAW_DTYPE)
+            for r in records[records['ts'] >= since]:
+                self._accumulate(float(r['ts']), float(r['temp']), float(r['hum']), int(r['motion']))
+                replayed += 1
+        if replayed:
+            print(f'[history] Replayed {replayed} sample(s) into open rollups')
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+    def _load_rollup(self, name: str, size: int | None = None) -> np.ndarray:
+        path = self._rollup_path(name)
+        if size is None:
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+        if size < ROLLUP_DTYPE.itemsize:
+            return np.empty(0, dtype=ROLLUP_DTYPE)
+        return np.memmap(path, dtype=ROLLUP_DTYPE, mode='r', shape=(size // ROLLUP_DTYPE.itemsize,))
+
+    def _load_raw(self, start: float, end: float) -> np.ndarray:
+        day   = start - start % 86400
+        paths = []
+        while day <= end:
+            paths.append(self._raw_path(day))
+            day += 86400
+        with self._lock:
+            sizes   = [self._durable_size(path) for path in paths]
+            pending = np.array(self._raw_flushing + self._raw_pending, dtype=RAW_DTYPE)
+
+        parts = []
+        for path, size in zip(paths, sizes):
+            if size >= RAW_DTYPE.itemsize:
+                records = np.fromfile(path, dtype=RAW_DTYPE, count=size // RAW_DTYPE.itemsize)
+                parts.append(records[(records['ts'] >= start) & (records['ts'] <= end)])
+        parts.append(pending[(pending['ts'] >= start) & (pending['ts'] <= end)])
+        return np.concatenate(parts)
+
+    @staticmethod
+    def pick_resolution(start: float, end: float) -> str:
+        span = max(end - start, 0.0)
+        # Packets arrive every ~2 s
+        if span / 2 <= AUTO_MAX_POINTS:
+            return 'raw'
+        for name, width in LEVELS.items():
+            if span / width <= AUTO_MAX_POINTS:
+                return name
+        return list(LEVELS)[-1]
+
+    def query(self, start: float, end: float, resolution: str = 'auto') -> tuple[str, list]:
+        """Return (resolution, points) for readings with start <= t <= end."""
+        if resolution == 'auto':
+            resolution = self.pick_resolution(start, end)
+        if resolution == 'raw':
+            return resolution, _raw_points(self._load_raw(start, end))
+
+        width = LEVELS[resolution]
+        # Buckets closed but not yet written, and the one still open
+        with self._lock:
+            size  = self._durable_size(self._rollup_path(resolution))
+            extra = self._roll_flushing[resolution] + self._roll_pending[resolution]
+            if self._open[resolution] is not None:
+                extra.append(self._open[resolution].record())
+
+        rows = self._load_rollup(resolution, size)
+        lo = int(np.searchsorted(rows['start'], start - width, side='right'))
+        hi = int(np.searchsorted(rows['start'], end, side='right'))
+        selected = rows[lo:hi]
+        extra = [r for r in extra if start - width < r[0] <= end]
+        if extra:
+            selected = np.concatenate([selected, np.array(extra, dtype=ROLLUP_DTYPE)])
+        return resolution, _rollup_points(selected)
+
+
+# Points are built column-wise: one vectorized pass per field, then a
+# single zip — per-row Python work is what dominates large responses.
+
+def _iso(ts: np.ndarray) -> list:
+    return np.datetime_as_string(ts.astype('datetime64[s]')).tolist()
+
+
+def _rounded(values: np.ndarray, digits: int = 1) -> list:
+    values = np.round(values.astype(np.float64), digits)
+    return [None if v != v else v for v in values.tolist()]   # NaN → null
+
+
+def _raw_points(records: np.ndarray) -> list:
+    columns = zip(_iso(records['ts']), _rounded(records['temp']),
+                  _rounded(records['hum']), (records['motion'] > 0).tolist())
+    return [{'t': t, 'temperature': temp, 'humidity': hum, 'motion': motion}
+            for t, temp, hum, motion in columns]
+
+
+def _stats(rows: np.ndarray, prefix: str) -> list:
+    count = rows[f'{prefix}_count']
+    with np.errstate(invalid='ignore', divide='ignore'):
+        avg = rows[f'{prefix}_sum'].astype(np.float64) / count
+    columns = zip(count.tolist(), _rounded(rows[f'{prefix}_min']),
+                  _rounded(rows[f'{prefix}_max']), _rounded(avg, 2))
+    return [{'min': lo, 'max': hi, 'avg': mean} if n else None for n, lo, hi, mean in columns]
+
+
+def _rollup_points(rows: np.ndarray) -> list:
+    samples = rows['samples']
+    with np.errstate(invalid='ignore', divide='ignore'):
+        motion = rows['motion'] / samples   # fraction of samples with motion
+    columns = zip(_iso(rows['start']), samples.tolist(), _stats(rows, 't'),
+                  _stats(rows, 'h'), _rounded(motion, 3))
+    return [{'t': t, 'samples': n, 'temperature': temp, 'humidity': hum, 'motion': motion}
+            for t, n, temp, hum, motion in columns]
@@ -0,0 +1,136 @@
+"""
+Session caches
+--------------
+Dashboards check their session on every page load and poll, and each
+check used to cost an HMAC verification plus a users-table read.
+
+  TokenCache      verified JWT payloads, keyed by a hash of the token
+                  (the token itself is never stored), dropped at `exp`
+  ProfileCache    user profiles for /auth/me, invalidated by the routes
+                  that change them
+  RevocationList  ids (jti) of tokens revoked before they expire —
+                  checked on every request, cached or not
+
+All three are bounded or self-pruning and safe to share between threads.
+"""
+
+import time
+import hashlib
+import threading
+import collections
+
+
+def token_key(token: str) -> bytes:
+    return hashlib.blake2b(token.encode('utf-8'), digest_size=16).digest()
+
+
+class TokenCache:
+    """Bounded LRU of token hash → (payload, exp)."""
+
+    def __init__(self, maxsize: int = 4096):
+        self.maxsize  = maxsize
+        self._entries = collections.OrderedDict()
+        self._lock    = threading.Lock()
+
+    def get(self, token: str) -> dict | None:
+        key = token_key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            payload, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return payload
+
+    def put(self, token: str, payload: dict) -> None:
+        if self.maxsize <= 0:
+            return
+        expires_at = float(payload.get('exp', 0))
+        with self._lock:
+            self._entries[token_key(token)] = (payload, expires_at)
+            self._entries.move_to_end(token_key(token))
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def discard(self, token: str) -> None:
+        with self._lock:
+            self._entries.pop(token_key(token), None)
+
+
+class ProfileCache:
+    """
+    Bounded LRU of user id → profile.
+
+    invalidate() bumps a generation counter, and a load that started
+    before an invalidation is not stored — so a request reading the old
+    row while another one updates it can't put stale data back.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize     = maxsize
+        self._entries    = collections.OrderedDict()
+        self._generation = 0
+        self._lock       = threading.Lock()
+
+    def get(self, user_id: str, load) -> dict | None:
+        """Cached profile, or load(user_id) on a miss (None results aren't cached)."""
+        with self._lock:
+            if user_id in self._entries:
+                self._entries.move_to_end(user_id)
+                return self._entries[user_id]
+            generation = self._generation
+
+        profile = load(user_id)
+        if profile is not None and self.maxsize > 0:
+            with self._lock:
+                if generation == self._generation:
+                    self._entries[user_id] = profile
+                    while len(self._entries) > self.maxsize:
+                        self._entries.popitem(last=False)
+        return profile
+
+    def invalidate(self, user_id: str | None = None) -> None:
+        """Drop one user's profile, or every profile when user_id is None."""
+        with self._lock:
+            self._generation += 1
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+
+class RevocationList:
+    """jti → exp of revoked tokens. Entries prune themselves once expired."""
+
+    PRUNE_EVERY = 256   # revocations between sweeps of expired entries
+
+    def __init__(self):
+        self._revoked = {}
+        self._lock    = threading.Lock()
+        self._adds    = 0
+
+    def __contains__(self, jti) -> bool:
+        return jti in self._revoked
+
+    def __len__(self) -> int:
+        return len(self._revoked)
+
+    def revoke(self, jti: str, expires_at: float) -> None:
+        with self._lock:
+            self._revoked[jti] = expires_at
+            self._adds += 1
+            if self._adds % self.PRUNE_EVERY == 0:
+                self._prune()
+
+    def load(self, entries) -> None:
+        """entries: iterable of (jti, expires_at) — e.g. from the database at startup."""
+        with self._lock:
+            self._revoked = dict(entries)
+            self._prune()
+
+    def _prune(self) -> None:
+        now = time.time()
+        self._revoked = {j: exp for j, exp in self._revoked.items() if exp > now}
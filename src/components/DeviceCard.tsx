@@ -6,11 +6,12 @@ import { cn } from '@/utils/cn';
 interface DeviceCardProps {
   device: Device;
   icon?: React.ReactNode;
+  room?: string;
   onToggle: (deviceId: Device['id'], status: Device['status']) => void;
   isLoading?: boolean;
 }
 
-export default function DeviceCard({ device, icon, onToggle, isLoading }: DeviceCardProps) {
+export default function DeviceCard({ device, icon, room, onToggle, isLoading }: DeviceCardProps) {
   const isOn = device.status === 'on';
 
   const handleToggle = (): void => {
@@ -22,6 +23,9 @@ export default function DeviceCard({ device, icon, onToggle, isLoading }: Device
     <div className="bg-card text-card-foreground rounded-xl border border-border p-6 shadow-lg transition-all hover:shadow-xl">
       <div className="flex items-center justify-between">
         <div className="flex-1">
+          {room && (
+            <p className="text-xs uppercase tracking-wide text-muted-foreground">{room}</p>
+          )}
           <h3 className="text-lg font-semibold mb-2">{device.name}</h3>
           <div className="flex items-center gap-2">
             <div
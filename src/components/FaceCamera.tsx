@@ -3,23 +3,29 @@ import { Camera, X } from 'lucide-react';
 import { useCamera } from '@/hooks/useCamera';
 import Button from './Button';
 import { cn } from '@/utils/cn';
+import { FACE_BURST } from '@/utils/constants';
 
 interface FaceCameraProps {
-  onCapture: (image: Blob) => void;
+  onCapture?: (image: Blob) => void;
+  onCaptureBurst?: (frames: Blob[]) => void;   // set: the button captures FACE_BURST.FRAMES frames
   onClose?: () => void;
   showPreview?: boolean;
   capturedImage?: string | null;
+  hint?: string | null;   // why the last capture was rejected, e.g. too dark
 }
 
 export default function FaceCamera({
   onCapture,
+  onCaptureBurst,
   onClose,
   showPreview = false,
   capturedImage,
+  hint,
 }: FaceCameraProps) {
   const { videoRef, isStreaming, error, startCamera, stopCamera, captureImage } =
     useCamera();
   const [captureError, setCaptureError] = useState<string | null>(null);
+  const [isCapturing, setIsCapturing] = useState(false);
 
   useEffect(() => {
     if (!showPreview) {
@@ -30,16 +36,30 @@ export default function FaceCamera({
     };
   }, [showPreview, startCamera, stopCamera]);
 
-  const handleCapture = useCallback((): void => {
+  const handleCapture = useCallback(async (): Promise<void> => {
     setCaptureError(null);
     const imageBlob = captureImage();
-    if (imageBlob) {
-      onCapture(imageBlob);
-    } else {
+    if (!imageBlob) {
       // Camera stream exists but frame isn't ready yet — give the user feedback
       setCaptureError('Camera is not ready yet. Please wait a moment and try again.');
+      return;
     }
-  }, [captureImage, onCapture]);
+    if (!onCaptureBurst) {
+      onCapture?.(imageBlob);
+      return;
+    }
+    // A few frames a moment apart, so one blurred by movement isn't the only chance
+    setIsCapturing(true);
+    const frames = [imageBlob];
+    while (frames.length < FACE_BURST.FRAMES) {
+      await new Promise((resolve) => setTimeout(resolve, FACE_BURST.INTERVAL_MS));
+      const frame = captureImage();
+      if (!frame) break;
+      frames.push(frame);
+    }
+    setIsCapturing(false);
+    onCaptureBurst(frames);
+  }, [captureImage, onCapture, onCaptureBurst]);
 
   if (error) {
     return (
@@ -98,10 +118,13 @@ export default function FaceCamera({
       </div>
       {isStreaming && (
         <div className="mt-4 flex flex-col items-center gap-2">
-          <Button onClick={handleCapture} size="lg" className="gap-2">
+          <Button onClick={handleCapture} size="lg" className="gap-2" disabled={isCapturing}>
             <Camera className="h-5 w-5" />
-            Capture Face
+            {isCapturing ? 'Hold still…' : 'Capture Face'}
           </Button>
+          {hint && !captureError && (
+            <p className="text-sm text-amber-600 dark:text-amber-400 text-center">{hint}</p>
+          )}
           {captureError && (
             <p className="text-sm text-destructive text-center">{captureError}</p>
           )}
@@ -1,2 +1,4 @@
 export const MOCK_MODE = false;
 export const API_BASE_URL = 'http://localhost:5000';
+// Server-Sent Events push server (app.py EVENTS_PORT)
+export const EVENTS_URL = 'http://localhost:5001';
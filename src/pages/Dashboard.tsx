@@ -6,30 +6,69 @@ import {
 import DeviceCard from '@/components/DeviceCard';
 import SensorCard from '@/components/SensorCard';
 import { useDeviceStore } from '@/store/deviceStore';
+import { deviceService } from '@/services/deviceService';
 import type { DeviceId, DeviceStatus } from '@/types/device.types';
 
-const POLL_INTERVAL_MS = 2000;
+// Wait before re-polling after a failed /state request
+const POLL_RETRY_MS = 2000;
+// Long-poll instead if the event stream hasn't opened by then
+const EVENTS_CONNECT_TIMEOUT_MS = 5000;
 
 export default function Dashboard() {
   const {
     devices, sensors, isLoading,
     lastUpdated, espConnected,
-    fetchDevices, fetchSensors, toggleDevice,
+    fetchState, toggleDevice, applyEvent,
   } = useDeviceStore();
 
   useEffect(() => {
-    // Initial fetch
-    fetchDevices();
-    fetchSensors();
-
-    // Poll every 2 s for live data
-    const interval = setInterval(() => {
-      fetchDevices();
-      fetchSensors();
-    }, POLL_INTERVAL_MS);
+    const abort = new AbortController();
+    let polling: AbortController | null = null;
+
+    // Fallback: long-poll /state — each request is answered at the next change
+    const startPolling = async () => {
+      if (polling || abort.signal.aborted) return;
+      const current = polling = new AbortController();
+      let since: string | undefined;
+      while (!current.signal.aborted && !abort.signal.aborted) {
+        const version = await fetchState(since, current.signal);
+        if (version === null && !current.signal.aborted) {
+          await new Promise((resolve) => setTimeout(resolve, POLL_RETRY_MS));
+        }
+        since = version ?? undefined;
+      }
+    };
+
+    // The event stream is back: its snapshot and updates take over again
+    const stopPolling = () => {
+      polling?.abort();
+      polling = null;
+    };
+
+    // Show the current state straight away, however updates arrive afterwards
+    fetchState(undefined, abort.signal);
+
+    // Prefer pushed updates — the server only sends when something changed.
+    // The events port may be unreachable while EventSource keeps retrying,
+    // so poll from the first error (or a slow connect) until it opens.
+    let connectTimer: ReturnType<typeof setTimeout> | undefined;
+    const unsubscribe = deviceService.subscribe(applyEvent, startPolling, () => {
+      clearTimeout(connectTimer);
+      stopPolling();
+    });
+    if (unsubscribe) {
+      connectTimer = setTimeout(startPolling, EVENTS_CONNECT_TIMEOUT_MS);
+    } else {
+      startPolling();
+    }
 
-    return () => clearInterval(interval);
-  }, [fetchDevices, fetchSensors]);
+    return () => {
+      clearTimeout(connectTimer);
+      unsubscribe?.();
+      stopPolling();
+      abort.abort();
+    };
+  }, [fetchState, applyEvent]);
 
   const handleToggle = async (deviceId: DeviceId, status: DeviceStatus) => {
     try {
@@ -39,6 +78,9 @@ export default function Dashboard() {
     }
   };
 
+  // Ids are "<controller>/<kind>" — the kind picks the icon
+  const kindOf = (id: string) => id.slice(id.lastIndexOf('/') + 1);
+
   // ---- Helpers to pick the right icon per sensor ----
   const sensorIcon = (id: string) => {
     if (id === 'temperature') return <Thermometer className="h-5 w-5 text-orange-500" />;
@@ -53,9 +95,12 @@ export default function Dashboard() {
     return <Activity className="h-6 w-6" />;
   };
 
-  // ---- Motion sensor state for a prominent banner ----
-  const motionSensor  = sensors.find((s) => s.id === 'motion');
-  const motionActive  = motionSensor?.status === 'detected';
+  // ---- Motion sensor state for a prominent banner (any room) ----
+  const motionRooms   = sensors
+    .filter((s) => kindOf(s.id) === 'motion' && s.status === 'detected')
+    .map((s) => s.controllerName ?? s.controller ?? '');
+  const motionActive  = motionRooms.length > 0;
+  const multiRoom     = new Set([...sensors, ...devices].map((d) => d.controller)).size > 1;
 
   return (
     <div className="container mx-auto px-4 py-8 max-w-6xl">
@@ -99,7 +144,7 @@ export default function Dashboard() {
         />
         <span className="font-medium">
           {motionActive
-            ? 'Motion detected — devices will stay on for 10 seconds'
+            ? `Motion detected${multiRoom ? ` in ${motionRooms.join(', ')}` : ''} — devices will stay on for 10 seconds`
             : 'No motion detected'}
         </span>
       </div>
@@ -122,15 +167,17 @@ export default function Dashboard() {
               <div
                 key={sensor.id}
                 className={`bg-card rounded-xl border p-5 shadow-sm transition-all
-                  ${sensor.id === 'motion' && sensor.status === 'detected'
+                  ${kindOf(sensor.id) === 'motion' && sensor.status === 'detected'
                     ? 'border-amber-500/50 bg-amber-500/5'
                     : 'border-border'
                   }`}
               >
                 <div className="flex items-center justify-between mb-3">
                   <div className="flex items-center gap-2">
-                    {sensorIcon(sensor.id)}
-                    <span className="text-sm font-medium text-muted-foreground">{sensor.name}</span>
+                    {sensorIcon(kindOf(sensor.id))}
+                    <span className="text-sm font-medium text-muted-foreground">
+                      {multiRoom && sensor.controllerName ? `${sensor.controllerName} · ` : ''}{sensor.name}
+                    </span>
                   </div>
                   {/* Live dot */}
                   <span className={`w-2 h-2 rounded-full
@@ -169,7 +216,8 @@ export default function Dashboard() {
             <DeviceCard
               key={device.id}
               device={device}
-              icon={deviceIcon(device.id)}
+              icon={deviceIcon(kindOf(device.id))}
+              room={multiRoom ? device.controllerName : undefined}
               onToggle={handleToggle}
               isLoading={isLoading}
             />
@@ -4,18 +4,19 @@ import { ScanFace, UserPlus } from 'lucide-react';
 import Button from '@/components/Button';
 import FaceCamera from '@/components/FaceCamera';
 import { useFaceStore } from '@/store/faceStore';
+import { needsRetake } from '@/services/faceService';
 import { useAuthStore } from '@/store/authStore';
 import { ROUTES } from '@/utils/constants';
 
 export default function FaceRecognition() {
   const navigate = useNavigate();
   const [showCamera, setShowCamera] = useState(false);
-  const { startRecognition, isRecognizing, error } = useFaceStore();
+  const { startRecognition, isRecognizing, error, retakeHint } = useFaceStore();
   const { setAuth } = useAuthStore();
 
-  const handleAuthenticate = async (image: Blob): Promise<void> => {
+  const handleAuthenticate = async (frames: Blob[]): Promise<void> => {
     try {
-      const result = await startRecognition(image);
+      const result = await startRecognition(frames);
       if (result.success && result.authenticated) {
         setAuth(result.user || { id: '1', username: 'user' });
         navigate(ROUTES.DASHBOARD);
@@ -24,6 +25,8 @@ export default function FaceRecognition() {
         setShowCamera(false);
       }
     } catch (err) {
+      // Unusable frame (blurry, dark, too far…): keep the camera open and show why
+      if (needsRetake(err)) return;
       alert(error || 'Failed to authenticate. Please try again.');
       setShowCamera(false);
     }
@@ -42,10 +45,11 @@ export default function FaceRecognition() {
           ) : (
             <>
               <FaceCamera
-                onCapture={handleAuthenticate}
+                onCaptureBurst={handleAuthenticate}
                 onClose={() => setShowCamera(false)}
+                hint={retakeHint}
               />
-              {error && (
+              {error && !retakeHint && (
                 <div className="mt-4 p-4 bg-destructive/10 text-destructive rounded-lg text-center">
                   {error}
                 </div>
@@ -4,6 +4,7 @@ import { CameraIcon, UserPlus, Zap } from "lucide-react";
 import Button from '@/components/Button';
 import FaceCamera from '@/components/FaceCamera';
 import { useFaceStore } from '@/store/faceStore';
+import { needsRetake } from '@/services/faceService';
 import { useAuthStore } from '@/store/authStore';
 import { ROUTES } from '@/utils/constants';
 import { MOCK_MODE } from '@/config/env';
@@ -11,12 +12,12 @@ import { MOCK_MODE } from '@/config/env';
 export default function Landing() {
   const navigate = useNavigate();
   const [showCamera, setShowCamera] = useState(false);
-  const { startRecognition, isRecognizing, error } = useFaceStore();
+  const { startRecognition, isRecognizing, error, retakeHint } = useFaceStore();
   const { setAuth } = useAuthStore();
 
-  const handleFaceRecognition = async (image: Blob): Promise<void> => {
+  const handleFaceRecognition = async (frames: Blob[]): Promise<void> => {
     try {
-      const result = await startRecognition(image);
+      const result = await startRecognition(frames);
       if (result.success && result.authenticated) {
         setAuth(result.user || { id: '1', username: 'user' });
         navigate(ROUTES.DASHBOARD);
@@ -25,6 +26,8 @@ export default function Landing() {
         setShowCamera(false);
       }
     } catch (err) {
+      // Unusable frame (blurry, dark, too far…): keep the camera open and show why
+      if (needsRetake(err)) return;
       alert(error || 'Failed to authenticate. Please try manual login.');
       setShowCamera(false);
     }
@@ -79,11 +82,12 @@ export default function Landing() {
               </div>
             ) : (
               <FaceCamera
-                onCapture={handleFaceRecognition}
+                onCaptureBurst={handleFaceRecognition}
                 onClose={() => setShowCamera(false)}
+                hint={retakeHint}
               />
             )}
-            {error && (
+            {error && !retakeHint && (
               <div className="mt-4 p-4 bg-destructive/10 text-destructive rounded-lg text-center">
                 {error}
               </div>
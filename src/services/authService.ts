@@ -31,7 +31,14 @@ export const authService = {
   },
 
   logout(): void {
+    const token = localStorage.getItem('auth_token');
     localStorage.removeItem('auth_token');
+    // Revoke it server-side too; the local session ends either way
+    if (token && !MOCK_MODE) {
+      api
+        .post('/auth/logout', null, { headers: { Authorization: `Bearer ${token}` } })
+        .catch(() => undefined);
+    }
   },
 
   getToken(): string | null {
@@ -1,12 +1,12 @@
 import api from './api';
 import type {
-  Device,
-  Sensor,
+  DashboardState,
+  StateEvent,
   ToggleDeviceRequest,
   ToggleDeviceResponse,
 } from '@/types/device.types';
-import { MOCK_MODE } from '@/config/env';
-import { mockDevices, mockSensors } from './mockApi';
+import { MOCK_MODE, EVENTS_URL } from '@/config/env';
+import { mockDevices, mockState } from './mockApi';
 
 export const deviceService = {
   async toggleDevice(request: ToggleDeviceRequest): Promise<ToggleDeviceResponse> {
@@ -25,28 +25,42 @@ export const deviceService = {
     }
   },
 
-  async getDevices(): Promise<Device[]> {
+  /**
+   * Sensors, devices, door and ESP liveness in one request. With `since`
+   * (the version of the previous snapshot) the server holds the request
+   * until something changes, so a waiting dashboard costs one open request.
+   */
+  async getState(since?: string, signal?: AbortSignal): Promise<DashboardState> {
     if (MOCK_MODE) {
-      return mockDevices.getDevices();
-    }
-    try {
-      const response = await api.get<Device[]>('/device/list');
-      return response.data;
-    } catch {
-      // Return empty rather than falling back to fake mock data
-      return [];
+      return mockState.getState(since);
     }
+    const response = await api.get<DashboardState>('/state', {
+      params: since ? { since } : undefined,
+      signal,
+    });
+    return response.data;
   },
 
-  async getSensors(): Promise<Sensor[]> {
-    if (MOCK_MODE) {
-      return mockSensors.getSensors();
-    }
-    try {
-      const response = await api.get<Sensor[]>('/sensors');
-      return response.data;
-    } catch {
-      return [];
+  /**
+   * Subscribe to pushed sensor / device changes. onError is called on every
+   * connection error (EventSource keeps retrying on its own), onOpen each
+   * time the stream (re)connects — its first event is a full snapshot.
+   * Returns an unsubscribe function, or null when push isn't available
+   * (mock mode, or no EventSource support) and the caller should poll.
+   */
+  subscribe(
+    onEvent: (event: StateEvent, snapshot: boolean) => void,
+    onError: () => void,
+    onOpen?: () => void
+  ): (() => void) | null {
+    if (MOCK_MODE || typeof EventSource === 'undefined') {
+      return null;
     }
+    const source = new EventSource(`${EVENTS_URL}/events`);
+    source.addEventListener('snapshot', (e: MessageEvent) => onEvent(JSON.parse(e.data), true));
+    source.addEventListener('update', (e: MessageEvent) => onEvent(JSON.parse(e.data), false));
+    source.onopen = () => onOpen?.();
+    source.onerror = () => onError();
+    return () => source.close();
   },
 };
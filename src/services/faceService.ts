@@ -7,6 +7,11 @@ import type {
 import { MOCK_MODE } from '@/config/env';
 import { mockFace } from './mockApi';
 
+/** True for a backend rejection the user can fix by capturing another frame. */
+export function needsRetake(error: unknown): error is { retake: true; message?: string } {
+  return !!error && typeof error === 'object' && 'retake' in error && (error as { retake: unknown }).retake === true;
+}
+
 export const faceService = {
   async authenticate(image: Blob): Promise<FaceAuthenticationResponse> {
     if (MOCK_MODE) {
@@ -37,6 +42,36 @@ export const faceService = {
     }
   },
 
+  /** Face login from a burst of frames, sent as one multipart request. */
+  async authenticateBurst(frames: Blob[]): Promise<FaceAuthenticationResponse> {
+    if (MOCK_MODE) {
+      return mockFace.authenticate(frames[0]);
+    }
+
+    try {
+      const formData = new FormData();
+      frames.forEach((frame, i) => formData.append('frames', frame, `frame${i}.jpg`));
+
+      const response = await api.post<FaceAuthenticationResponse>(
+        '/face/authenticate/stream',
+        formData,
+        {
+          headers: {
+            'Content-Type': 'multipart/form-data',
+          },
+        }
+      );
+
+      return response.data;
+    } catch (error: unknown) {
+      if (error && typeof error === 'object' && 'response' in error) {
+        const axiosError = error as { response?: { data?: FaceAuthenticationResponse } };
+        throw axiosError.response?.data || { success: false, authenticated: false, message: 'Authentication failed' };
+      }
+      throw { success: false, authenticated: false, message: 'Network error' };
+    }
+  },
+
   async register(data: FaceRegistrationRequest): Promise<FaceRegistrationResponse> {
     if (MOCK_MODE) {
       return mockFace.register(data.image, data.username);
@@ -7,6 +7,7 @@ import type {
   FaceRegistrationResponse,
 } from '@/types/face.types';
 import type {
+  DashboardState,
   Device,
   Sensor,
   ToggleDeviceResponse,
@@ -178,6 +179,27 @@ export const mockDevices = {
   },
 };
 
+let mockVersion = 0;
+
+export const mockState = {
+  async getState(since?: string): Promise<DashboardState> {
+    // Stand-in for the long poll: a "change" every couple of seconds
+    if (since) {
+      await delay(2000);
+    }
+    const [devices, sensors] = await Promise.all([mockDevices.getDevices(), mockSensors.getSensors()]);
+    mockVersion += 1;
+    return {
+      version: `mock.${mockVersion}`,
+      sensors,
+      devices,
+      door: { status: 'IDLE', username: null, grantedAt: null },
+      controllers: { main: { connected: true, last_seen: new Date().toISOString() } },
+      espLastSeen: new Date().toISOString(),
+    };
+  },
+};
+
 export const mockSensors = {
   async getSensors(): Promise<Sensor[]> {
     await delay(300);
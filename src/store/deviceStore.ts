@@ -1,5 +1,7 @@
 import { create } from 'zustand';
-import type { Device, Sensor, DeviceId, DeviceStatus } from '@/types/device.types';
+import type {
+  Device, Sensor, DeviceId, DeviceStatus, DoorState, StateEvent,
+} from '@/types/device.types';
 import { deviceService } from '@/services/deviceService';
 
 interface DeviceState {
@@ -8,44 +10,66 @@ interface DeviceState {
   isLoading: boolean;
   lastUpdated: Date | null;
   espConnected: boolean;
-  fetchDevices: () => Promise<void>;
-  fetchSensors: () => Promise<void>;
+  door: DoorState | null;
+  version: number;
+  fetchState: (since?: string, signal?: AbortSignal) => Promise<string | null>;
   toggleDevice: (deviceId: DeviceId, status: DeviceStatus) => Promise<void>;
+  applyEvent: (event: StateEvent, snapshot?: boolean) => void;
 }
 
+// Determine if the ESP is live — if any sensor has a real value it's connected
+const isConnected = (sensors: Sensor[]) =>
+  sensors.some((s) => s.value !== '--' && s.status !== 'inactive');
+
 export const useDeviceStore = create<DeviceState>((set, get) => ({
   devices: [
-    { id: 'fan',    name: 'Fan',    status: 'off' },
-    { id: 'lights', name: 'Lights', status: 'off' },
+    { id: 'main/fan',    name: 'Fan',    status: 'off' },
+    { id: 'main/lights', name: 'Lights', status: 'off' },
   ],
   sensors: [],
   isLoading: false,
   lastUpdated: null,
   espConnected: false,
+  door: null,
+  version: 0,
 
-  fetchDevices: async () => {
+  // One snapshot for everything; returns its version to long-poll with, or null on failure
+  fetchState: async (since?: string, signal?: AbortSignal) => {
     try {
-      const devices = await deviceService.getDevices();
-      if (devices.length > 0) {
-        set({ devices });
-      }
+      const state = await deviceService.getState(since, signal);
+      const controllers = Object.values(state.controllers);
+      set({
+        sensors: state.sensors,
+        door: state.door,
+        lastUpdated: new Date(),
+        espConnected: controllers.length > 0
+          ? controllers.some((c) => c.connected) && isConnected(state.sensors)
+          : isConnected(state.sensors),
+        ...(state.devices.length > 0 ? { devices: state.devices } : {}),
+      });
+      return state.version;
     } catch (error) {
-      console.error('Failed to fetch devices:', error);
+      if (!signal?.aborted) {
+        console.error('Failed to fetch state:', error);
+        set({ espConnected: false });
+      }
+      return null;
     }
   },
 
-  fetchSensors: async () => {
-    try {
-      const sensors = await deviceService.getSensors();
-      // Determine if the ESP is live — if any sensor has a real value it's connected
-      const connected = sensors.some(
-        (s) => s.value !== '--' && s.status !== 'inactive'
-      );
-      set({ sensors, lastUpdated: new Date(), espConnected: connected });
-    } catch (error) {
-      console.error('Failed to fetch sensors:', error);
-      set({ espConnected: false });
+  applyEvent: (event: StateEvent, snapshot = false) => {
+    // Updates queued before a (re)connect snapshot can arrive after it.
+    // A snapshot always wins — the server may have restarted at version 0.
+    if (!snapshot && event.version <= get().version) {
+      return;
     }
+    set({
+      version: event.version,
+      lastUpdated: new Date(),
+      ...(event.devices && event.devices.length > 0 ? { devices: event.devices } : {}),
+      ...(event.sensors ? { sensors: event.sensors, espConnected: isConnected(event.sensors) } : {}),
+      ...(event.door ? { door: event.door } : {}),
+    });
   },
 
   toggleDevice: async (deviceId: DeviceId, status: DeviceStatus) => {
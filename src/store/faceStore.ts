@@ -1,5 +1,5 @@
 import { create } from 'zustand';
-import { faceService } from '@/services/faceService';
+import { faceService, needsRetake } from '@/services/faceService';
 import type { FaceAuthenticationResponse } from '@/types/face.types';
 
 interface FaceState {
@@ -7,19 +7,29 @@ interface FaceState {
   isRegistering: boolean;
   recognitionResult: FaceAuthenticationResponse | null;
   error: string | null;
+  retakeHint: string | null;   // set when the last frame was rejected as unusable
   capturedFace: Blob | null;
-  startRecognition: (image: Blob) => Promise<FaceAuthenticationResponse>;
+  startRecognition: (image: Blob | Blob[]) => Promise<FaceAuthenticationResponse>;
   registerFace: (image: Blob, username: string) => Promise<void>;
   setCapturedFace: (image: Blob | null) => void;
   clearCapturedFace: () => void;
   reset: () => void;
 }
 
+function extractMessage(error: unknown, fallback: string): string {
+  if (error && typeof error === 'object' && 'message' in error) {
+    const { message } = error as { message: unknown };
+    if (typeof message === 'string') return message;
+  }
+  return fallback;
+}
+
 export const useFaceStore = create<FaceState>((set) => ({
   isRecognizing: false,
   isRegistering: false,
   recognitionResult: null,
   error: null,
+  retakeHint: null,
   capturedFace: null,
 
   setCapturedFace: (image: Blob | null) => {
@@ -30,10 +40,12 @@ export const useFaceStore = create<FaceState>((set) => ({
     set({ capturedFace: null });
   },
 
-  startRecognition: async (image: Blob): Promise<FaceAuthenticationResponse> => {
-    set({ isRecognizing: true, error: null });
+  startRecognition: async (image: Blob | Blob[]): Promise<FaceAuthenticationResponse> => {
+    set({ isRecognizing: true, error: null, retakeHint: null });
     try {
-      const result = await faceService.authenticate(image);
+      const result = Array.isArray(image)
+        ? await faceService.authenticateBurst(image)
+        : await faceService.authenticate(image);
       // Persist the JWT so subsequent API calls are authenticated
       if (result.authenticated && result.token) {
         localStorage.setItem('auth_token', result.token);
@@ -44,25 +56,27 @@ export const useFaceStore = create<FaceState>((set) => ({
       });
       return result;
     } catch (error: unknown) {
-      const errorMessage = error instanceof Error ? error.message : 'Recognition failed';
+      const errorMessage = extractMessage(error, 'Recognition failed');
       set({
         isRecognizing: false,
         error: errorMessage,
+        retakeHint: needsRetake(error) ? errorMessage : null,
       });
       throw error;
     }
   },
 
   registerFace: async (image: Blob, username: string): Promise<void> => {
-    set({ isRegistering: true, error: null });
+    set({ isRegistering: true, error: null, retakeHint: null });
     try {
       await faceService.register({ image, username });
       set({ isRegistering: false });
     } catch (error: unknown) {
-      const errorMessage = error instanceof Error ? error.message : 'Registration failed';
+      const errorMessage = extractMessage(error, 'Registration failed');
       set({
         isRegistering: false,
         error: errorMessage,
+        retakeHint: needsRetake(error) ? errorMessage : null,
       });
       throw error;
     }
@@ -74,6 +88,7 @@ export const useFaceStore = create<FaceState>((set) => ({
       isRegistering: false,
       recognitionResult: null,
       error: null,
+      retakeHint: null,
       capturedFace: null,
     });
   },
@@ -1,4 +1,8 @@
-export type DeviceId = 'ac' | 'fan' | 'lights';
+export type DeviceKind = 'ac' | 'fan' | 'lights';
+
+// "<controller>/<device>", e.g. "living/fan" — one ESP controller per room.
+// A bare kind ("fan") addresses the first controller.
+export type DeviceId = string;
 
 export type DeviceStatus = 'on' | 'off';
 
@@ -6,6 +10,8 @@ export interface Device {
   id: DeviceId;
   name: string;
   status: DeviceStatus;
+  controller?: string;
+  controllerName?: string;
 }
 
 export interface Sensor {
@@ -14,6 +20,38 @@ export interface Sensor {
   value: string | number;
   unit?: string;
   status: 'active' | 'inactive' | 'detected' | 'not_detected';
+  controller?: string;
+  controllerName?: string;
+}
+
+export interface DoorState {
+  status: 'IDLE' | 'GRANTED';
+  username: string | null;
+  grantedAt: string | null;
+}
+
+export interface ControllerLiveness {
+  connected: boolean;
+  last_seen: string | null;
+}
+
+// Pushed by the backend on /events — only the groups that changed are present
+export interface StateEvent {
+  version: number;
+  sensors?: Sensor[];
+  devices?: Device[];
+  door?: DoorState;
+}
+
+// GET /state — everything from one snapshot. Send `version` back as
+// ?since= to hold the request open until the next change.
+export interface DashboardState {
+  version: string;
+  sensors: Sensor[];
+  devices: Device[];
+  door: DoorState;
+  controllers: Record<string, ControllerLiveness>;
+  espLastSeen: string | null;
 }
 
 export interface ToggleDeviceRequest {
@@ -21,8 +59,24 @@ export interface ToggleDeviceRequest {
   status: DeviceStatus;
 }
 
+// Toggles are queued server-side; the ESP acknowledges by reporting the new state
+export type DeviceCommandState = 'queued' | 'sent' | 'acked' | 'failed' | 'superseded';
+
+export interface DeviceCommand {
+  id: string;
+  deviceId: DeviceId;
+  target: DeviceStatus;
+  state: DeviceCommandState;
+  attempts: number;
+  error: string | null;
+  createdAt: string;
+  updatedAt: string;
+}
+
 export interface ToggleDeviceResponse {
   success: boolean;
   device: Device;
   message?: string;
+  commandId?: string;
+  command?: DeviceCommand;
 }
@@ -1,3 +1,12 @@
+/** Why the backend turned a frame away before matching; the client should retake. */
+export type FrameRejectReason =
+  | 'too_blurry'
+  | 'too_dark'
+  | 'too_bright'
+  | 'face_too_small'
+  | 'multiple_faces'
+  | 'no_face';
+
 export interface FaceRegistrationRequest {
   image: Blob;
   username: string;
@@ -7,6 +16,10 @@ export interface FaceRegistrationResponse {
   success: boolean;
   message?: string;
   faceId?: string;
+  samples?: number;     // face samples now stored for this user
+  maxSamples?: number;  // oldest / least-used sample is evicted past this
+  reason?: FrameRejectReason;
+  retake?: boolean;     // the frame was unusable — capture another one
 }
 
 export interface FaceAuthenticationResponse {
@@ -18,4 +31,7 @@ export interface FaceAuthenticationResponse {
   };
   token?: string;   // JWT returned by backend on successful face auth
   message?: string;
+  frames?: number;  // burst login: frames scored before the backend decided
+  reason?: FrameRejectReason;
+  retake?: boolean;
 }
@@ -9,6 +9,12 @@ export const SENSORS = {
   MOTION: 'motion',
 } as const;
 
+// Face login captures a short burst; the backend stops reading once it can decide
+export const FACE_BURST = {
+  FRAMES: 4,
+  INTERVAL_MS: 150,
+} as const;
+
 export const ROUTES = {
   LANDING: '/',
   LOGIN: '/login',
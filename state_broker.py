@@ -0,0 +1,42 @@
+"""
+State broker
+------------
+Fan-out point for ESP state changes. The serial reader (and the toggle
+route's optimistic update) publish an event only when something actually
+changed; every subscriber callback is then invoked with it.
+
+Each event carries a monotonically increasing version so clients can
+tell what they have already seen.
+"""
+
+import threading
+
+
+class StateBroker:
+    def __init__(self):
+        self._lock        = threading.Lock()
+        self._subscribers = []
+        self.version      = 0
+
+    def subscribe(self, callback) -> None:
+        """callback(event: dict) — called on the publishing thread, must not block."""
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback) -> None:
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def publish(self, event: dict) -> int:
+        """Stamp event with the next version and fan it out. Returns the version."""
+        with self._lock:
+            self.version += 1
+            event = {'version': self.version, **event}
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback(event)
+            except Exception as e:
+                print(f'[broker] Subscriber error: {e}')
+        return event['version']
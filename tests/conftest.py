@@ -0,0 +1,15 @@
+"""
+Shared test setup: app.py reads its paths from the environment at import,
+so point them at a scratch directory before any test module imports it.
+"""
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_scratch = tempfile.mkdtemp(prefix='smart-home-test-')
+os.environ['DB_PATH']     = os.path.join(_scratch, 'faces.db')
+os.environ['HISTORY_DIR'] = os.path.join(_scratch, 'history')
+os.environ['AUDIT_DIR']   = os.path.join(_scratch, 'audit')
@@ -0,0 +1,15 @@
+"""
+GET /audit when this process has no audit journal (start_devices() never
+ran): a 503, not a crash.
+"""
+
+import app as backend
+
+
+def test_audit_without_journal_is_503():
+    backend.init_db()
+    assert backend.audit is None
+    token    = backend.make_jwt('u-audit', 'auditor', 'auditor@example.com')
+    response = backend.app.test_client().get('/audit', headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 503
+    assert response.get_json() == {'success': False, 'message': 'Audit log is not enabled'}
@@ -0,0 +1,102 @@
+"""
+GatewayClient retries: a request is resent only when the gateway can't
+have acted on it, so non-idempotent ops (toggle, grant, audit) never run
+twice.
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import tempfile
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from device_gateway import GatewayServer, GatewayClient, GatewayUnavailable, SUBSCRIBER_QUEUE  # noqa: E402
+
+
+@pytest.fixture
+def socket_path():
+    directory = tempfile.mkdtemp(prefix='gateway-test-')
+    yield os.path.join(directory, 'gw.sock')
+
+
+def counting_server(path: str, delay: float = 0.0) -> tuple[GatewayServer, list]:
+    calls = []
+
+    def handle(op, args):
+        calls.append(op)
+        time.sleep(delay)
+        return len(calls)
+
+    server = GatewayServer(path, handle)
+    server.start()
+    return server, calls
+
+
+def test_slow_reply_is_not_resent(socket_path):
+    server, calls = counting_server(socket_path, delay=0.5)
+    client = GatewayClient(socket_path, timeout=0.1)
+    try:
+        with pytest.raises(GatewayUnavailable):
+            client.call('toggle', device='fan')
+        time.sleep(0.6)
+        assert calls == ['toggle']
+    finally:
+        server.close()
+
+
+def test_stale_pooled_connection_is_retried(socket_path):
+    # A gateway that closes every connection after one reply, like one that restarted
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(socket_path)
+    listener.listen(4)
+    calls = []
+
+    def serve():
+        for _ in range(2):   # the first call, then the retry of the second
+            conn, _addr = listener.accept()
+            with conn, conn.makefile('rb') as reader:
+                line = reader.readline()
+                if line:
+                    calls.append(json.loads(line)['op'])
+                    conn.sendall(b'{"result": "ok"}\n')
+
+    threading.Thread(target=serve, daemon=True).start()
+    client = GatewayClient(socket_path, timeout=1)
+    try:
+        assert client.call('state') == 'ok'
+        time.sleep(0.1)   # the pooled connection's peer is gone now
+        assert client.call('toggle') == 'ok'
+        assert calls == ['state', 'toggle']
+    finally:
+        listener.close()
+
+
+def test_publish_never_blocks_on_a_stalled_subscriber(socket_path):
+    server, _calls = counting_server(socket_path)
+    stalled = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)   # subscribes, then never reads
+    stalled.connect(socket_path)
+    stalled.sendall(b'{"op": "subscribe"}\n')
+    events = []
+    GatewayClient(socket_path).subscribe(events.append)
+    time.sleep(0.2)
+    try:
+        total, slowest = SUBSCRIBER_QUEUE * 4, 0
+        for n in range(total):
+            began = time.monotonic()
+            server.publish({'kind': 'state', 'n': n, 'pad': 'x' * 1000})
+            slowest = max(slowest, time.monotonic() - began)
+            if n % 100 == 99:
+                time.sleep(0.02)   # a live worker keeps up at this pace, the stalled one can't
+        assert slowest < 0.1
+        time.sleep(0.5)
+        assert len(server._subscribers) == 1   # the stalled one was dropped
+        assert [e['n'] for e in events] == list(range(total))   # the live one lost nothing
+    finally:
+        stalled.close()
+        server.close()
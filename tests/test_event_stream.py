@@ -0,0 +1,41 @@
+"""
+A slow SSE client whose queue fills up gets the full state instead of
+losing a group's update.
+"""
+
+import os
+import sys
+import json
+import asyncio
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from event_stream import EventStreamServer, CLIENT_QUEUE, _frame  # noqa: E402
+
+
+def drain(queue: asyncio.Queue) -> list:
+    frames = []
+    while not queue.empty():
+        frames.append(queue.get_nowait())
+    return frames
+
+
+def test_overflow_is_replaced_by_a_snapshot():
+    state  = {'version': 0, 'sensors': [], 'devices': {'main/fan': 'off'}}
+    server = EventStreamServer(broker=None, snapshot=lambda: dict(state))
+    slow, fast = asyncio.Queue(maxsize=CLIENT_QUEUE), asyncio.Queue(maxsize=CLIENT_QUEUE * 2)
+    server._clients.update((slow, fast))
+
+    server._fan_out(_frame('update', {'version': 1, 'devices': {'main/fan': 'on'}}))
+    for version in range(2, CLIENT_QUEUE + 2):
+        state['version'] = version
+        state['devices'] = {'main/fan': 'on'}
+        server._fan_out(_frame('update', {'version': version, 'sensors': []}))
+
+    assert len(drain(fast)) == CLIENT_QUEUE + 1
+    frames = drain(slow)
+    assert len(frames) == 1
+    event, data = frames[0].decode().split('\n')[1:3]
+    assert event == 'event: snapshot'
+    snapshot = json.loads(data[len('data: '):])
+    assert snapshot['version'] == CLIENT_QUEUE + 1 and snapshot['devices'] == {'main/fan': 'on'}
@@ -0,0 +1,111 @@
+"""
+Matcher updates. ExactIndex appends without copying the gallery, and
+views already handed to readers stay valid. IVF retraining runs off the
+registering thread, and faces added or removed meanwhile survive the
+swap.
+"""
+
+import os
+import sys
+import time
+import threading
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import face_index  # noqa: E402
+from face_index import ExactIndex, IVFIndex, IVF_MIN_TRAIN  # noqa: E402
+
+
+def wait_for(predicate, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_exact_appends_in_place_and_tombstones_removals():
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((300, 128)).astype(np.float32)
+    index = ExactIndex()
+    index.build([f'f{n}' for n in range(100)], vectors[:100])
+    buffer, before = index._matrix, index._block
+
+    for n in range(100, 150):
+        index.upsert(f'f{n}', vectors[n])
+    assert index._matrix is buffer   # no copy while there is room
+    assert len(before.matrix) == 100 and len(index) == 150   # the old view is unchanged
+    assert index.search(vectors[149]) == ('f149', 0.0)
+
+    assert index.remove(['f3', 'f149', 'nope']) == 2
+    assert before.nearest_k(vectors[3], float(vectors[3] @ vectors[3]), 1)[0][0] != 'f3'   # old views see it too
+    assert index.search(vectors[149])[0] != 'f149' and len(index) == 148
+
+    index.upsert('f5', vectors[200])   # replace: the old row is tombstoned
+    assert index.search(vectors[200])[0] == 'f5' and index.search(vectors[5])[0] != 'f5'
+    assert np.allclose(index.vectors(['f5', 'f7']), vectors[[200, 7]])
+
+    for n in range(150, 300):          # grows past capacity, compacting on the way
+        index.upsert(f'f{n}', vectors[n])
+    assert index._matrix is not buffer and len(index) == 298
+    assert len(index._ids) == len(index._pos)
+    brute = {f'f{n}': vectors[n] for n in range(300) if n not in (3, 5, 149)}
+    brute['f5'] = vectors[200]
+    query = rng.standard_normal(128).astype(np.float32)
+    nearest = min(brute, key=lambda f: np.linalg.norm(brute[f] - query))
+    assert index.search(query)[0] == nearest
+    assert index.search_k(query, 3)[0][0] == nearest
+
+
+def test_retrain_runs_in_the_background_and_keeps_concurrent_writes(monkeypatch):
+    rng = np.random.default_rng(1)
+    vectors = rng.standard_normal((IVF_MIN_TRAIN + 2, 128)).astype(np.float32)
+    index = IVFIndex(nlist=8, nprobe=8)
+    for n in range(IVF_MIN_TRAIN - 1):
+        index.upsert(f'f{n}', vectors[n])
+    assert len(index._state.lists) == 1   # not trained yet
+
+    release, kmeans = threading.Event(), face_index._kmeans
+
+    def held_kmeans(*args):
+        release.wait(10)
+        return kmeans(*args)
+
+    monkeypatch.setattr(face_index, '_kmeans', held_kmeans)
+    index.upsert(f'f{IVF_MIN_TRAIN - 1}', vectors[IVF_MIN_TRAIN - 1])   # crosses the threshold
+    assert index._retrain_log is not None   # returned while k-means is still held
+
+    # Written while the retrain runs: one added, one removed
+    index.upsert('late', vectors[IVF_MIN_TRAIN])
+    assert index.remove(['f0']) == 1
+    assert index.search(vectors[IVF_MIN_TRAIN])[0] == 'late'
+
+    release.set()
+    assert wait_for(lambda: len(index._state.lists) == 8)
+    assert wait_for(lambda: index._retrain_log is None)
+    assert len(index) == IVF_MIN_TRAIN
+    assert index.search(vectors[IVF_MIN_TRAIN])[0] == 'late'
+    assert 'f0' not in index._assignment
+    assert all(f != 'f0' for f, _ in index.search_k(vectors[0], 5))
+    assert np.allclose(index.vectors(['late', 'f5']), vectors[[IVF_MIN_TRAIN, 5]])
+
+
+def test_build_discards_a_retrain_of_an_older_snapshot(monkeypatch):
+    rng = np.random.default_rng(2)
+    vectors = rng.standard_normal((IVF_MIN_TRAIN, 128)).astype(np.float32)
+    index = IVFIndex(nlist=8)
+    for n in range(IVF_MIN_TRAIN - 1):
+        index.upsert(f'f{n}', vectors[n])
+
+    release, kmeans = threading.Event(), face_index._kmeans
+    monkeypatch.setattr(face_index, '_kmeans', lambda *args: (release.wait(10), kmeans(*args))[1])
+    index.upsert('last', vectors[-1])
+    monkeypatch.setattr(face_index, '_kmeans', kmeans)
+    index.build(['only'], vectors[:1])
+
+    release.set()
+    assert wait_for(lambda: index._retrain_log is None)
+    assert len(index) == 1 and index.search(vectors[0])[0] == 'only'
@@ -0,0 +1,112 @@
+"""
+Face registration for usernames with and without an account: a face of
+a username without a users row is stored under user_id = username, as it
+always has been (foreign keys are not enforced).
+"""
+
+import io
+import zipfile
+
+import numpy as np
+import pytest
+
+import app as backend
+
+
+@pytest.fixture(scope='module')
+def client():
+    backend.init_db()
+    with backend.get_db() as conn:
+        conn.execute('INSERT INTO users (id, username, email, password_hash, created_at) VALUES (?, ?, ?, ?, ?)',
+                     ('u-alice', 'alice', 'alice@example.com', 'x', backend.now_iso()))
+        conn.commit()
+    for name in backend.FACE_SUBSYSTEMS:
+        backend.readiness.mark(name, 'ready')
+    return backend.app.test_client()
+
+
+@pytest.fixture
+def fake_embeddings(monkeypatch):
+    # Every image embeds to the same vector: only the database side is under test
+    monkeypatch.setattr(backend.face_pool, 'embed', lambda data, options: np.ones(128))
+    monkeypatch.setattr(backend.face_pool, 'embed_many', lambda images, options: (np.ones(128) for _ in images))
+
+
+def face_user_ids(username: str) -> set:
+    with backend.get_db() as conn:
+        return {r['user_id'] for r in conn.execute('SELECT user_id FROM faces WHERE username = ?', (username,))}
+
+
+def test_register_without_account(client, fake_embeddings):
+    response = client.post('/face/register', content_type='multipart/form-data',
+                           data={'username': 'bob', 'image': (io.BytesIO(b'image'), 'bob.jpg')})
+    assert response.status_code == 200
+    assert face_user_ids('bob') == {'bob'}
+
+
+def test_save_face_uses_the_account_id(client):
+    with backend.get_db() as conn:
+        _face_id, user_id, evicted = backend.save_face(conn, 'alice', np.zeros(128))
+        conn.commit()
+    assert user_id == 'u-alice' and evicted == []
+    assert face_user_ids('alice') == {'u-alice'}
+
+
+def test_batch_with_and_without_accounts(client, fake_embeddings):
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, 'w') as z:
+        for name in ('dave.jpg', 'carol/1.jpg', 'alice.jpg'):
+            z.writestr(name, b'image')
+    archive.seek(0)
+
+    response = client.post('/face/register/batch', content_type='multipart/form-data',
+                           data={'archive': (archive, 'faces.zip')})
+    assert response.status_code == 200
+    report = response.get_json()
+    assert {r['username']: r['status'] for r in report['results']} == {
+        'dave': 'registered', 'carol': 'registered', 'alice': 'registered'}
+    assert face_user_ids('carol') == {'carol'} and face_user_ids('alice') == {'u-alice'}
+
+
+def post_zip(client, names):
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, 'w') as z:
+        for name in names:
+            z.writestr(name, b'image')
+    archive.seek(0)
+    return client.post('/face/register/batch', content_type='multipart/form-data',
+                       data={'archive': (archive, 'faces.zip')})
+
+
+def test_batch_keeps_results_around_a_timed_out_image(client, monkeypatch):
+    outcomes = [np.ones(128), backend.FaceWorkerTimeout(), np.ones(128)]
+    monkeypatch.setattr(backend.face_pool, 'embed_many',
+                        lambda images, options: (outcomes[n] for n, _ in enumerate(images)))
+    report = post_zip(client, ('erin.jpg', 'frank.jpg', 'grace.jpg')).get_json()
+    assert [r['status'] for r in report['results']] == ['registered', 'timeout', 'registered']
+    assert (report['registered'], report['failed'], report['complete']) == (2, 1, True)
+
+
+def test_batch_saves_what_finished_when_the_pool_stalls(client, monkeypatch):
+    def stalled(images, options):
+        images = iter(images)
+        next(images)
+        yield np.ones(128)
+        next(images)
+        raise backend.FaceWorkerTimeout()   # no worker frees up for the second image
+
+    monkeypatch.setattr(backend.face_pool, 'embed_many', stalled)
+    report = post_zip(client, ('heidi.jpg', 'ivan.jpg', 'judy.jpg')).get_json()
+    assert [(r['username'], r['status']) for r in report['results']] == [('heidi', 'registered'), ('ivan', 'timeout')]
+    assert report['complete'] is False and face_user_ids('heidi') == {'heidi'}
+
+
+def test_zip_limits_are_checked_before_reading(client, fake_embeddings, monkeypatch):
+    monkeypatch.setattr(backend.enrollment, 'MAX_ZIP_IMAGE_BYTES', 4)
+    response = post_zip(client, ('kim.jpg',))
+    assert response.status_code == 413 and face_user_ids('kim') == set()
+    monkeypatch.setattr(backend.enrollment, 'MAX_ZIP_IMAGE_BYTES', 1024)
+    monkeypatch.setattr(backend.enrollment, 'MAX_ZIP_TOTAL_BYTES', 8)
+    assert post_zip(client, ('kim.jpg', 'leo.jpg')).status_code == 413
+    monkeypatch.setattr(backend.enrollment, 'MAX_ZIP_ENTRIES', 1)
+    assert post_zip(client, ('kim.jpg', 'leo.jpg')).status_code == 413
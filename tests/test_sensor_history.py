@@ -0,0 +1,46 @@
+"""
+Sensor history queries during a flush: samples and rollup buckets being
+written are still found, and found once, before and after they reach
+the disk.
+"""
+
+import os
+import sys
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sensor_history  # noqa: E402
+from sensor_history import SensorHistory  # noqa: E402
+
+
+def test_samples_being_flushed_stay_visible(monkeypatch):
+    history = SensorHistory(tempfile.mkdtemp(prefix='history-test-'))
+    base, total = 1_700_000_040.0, 300
+    for n in range(total):
+        history.append(base + n, 20.0, 50.0, 0)
+
+    writing, release = threading.Event(), threading.Event()
+
+    def held_open(path, mode):
+        writing.set()
+        release.wait(10)   # the flusher sits here with the batch taken
+        return open(path, mode)
+
+    monkeypatch.setattr(sensor_history, 'open', held_open, raising=False)
+    flusher = threading.Thread(target=history.flush)
+    flusher.start()
+    try:
+        assert writing.wait(10)
+        assert len(history.query(base, base + total, 'raw')[1]) == total
+        minutes = history.query(base, base + total, '1m')[1]
+        assert sum(p['samples'] for p in minutes) == total
+    finally:
+        release.set()
+        flusher.join()
+
+    points = history.query(base, base + total, 'raw')[1]
+    assert len(points) == len({p['t'] for p in points}) == total
+    minutes = history.query(base, base + total, '1m')[1]
+    assert sum(p['samples'] for p in minutes) == total